@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+Benchmark of per-sentence vs batched StanfordCoreNLP annotation.
+Reports requests per article and sentences per second for both modes
+and checks that both produce the same tokens.
+
+Usage:
+    python benchmarks/annotation.py -p pmids.txt -d PMC -i http://localhost:9000
+'''
+from ppaxe import core
+from pycorenlp import StanfordCoreNLP
+import argparse
+import time
+
+
+class CountingNLP(object):
+    '''
+    Wraps a StanfordCoreNLP client and counts the requests done to it
+    '''
+    def __init__(self, nlp):
+        self.nlp = nlp
+        self.requests = 0
+
+    def annotate(self, text, properties=None):
+        self.requests += 1
+        return self.nlp.annotate(text, properties=properties)
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--pmids', help='Text file with a list of PMids', required=True)
+    parser.add_argument('-d', '--database', default="PMC")
+    parser.add_argument('-i', '--ip', default="http://localhost:9000")
+    parser.add_argument('-b', '--batch-chars', type=int, default=core.BATCH_MAX_CHARS)
+    return parser.parse_args()
+
+
+def run(articles, source, max_chars):
+    '''
+    Annotates all the articles and returns (requests, sentences, seconds, tokens)
+    '''
+    core.NLP.requests = 0
+    sentences = 0
+    tokens = list()
+    start = time.time()
+    for article in articles:
+        article.sentences = list()
+        article.extract_sentences(source=source)
+        sentences += len(article.sentences)
+        article.annotate_sentences(max_chars=max_chars)
+        tokens.extend([sentence.tokens for sentence in article.sentences])
+    return core.NLP.requests, sentences, time.time() - start, tokens
+
+
+def main():
+    options = get_options()
+    core.NLP = CountingNLP(StanfordCoreNLP(options.ip))
+    with open(options.pmids) as fh:
+        pmids = [line.strip() for line in fh if line.strip()]
+    query = core.PMQuery(ids=pmids, database=options.database)
+    query.get_articles()
+    source = "abstract" if options.database == "PUBMED" else "fulltext"
+    narticles = len(query.articles)
+    results = dict()
+    for mode, max_chars in (("per-sentence", 0), ("batched", options.batch_chars)):
+        requests, sentences, seconds, tokens = run(query.articles, source, max_chars)
+        results[mode] = tokens
+        print("%-12s  articles: %5d  requests/article: %8.2f  sentences/s: %8.2f" % (
+            mode, narticles, requests / float(max(narticles, 1)), sentences / max(seconds, 1e-9)
+        ))
+    print("Same tokens in both modes: %s" % (results["per-sentence"] == results["batched"]))
+
+
+if __name__ == "__main__":
+    main()
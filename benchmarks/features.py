@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+'''
+Microbenchmark of feature extraction on protein-dense sentences:
+InteractionCandidate.compute_features() for each candidate vs
+Sentence.compute_features() for all the candidates of the sentence at once.
+
+Usage:
+    python benchmarks/features.py -t 60 -p 12 -n 50
+'''
+from ppaxe import core
+import argparse
+import random
+import time
+
+
+def synthetic_sentence(ntokens, nprots):
+    '''
+    Returns a Sentence with ntokens tokens and nprots one-token proteins
+    '''
+    tags   = ["NN", "NNS", "VBZ", "VBD", "VBG", "IN", "DT", "JJ", "CD", ",", "."]
+    lemmas = ["interact", "bind", "activate", "phosphorylate", "the", "of", "regulate", "cell"]
+    protein_positions = set(random.sample(range(ntokens), nprots))
+    tokens = list()
+    for idx in range(ntokens):
+        if idx in protein_positions:
+            word = "PROT%s" % random.randint(1, nprots)
+            tokens.append({'index': idx + 1, 'word': word, 'lemma': word, 'pos': "NN", 'ner': "P"})
+        else:
+            lemma = random.choice(lemmas)
+            tokens.append({'index': idx + 1, 'word': lemma, 'lemma': lemma, 'pos': random.choice(tags), 'ner': "O"})
+    sentence = core.Sentence(originaltext="synthetic")
+    sentence.tokens = tokens
+    sentence.get_candidates()
+    return sentence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-t', '--tokens', type=int, default=60, help="Tokens per sentence")
+    parser.add_argument('-p', '--proteins', type=int, default=12, help="Proteins per sentence")
+    parser.add_argument('-n', '--sentences', type=int, default=50, help="Number of sentences")
+    options = parser.parse_args()
+    random.seed(1)
+    tokens = [ synthetic_sentence(options.tokens, options.proteins).tokens.to_list() for i in range(options.sentences) ]
+
+    def make_sentences():
+        sentences = list()
+        for sentence_tokens in tokens:
+            sentence = core.Sentence(originaltext="synthetic")
+            sentence.tokens = sentence_tokens
+            sentence.get_candidates()
+            sentences.append(sentence)
+        return sentences
+
+    sentences = make_sentences()
+    ncandidates = sum(len(sentence.candidates) for sentence in sentences)
+    start = time.time()
+    for sentence in sentences:
+        for candidate in sentence.candidates:
+            candidate.compute_features()
+    per_candidate = time.time() - start
+    reference = [ candidate.feat_vals for sentence in sentences for candidate in sentence.candidates ]
+
+    sentences = make_sentences()
+    start = time.time()
+    for sentence in sentences:
+        sentence.compute_features()
+    per_sentence = time.time() - start
+    result = [ candidate.feat_vals for sentence in sentences for candidate in sentence.candidates ]
+
+    print("Sentences: %d, candidates: %d" % (len(sentences), ncandidates))
+    print("InteractionCandidate.compute_features(): %8.3f s (%8.1f candidates/s)" % (per_candidate, ncandidates / per_candidate))
+    print("Sentence.compute_features():             %8.3f s (%8.1f candidates/s)" % (per_sentence, ncandidates / per_sentence))
+    print("Same features: %s" % (reference == result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+'''
+Benchmark of the HGNC gene dictionary: dict read from the text file vs
+memory-mapped genedict.GeneIndex. Each one is measured in a new python process:
+load time, lookups per second (half of them misses) and memory after the lookups
+(resident and private, from /proc/self/smaps_rollup on Linux). Index pages count
+as private only until another process maps the same file: they are then shared.
+
+Usage:
+    python benchmarks/genedict.py                                 # synthetic dictionary
+    python benchmarks/genedict.py -d ppaxe/data/HGNC_gene_dictionary.txt
+'''
+from ppaxe import genedict
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def synthetic_dictionary(filename, ngenes=45000, naliases=5):
+    '''
+    Writes an HGNC-like text dictionary with ngenes genes and naliases aliases per gene
+    '''
+    random.seed(1)
+    with open(filename, "w") as fh:
+        for i in range(ngenes):
+            symbol = "GENE%s" % i
+            aliases = [symbol] + [ "alias%s-%s" % (i, random.randint(0, 10**6)) for j in range(naliases - 1) ]
+            fh.write("\t".join([symbol] + aliases) + "\n")
+
+
+def memory_kb():
+    '''
+    Returns (resident, private) memory of this process in kB
+    '''
+    values = dict()
+    try:
+        with open("/proc/self/smaps_rollup") as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == "kB":
+                    values[fields[0].rstrip(":")] = int(fields[1])
+    except IOError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss, rss
+    return values.get("Rss", 0), values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+
+
+def child(mode, source, index, nlookups):
+    '''
+    Loads the dictionary in mode ("dict" or "index"), looks up nlookups aliases
+    and prints the measures as json.
+    '''
+    aliases = list(genedict.read_dictionary(source).keys())
+    random.seed(2)
+    queries = [ random.choice(aliases) if i % 2 else "NOTAGENE%s" % i for i in range(nlookups) ]
+    del aliases
+    rss_before, private_before = memory_kb()
+    start = time.time()
+    if mode == "dict":
+        dictionary = genedict.read_dictionary(source)
+    else:
+        dictionary = genedict.GeneIndex(index)
+    load = time.time() - start
+    start = time.time()
+    for query in queries:
+        dictionary.get(query, query)
+    lookup = time.time() - start
+    rss_after, private_after = memory_kb()
+    print(json.dumps({
+        'load': load,
+        'lookups': nlookups / lookup,
+        'rss': rss_after - rss_before,
+        'private': private_after - private_before
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-d', '--dictionary', default=None, help="HGNC text dictionary")
+    parser.add_argument('-n', '--lookups', type=int, default=200000)
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--index', default=None, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.child:
+        child(options.child, options.dictionary, options.index, options.lookups)
+        return
+    tmpdir = tempfile.mkdtemp()
+    try:
+        source = options.dictionary
+        if source is None:
+            source = os.path.join(tmpdir, "genes.txt")
+            synthetic_dictionary(source)
+        index = os.path.join(tmpdir, "genes.idx")
+        start = time.time()
+        naliases = genedict.compile_dictionary(source, index)
+        print("Compiled %s aliases in %.2f s (%.1f MB index)" % (naliases, time.time() - start, os.path.getsize(index) / 1024.0**2))
+        print("%-6s %10s %14s %12s %12s" % ("", "load (ms)", "lookups/s", "RSS (MB)", "private (MB)"))
+        for mode in ("dict", "index"):
+            output = subprocess.check_output([
+                sys.executable, __file__, "--child", mode, "-d", source,
+                "--index", index, "-n", str(options.lookups)
+            ])
+            result = json.loads(output.decode('utf-8'))
+            print("%-6s %10.1f %14.0f %12.1f %12.1f" % (
+                mode, result['load'] * 1000, result['lookups'], result['rss'] / 1024.0, result['private'] / 1024.0
+            ))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
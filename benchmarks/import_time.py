@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+'''
+Benchmark of the import time of the ppaxe modules. Each import is timed in a
+new python process (minus the time of an empty python process), several times,
+and the median is reported. Exits with status 1 if any median is above --max-seconds.
+
+Usage:
+    python benchmarks/import_time.py -n 5 --max-seconds 1.5
+'''
+import argparse
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    "import ppaxe.core",
+    "import ppaxe.report",
+]
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def time_statement(statement, repeat):
+    '''
+    Returns the median time (seconds) of running python -c statement
+    '''
+    times = list()
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, "-c", statement])
+        times.append(time.time() - start)
+    return median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None)
+    options = parser.parse_args()
+    baseline = time_statement("pass", options.repeat)
+    failed = False
+    for statement in STATEMENTS:
+        seconds = time_statement(statement, options.repeat) - baseline
+        print("%-25s %6.3f s" % (statement, seconds))
+        if options.max_seconds is not None and seconds > options.max_seconds:
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+'''
+Benchmark of the overhead of ppaxe.instrument, disabled and enabled: time per
+timer(), timed() function call and observe(), compared with an uninstrumented call.
+
+Usage:
+    python benchmarks/instrument.py -n 1000000
+'''
+from ppaxe import instrument
+import argparse
+import time
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--calls', type=int, default=1000000)
+    return parser.parse_args()
+
+
+def plain():
+    return None
+
+@instrument.timed("benchmark.timed")
+def timed():
+    return None
+
+def with_timer():
+    with instrument.timer("benchmark.timer"):
+        return None
+
+def with_observe():
+    instrument.observe("benchmark.value", 1)
+
+
+def nanoseconds(function, calls):
+    '''
+    Returns the nanoseconds per call of function
+    '''
+    start = time.time()
+    for i in range(calls):
+        function()
+    return (time.time() - start) * 1e9 / calls
+
+
+def main():
+    options = get_options()
+    for enabled in (False, True):
+        if enabled:
+            instrument.enable()
+        else:
+            instrument.disable()
+        base = nanoseconds(plain, options.calls)
+        print("enabled: %-5s  plain call: %6.0f ns" % (enabled, base))
+        for name, function in (("timed()", timed), ("timer()", with_timer), ("observe()", with_observe)):
+            elapsed = nanoseconds(function, options.calls)
+            print("enabled: %-5s  %-10s  %6.0f ns  overhead: %6.0f ns" % (enabled, name, elapsed, elapsed - base))
+
+
+if __name__ == "__main__":
+    main()
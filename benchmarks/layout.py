@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+'''
+Benchmark of the force-directed layout of the report graph (ppaxe.layout) on
+random scale-free graphs (like protein interaction networks). Reports the
+seconds of the layout and its quality: mean length of the edges relative to the
+mean distance between random pairs of nodes (the lower, the better).
+
+Usage:
+    python benchmarks/layout.py --sizes 1000,10000,50000
+    python benchmarks/layout.py --sizes 500,1000 --exact
+'''
+from ppaxe import layout
+import numpy as np
+import argparse
+import time
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sizes', default="1000,10000,50000", help='Comma-separated numbers of nodes')
+    parser.add_argument('-e', '--edges', type=float, default=1.5, help='Edges per node')
+    parser.add_argument('-i', '--iterations', type=int, default=50)
+    parser.add_argument('--exact', action="store_true", help='Also time the exact repulsion (all pairs)')
+    return parser.parse_args()
+
+
+def scale_free_graph(nnodes, edges_per_node, seed=1):
+    '''
+    Returns the edges of a random graph where new nodes link to existing nodes
+    with probability proportional to their degree
+    '''
+    rand = np.random.RandomState(seed)
+    ends = [0]
+    edges = list()
+    for node in range(1, nnodes):
+        links = 1 + (rand.random_sample() < edges_per_node - 1)
+        for target in set(ends[i] for i in rand.randint(len(ends), size=links)):
+            edges.append((node, target))
+            ends.extend([node, target])
+    return edges
+
+
+def quality(positions, edges, seed=1):
+    '''
+    Returns the mean length of the edges divided by the mean distance between random pairs of nodes
+    '''
+    edges = np.array(edges)
+    lengths = np.sqrt(((positions[edges[:, 0]] - positions[edges[:, 1]]) ** 2).sum(axis=1))
+    rand = np.random.RandomState(seed)
+    pairs = rand.randint(len(positions), size=(5000, 2))
+    distances = np.sqrt(((positions[pairs[:, 0]] - positions[pairs[:, 1]]) ** 2).sum(axis=1))
+    return lengths.mean() / distances.mean()
+
+
+def main():
+    options = get_options()
+    print("%8s  %8s  %6s  %10s  %8s" % ("nodes", "edges", "method", "seconds", "quality"))
+    for size in [ int(size) for size in options.sizes.split(",") ]:
+        edges = scale_free_graph(size, options.edges)
+        for exact in ([False, True] if options.exact else [False]):
+            start = time.time()
+            positions = layout.force_layout(size, edges, iterations=options.iterations, exact=exact)
+            seconds = time.time() - start
+            print("%8s  %8s  %6s  %10.3f  %8.3f" % (size, len(edges), "exact" if exact else "grid", seconds, quality(positions, edges)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+'''
+Benchmark of the memory used to write the html report (ppaxe.report) against
+the size of the report. Synthetic results with a given number of interactions
+are summarized and written with each table mode; each size and mode runs in
+its own process. Reports the size of the report (html and sidecar files), the
+resident memory before writing it, the peak increase of the resident memory
+while writing it, and the seconds.
+
+The peak is measured by resetting the peak resident memory of the process
+(/proc/self/clear_refs, Linux) before writing. Elsewhere, the peak of the whole
+process (getrusage) is used, which includes the summary.
+
+Usage:
+    python benchmarks/report_memory.py --sizes 10000,100000,300000
+    python benchmarks/report_memory.py --sizes 100000 --modes json --graph-max-edges 2000 --layout force
+'''
+from ppaxe import core
+from ppaxe import report
+import subprocess
+import argparse
+import tempfile
+import resource
+import shutil
+import random
+import json
+import time
+import sys
+import os
+
+
+SENTENCE = ("Expression of <b>%s</b> was measured after treatment and <b>%s</b> binds it "
+            "in cells of tissue samples during development, compared with controls.")
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sizes', default="10000,100000,300000", help='Comma-separated numbers of interactions')
+    parser.add_argument('-m', '--modes', default=",".join(report.TABLE_MODES), help='Comma-separated table modes (see ppaxe.report.TABLE_MODES)')
+    parser.add_argument('--graph-max-edges', type=int, default=0, help='Maximum edges of the graph (0 for all of them)')
+    parser.add_argument('--layout', default="cose", help='Layout of the graph: "force" or "cose" (not computed)')
+    parser.add_argument('--child', action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def synthetic_results(ninteractions, per_article=20, seed=1):
+    '''
+    Yields ArticleResults with ninteractions interactions in total, between
+    ninteractions / 5 symbols
+    '''
+    rand = random.Random(seed)
+    symbols = [ "GENE%s" % idx for idx in range(max(ninteractions // 5, 2)) ]
+    for article in range((ninteractions + per_article - 1) // per_article):
+        interactions = list()
+        for idx in range(min(per_article, ninteractions - article * per_article)):
+            symbol1, symbol2 = rand.sample(symbols, 2)
+            interactions.append(core.Interaction(round(rand.random(), 3), symbol1.lower(), symbol1, symbol2.lower(), symbol2,
+                                                 SENTENCE % (symbol1.lower(), symbol2.lower()), ""))
+        proteins = sorted(set(symbol for interaction in interactions for symbol in (interaction.symbol1, interaction.symbol2)))
+        yield core.ArticleResult(str(article), None, "Journal %s" % (article % 8), str(2000 + article % 18),
+                                 per_article, len(proteins), proteins, interactions)
+
+
+def proc_status(field):
+    '''
+    Returns the value in MB of a field of /proc/self/status (VmRSS, VmHWM), or None
+    '''
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024.0
+    except (IOError, OSError):
+        pass
+    return None
+
+def reset_peak():
+    '''
+    Resets the peak resident memory of the process. Returns False if it can't
+    '''
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except (IOError, OSError):
+        return False
+
+def peak_rss():
+    '''
+    Returns the peak resident memory of the process in MB
+    '''
+    peak = proc_status("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes in macOS, KB elsewhere
+        peak = peak / 1024.0 / 1024.0 if sys.platform == "darwin" else peak / 1024.0
+    return peak
+
+
+def directory_size(directory):
+    '''
+    Returns the size in MB of the files in directory
+    '''
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, filename)) for filename in files)
+    return total / 1024.0 / 1024.0
+
+
+def run_child(options):
+    '''
+    Writes the report of one size and table mode, and prints the measures as json
+    '''
+    size = int(options.sizes)
+    summary = report.ReportSummary(synthetic_results(size))
+    summary.tables = options.modes
+    summary.graph_layout = options.layout
+    summary.graph_filters = {'max_edges': options.graph_max_edges or None}
+    summary.protsummary.makesummary()
+    summary.graphsummary.makesummary()
+    summary.plots['j_int_plot'], summary.plots['j_prot_plot'], summary.plots['a_year_plot'] = summary.journal_plots()
+    directory = tempfile.mkdtemp()
+    try:
+        before = proc_status("VmRSS") if reset_peak() else peak_rss()
+        start = time.time()
+        summary.write_html(os.path.join(directory, "report"))
+        seconds = time.time() - start
+        print(json.dumps({
+            'size': size,
+            'mode': options.modes,
+            'report_mb': directory_size(directory),
+            'rss_mb': before,
+            'write_mb': max(peak_rss() - before, 0),
+            'seconds': seconds
+        }))
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    options = get_options()
+    if options.child:
+        run_child(options)
+        return
+    print("%12s  %6s  %10s  %10s  %10s  %8s" % ("interactions", "tables", "report MB", "RSS MB", "write +MB", "seconds"))
+    for size in options.sizes.split(","):
+        for mode in options.modes.split(","):
+            output = subprocess.check_output([
+                sys.executable, os.path.abspath(__file__), "--child", "--sizes", size, "--modes", mode,
+                "--graph-max-edges", str(options.graph_max_edges), "--layout", options.layout
+            ])
+            result = json.loads(output.decode("utf-8").strip().split("\n")[-1])
+            print("%12s  %6s  %10.1f  %10.1f  %10.1f  %8.2f" % (
+                result['size'], result['mode'], result['report_mb'], result['rss_mb'], result['write_mb'], result['seconds']))
+
+
+if __name__ == "__main__":
+    main()
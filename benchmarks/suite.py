@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+'''
+Offline benchmark suite: times each stage of the analysis (download/parsing,
+sentence splitting, annotation, candidates, features, prediction, summary and
+report) at several corpus sizes, without network nor StanfordCoreNLP server.
+
+NCBI is replaced by efetch XML payloads and CoreNLP by recorded json responses
+(see ppaxe.replay), read from the fixtures directory. Texts that were not
+recorded are annotated with the deterministic tokenizer of ppaxe.replay. Without
+fixtures, a synthetic PubMed corpus is generated. Corpora are repeated or
+generated up to each size.
+
+If the Random Forest (data/RF_scikit.pkl) or the HGNC dictionary are not
+installed, a small classifier is trained on the synthetic corpus and a dictionary
+of the synthetic symbols is used. Baselines record which model was used, and
+are only compared with runs that use the same one.
+
+Usage:
+    # Record fixtures from live services (needs network and a CoreNLP server)
+    python benchmarks/suite.py --record -p pmids.txt -d PUBMED -i http://localhost:9000
+    # Run, save a baseline and compare later runs with it
+    python benchmarks/suite.py --sizes 10,100,1000 --save-baseline baseline.json
+    python benchmarks/suite.py --sizes 10,100,1000 --baseline baseline.json --threshold 0.25
+'''
+from ppaxe import core
+from ppaxe import report
+from ppaxe import replay
+import argparse
+import tempfile
+import shutil
+import random
+import json
+import glob
+import sys
+import os
+import time
+
+# The stand-ins of the resources are shared with the tests
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from conftest import use_resources as replace_resources
+
+
+STAGES = ["fetch", "split", "annotate", "candidates", "features", "predict", "summarize", "report"]
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+JOURNALS = ["Journal of tests", "Cell Benchmarks", "Nucleic Acids Fixtures", "Synthetic Biology Letters",
+            "Proteins in Silico", "Annals of Replay", "Offline Genomics", "Bioinformatics Today"]
+VERBS    = ["binds", "interacts with", "activates", "inhibits", "phosphorylates", "regulates", "recruits"]
+FILLERS  = ["expression", "levels", "of", "the", "in", "cells", "was", "measured", "after", "treatment",
+            "and", "compared", "with", "controls", "during", "development", "tissue", "samples"]
+PROTEINS = [ "%s%s" % (family, number) for family in ("MAPK", "AKT", "SMAD", "WNT", "CDK", "IL-") for number in range(1, 21) ] + \
+           ["ALB", "TP53", "MDM2", "EGFR", "GRB2", "SOS1", "PTEN", "BRCA1", "MYC", "KRAS"]
+PUBMED_ARTICLE = '''<PubmedArticle><MedlineCitation><PMID>%s</PMID><Article>
+<Journal><Title>%s</Title><JournalIssue><PubDate><Year>%s</Year></PubDate></JournalIssue></Journal>
+<Abstract><AbstractText>%s</AbstractText></Abstract>
+</Article></MedlineCitation></PubmedArticle>'''
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sizes', default="10,50,200", help='Comma-separated numbers of articles')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs of each size (the fastest is kept)')
+    parser.add_argument('-f', '--fixtures', default=FIXTURES, help='Directory of the recorded fixtures')
+    parser.add_argument('--synthetic', action="store_true", help='Use the synthetic corpus even if there are fixtures')
+    parser.add_argument('--baseline', help='JSON file with the baseline to compare with')
+    parser.add_argument('--save-baseline', help='Save the timings as a baseline in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Slowdown over the baseline flagged as regression')
+    parser.add_argument('--record', action="store_true", help='Record fixtures from NCBI and CoreNLP')
+    parser.add_argument('-p', '--pmids', help='Text file with a list of PMids (to record)')
+    parser.add_argument('-d', '--database', default="PUBMED", help='Database of the articles (to record)')
+    parser.add_argument('-i', '--ip', default="http://localhost:9000", help='CoreNLP server (to record)')
+    return parser.parse_args()
+
+
+# CORPUS
+# ----------------------------------------------
+def synthetic_sentence(rand):
+    '''
+    Returns a random sentence mentioning 0 to 4 proteins
+    '''
+    words = [ rand.choice(FILLERS) for i in range(rand.randint(6, 20)) ]
+    nprots = rand.choice([0, 1, 2, 2, 3, 4])
+    if nprots >= 2:
+        words[rand.randint(0, len(words) - 1):0] = [rand.choice(PROTEINS), rand.choice(VERBS), rand.choice(PROTEINS)]
+        nprots -= 2
+    for i in range(nprots):
+        words.insert(rand.randint(0, len(words)), rand.choice(PROTEINS))
+    sentence = " ".join(words)
+    return sentence[0].upper() + sentence[1:] + "."
+
+def synthetic_corpus(narticles, seed=1, sentences=10):
+    '''
+    Returns the efetch XML (PubMed) of narticles synthetic abstracts, as a list of bytes
+    '''
+    rand = random.Random(seed)
+    articles = list()
+    for idx in range(narticles):
+        abstract = " ".join(synthetic_sentence(rand) for i in range(sentences))
+        xml = PUBMED_ARTICLE % (idx + 1, rand.choice(JOURNALS), rand.randint(2000, 2018), abstract)
+        articles.append(xml.encode('utf-8'))
+    return articles
+
+def read_fixtures(directory):
+    '''
+    Reads the efetch payloads in directory/efetch. Returns (database, list of
+    article xml) or (None, []) if there are none.
+    '''
+    database = None
+    articles = list()
+    for filename in sorted(glob.glob(os.path.join(directory, "efetch", "*.xml"))):
+        with open(filename, "rb") as fh:
+            content = fh.read()
+        database = "PMC" if b"<pmc-articleset" in content[:1000] else "PUBMED"
+        articles.extend(xml for identifier, xml in core.split_articles(database, content))
+    return database, articles
+
+def make_corpus(database, articles, size):
+    '''
+    Returns (identifiers, articles by identifier) with size articles, repeating
+    the articles given with new identifiers if needed
+    '''
+    corpus = dict()
+    identifiers = list()
+    for idx in range(size):
+        xml = articles[idx % len(articles)]
+        identifier = str(idx + 1)
+        if idx >= len(articles):
+            # Repeated article: give it a new identifier
+            tag = b"<PMID>" if database == "PUBMED" else b'<article-id pub-id-type="pmid">'
+            start = xml.index(tag) + len(tag)
+            end = xml.index(b"<", start)
+            xml = xml[:start] + identifier.encode('utf-8') + xml[end:]
+        else:
+            element = next(core.iter_article_elements(database, core.join_articles(database, [xml])))
+            identifier = core.article_identifier(database, element)
+        corpus[identifier] = xml
+        identifiers.append(identifier)
+    return identifiers, corpus
+
+
+# REPLAY OF NCBI
+# ----------------------------------------------
+class ReplayResponse(object):
+    '''
+    Response of ReplayFetcher, with the attributes of requests.models.Response used by ppaxe
+    '''
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+        self.url = "replay"
+
+
+class ReplayFetcher(object):
+    '''
+    Stand-in for fetch.Fetcher that answers efetch (and idconv) queries with
+    the articles of a corpus
+    '''
+    def __init__(self, database, corpus):
+        self.database = database
+        self.corpus = corpus
+        self.sent = 0
+        self.retried = 0
+
+    def get(self, url, params=None):
+        self.sent += 1
+        ids = params['id' if url == core.EFETCH_URL else 'ids'].split(",")
+        if url == core.IDCONV_URL:
+            # Identifiers of the corpus are used as PubMed and as PMC ids
+            records = [ {'pmid': identifier, 'pmcid': "PMC%s" % identifier} for identifier in ids ]
+            return ReplayResponse(json.dumps({'records': records}).encode('utf-8'))
+        xmls = [ self.corpus[identifier] for identifier in ids if identifier in self.corpus ]
+        return ReplayResponse(core.join_articles(self.database, xmls))
+
+    def imap(self, queries):
+        for url, params in queries:
+            yield self.get(url, params)
+
+    def map(self, queries):
+        return list(self.imap(queries))
+
+    def close(self):
+        pass
+
+
+# RESOURCES
+# ----------------------------------------------
+def use_resources(tmpdir):
+    '''
+    Loads the Random Forest and the gene dictionary or, if they are not installed,
+    makes synthetic ones (see tests/conftest.py). Returns the name of the model used.
+    '''
+    dictionary = None
+    try:
+        core.get_gene_dictionary()
+    except core.GeneDictError:
+        dictionary = "".join("%s\t%s\n" % (symbol, symbol) for symbol in PROTEINS)
+    predictor = None
+    model = os.path.basename(core.InteractionCandidate.PRED_FILE)
+    try:
+        core.get_predictor()
+    except (IOError, OSError):
+        predictor = train_synthetic_model()
+        model = "synthetic"
+    replace_resources(tmpdir, dictionary, predictor)
+    if dictionary is not None:
+        core.get_gene_dictionary()
+    return model
+
+def train_synthetic_model():
+    '''
+    Trains a small Random Forest on the candidates of a synthetic corpus, labelled
+    as interactions if there is a verb between the two proteins
+    '''
+    from sklearn.ensemble import RandomForestClassifier
+    from scipy import sparse
+    features = list()
+    labels = list()
+    for xml in synthetic_corpus(100, seed=2):
+        element = next(core.iter_article_elements("PUBMED", core.join_articles("PUBMED", [xml])))
+        article = core.pubmed_article(element)
+        article.extract_sentences(source="abstract")
+        for sentence in article.annotate_sentences():
+            sentence.get_candidates()
+            sentence.compute_features()
+            for candidate in sentence.candidates:
+                first, last = sorted([candidate.prot1.positions[-1], candidate.prot2.positions[0]])
+                between = sentence.tokens[first:last - 1]
+                features.append(candidate.features_sparse)
+                labels.append(any(token['pos'].startswith("VB") for token in between))
+    model = RandomForestClassifier(n_estimators=30, max_depth=12, random_state=0)
+    model.fit(sparse.vstack(features, format="csr"), labels)
+    return model
+
+
+# BENCHMARK
+# ----------------------------------------------
+def run(database, identifiers, corpus, outdir):
+    '''
+    Analyzes the corpus and returns the seconds spent in each stage
+    '''
+    seconds = dict((stage, 0.0) for stage in STAGES)
+    source = "abstract" if database == "PUBMED" else "fulltext"
+
+    start = time.time()
+    core.FETCHER = ReplayFetcher(database, corpus)
+    articles = list(core.PMQuery(ids=identifiers, database=database).iter_articles(keep=False))
+    seconds['fetch'] = time.time() - start
+
+    start = time.time()
+    for article in articles:
+        article.extract_sentences(source=source)
+    seconds['split'] = time.time() - start
+
+    start = time.time()
+    annotated = [ article.annotate_sentences() for article in articles ]
+    seconds['annotate'] = time.time() - start
+
+    start = time.time()
+    for sentences in annotated:
+        for sentence in sentences:
+            sentence.get_candidates()
+    seconds['candidates'] = time.time() - start
+
+    start = time.time()
+    for sentences in annotated:
+        for sentence in sentences:
+            sentence.compute_features()
+    seconds['features'] = time.time() - start
+
+    start = time.time()
+    for sentences in annotated:
+        core.predict_candidates([ candidate for sentence in sentences for candidate in sentence.candidates ])
+    seconds['predict'] = time.time() - start
+
+    start = time.time()
+    results = [ article.summarize() for article in articles ]
+    seconds['summarize'] = time.time() - start
+
+    start = time.time()
+    report.ReportSummary(results).make_report(os.path.join(outdir, "report"))
+    get_pyplot_close()
+    seconds['report'] = time.time() - start
+    return seconds, len(articles)
+
+def get_pyplot_close():
+    '''
+    Closes the figures of the report, so they don't accumulate between runs
+    '''
+    report.get_pyplot().close("all")
+
+def compare(timings, baseline, threshold):
+    '''
+    Compares timings with baseline (same format). Returns a list of
+    (size, stage, baseline seconds, seconds) of the stages slower than baseline by
+    more than threshold (and by more than 5 ms, to ignore noise).
+    '''
+    regressions = list()
+    for size, stages in timings['sizes'].items():
+        for stage, seconds in stages.items():
+            base = baseline['sizes'].get(size, {}).get(stage)
+            if base is None:
+                continue
+            if seconds > base * (1 + threshold) and seconds - base > 0.005:
+                regressions.append((size, stage, base, seconds))
+    return regressions
+
+def record(options):
+    '''
+    Downloads the articles of options.pmids and annotates them with the CoreNLP
+    server at options.ip, saving the efetch payloads and the responses as fixtures
+    '''
+    from pycorenlp import StanfordCoreNLP
+    efetch_dir = os.path.join(options.fixtures, "efetch")
+    if not os.path.exists(efetch_dir):
+        os.makedirs(efetch_dir)
+    with open(options.pmids) as fh:
+        pmids = [ line.strip() for line in fh if line.strip() ]
+    fetcher = core.get_fetcher()
+    get = fetcher.get
+    saved = [0]
+
+    def recording_get(url, params=None):
+        response = get(url, params)
+        if url == core.EFETCH_URL and response.status_code == 200:
+            saved[0] += 1
+            with open(os.path.join(efetch_dir, "%s-%03d.xml" % (options.database.lower(), saved[0])), "wb") as fh:
+                fh.write(response.content)
+        return response
+
+    fetcher.get = recording_get
+    store = replay.AnnotationStore(os.path.join(options.fixtures, "corenlp.jsonl"))
+    core.NLP = replay.RecordingNLP(StanfordCoreNLP(options.ip), store)
+    source = "abstract" if options.database == "PUBMED" else "fulltext"
+    narticles = 0
+    for article in core.PMQuery(ids=pmids, database=options.database).iter_articles(keep=False):
+        article.extract_sentences(source=source)
+        article.annotate_sentences()
+        narticles += 1
+    print("Recorded %s articles in %s efetch payloads and %s CoreNLP responses" % (narticles, saved[0], len(store)))
+
+def main():
+    options = get_options()
+    if options.record:
+        if not options.pmids:
+            sys.exit("--record needs a list of PMids (-p)")
+        record(options)
+        return
+    database, articles = (None, [])
+    if not options.synthetic:
+        database, articles = read_fixtures(options.fixtures)
+    store = replay.AnnotationStore(os.path.join(options.fixtures, "corenlp.jsonl"))
+    core.NLP = replay.ReplayNLP(store if articles else None)
+    core.ANNOTATION_CACHE = None
+    core.ARTICLE_CACHE = None
+    sizes = [ int(size) for size in options.sizes.split(",") ]
+    corpus_name = "recorded" if articles else "synthetic"
+    if not articles:
+        database, articles = ("PUBMED", synthetic_corpus(max(sizes)))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        model = use_resources(tmpdir)
+        timings = {'model': model, 'corpus': corpus_name, 'sizes': dict()}
+        # Untimed run, so that imports and first loads are not counted
+        identifiers, corpus = make_corpus(database, articles, min(sizes))
+        run(database, identifiers, corpus, tmpdir)
+        print("Corpus: %s (%s)  Model: %s" % (timings['corpus'], database, model))
+        print("%8s  " % "articles" + "  ".join("%10s" % stage for stage in STAGES) + "  %10s" % "total")
+        for size in sizes:
+            identifiers, corpus = make_corpus(database, articles, size)
+            best = None
+            for i in range(options.repeat):
+                seconds, narticles = run(database, identifiers, corpus, tmpdir)
+                best = seconds if best is None else dict((stage, min(best[stage], seconds[stage])) for stage in STAGES)
+            timings['sizes'][str(size)] = best
+            print("%8s  " % narticles + "  ".join("%10.4f" % best[stage] for stage in STAGES) + "  %10.4f" % sum(best.values()))
+        if core.NLP.hits or core.NLP.misses:
+            print("CoreNLP replay: %s recorded, %s tokenized" % (core.NLP.hits, core.NLP.misses))
+    finally:
+        shutil.rmtree(tmpdir)
+    if options.save_baseline:
+        with open(options.save_baseline, "w") as fh:
+            json.dump(timings, fh, indent=2, sort_keys=True)
+        print("Baseline saved to %s" % options.save_baseline)
+    if options.baseline:
+        with open(options.baseline) as fh:
+            baseline = json.load(fh)
+        if (baseline.get('model'), baseline.get('corpus')) != (timings['model'], timings['corpus']):
+            print("Baseline was made with model %s on the %s corpus: not compared" % (baseline.get('model'), baseline.get('corpus')))
+            return
+        regressions = compare(timings, baseline, options.threshold)
+        for size, stage, base, seconds in regressions:
+            print("REGRESSION: %s articles, %s: %.4f s -> %.4f s (%+.0f%%)" % (size, stage, base, seconds, (seconds / base - 1) * 100))
+        if regressions:
+            sys.exit(1)
+        print("No regressions over %s (threshold %.0f%%)" % (options.baseline, options.threshold * 100))
+
+
+if __name__ == "__main__":
+    main()
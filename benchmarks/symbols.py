@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+'''
+Benchmark of the "symbols" analysis (NER only) against the "ppi" analysis
+(candidates, features and prediction). Reports articles per second of both
+modes and checks that they find the same proteins.
+
+With --annotation-cache, a first run fills the cache so that the timed runs
+do not depend on the StanfordCoreNLP server.
+
+Usage:
+    python benchmarks/symbols.py -p pmids.txt -d PMC -i http://localhost:9000
+    python benchmarks/symbols.py -n 200 --annotation-cache /tmp/annotations.db
+'''
+from ppaxe import core
+from ppaxe import cache
+from workers import synthetic_texts
+import argparse
+import time
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--pmids', help='Text file with a list of PMids (default: synthetic articles)')
+    parser.add_argument('-d', '--database', default="PMC")
+    parser.add_argument('-n', '--articles', type=int, default=100, help='Number of synthetic articles')
+    parser.add_argument('-i', '--ip', default="http://localhost:9000")
+    parser.add_argument('--annotation-cache', help='SQLite file of the annotation cache')
+    return parser.parse_args()
+
+
+def run(texts, mode):
+    '''
+    Analyzes the texts in mode "ppi" or "symbols". Returns (results, seconds)
+    '''
+    start = time.time()
+    results = list()
+    for idx, text in enumerate(texts):
+        article = core.Article(pmid=str(idx), fulltext=text)
+        article.extract_sentences()
+        sentences = article.annotate_sentences()
+        if mode == "symbols":
+            for sentence in sentences:
+                sentence.get_proteins()
+        else:
+            for sentence in sentences:
+                sentence.get_candidates()
+                sentence.compute_features()
+            core.predict_candidates([ candidate for sentence in sentences for candidate in sentence.candidates ])
+        results.append(article.summarize())
+    return results, time.time() - start
+
+
+def main():
+    options = get_options()
+    core.NLP_URL = options.ip
+    if options.annotation_cache:
+        core.ANNOTATION_CACHE = cache.AnnotationCache(options.annotation_cache)
+    if options.pmids:
+        with open(options.pmids) as fh:
+            pmids = [line.strip() for line in fh if line.strip()]
+        query = core.PMQuery(ids=pmids, database=options.database)
+        query.get_articles()
+        texts = [ article.fulltext if options.database == "PMC" else article.abstract for article in query.articles ]
+    else:
+        texts = synthetic_texts(options.articles)
+    core.warmup()
+    if options.annotation_cache:
+        run(texts, "symbols")
+    proteins = dict()
+    speed = dict()
+    for mode in ("ppi", "symbols"):
+        results, seconds = run(texts, mode)
+        proteins[mode] = [ result.proteins for result in results ]
+        speed[mode] = len(results) / max(seconds, 1e-9)
+        print("%-8s  articles: %5d  articles/s: %8.2f" % (mode, len(results), speed[mode]))
+    print("symbols/ppi speedup: %.2f" % (speed["symbols"] / max(speed["ppi"], 1e-9)))
+    print("Same proteins in both modes: %s" % (proteins["ppi"] == proteins["symbols"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+'''
+Benchmark of the annotation throughput against a simulated StanfordCoreNLP
+server (ppaxe.nlpserver) with the given latency, concurrency limit and error
+rate. Reports sentences per second for each number of client threads and
+batch size, without network nor JVM.
+
+Usage:
+    python benchmarks/throughput.py --latency 0.05 --per-char 0.00002 --server-threads 4 -t 1,2,4,8 -b 1,2000,8000
+'''
+from ppaxe import core
+from ppaxe import nlpserver
+from pycorenlp import StanfordCoreNLP
+from workers import synthetic_texts
+import argparse
+import time
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--articles', type=int, default=20, help='Number of synthetic articles')
+    parser.add_argument('-t', '--threads', default="1,2,4", help='Comma-separated numbers of client threads')
+    parser.add_argument('-b', '--batch-chars', default="1,%s" % core.BATCH_MAX_CHARS, help='Comma-separated batch sizes (1: one sentence per request)')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds per annotation')
+    parser.add_argument('--per-char', type=float, default=0.00001, help='Extra seconds per character')
+    parser.add_argument('--server-threads', type=int, default=4, help='Concurrent annotations of the server')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of annotations that fail')
+    parser.add_argument('--store', help='JSON lines file with recorded CoreNLP responses')
+    return parser.parse_args()
+
+
+def run(texts, max_chars, threads):
+    '''
+    Annotates the texts and returns (sentences, annotated sentences, seconds)
+    '''
+    sentences = 0
+    annotated = 0
+    start = time.time()
+    for idx, text in enumerate(texts):
+        article = core.Article(pmid=str(idx), fulltext=text)
+        article.extract_sentences()
+        sentences += len(article.sentences)
+        annotated += len(article.annotate_sentences(max_chars=max_chars, threads=threads))
+    return sentences, annotated, time.time() - start
+
+
+def main():
+    options = get_options()
+    server = nlpserver.start(store=options.store, latency=options.latency, per_char=options.per_char,
+                             threads=options.server_threads, error_rate=options.error_rate, seed=1)
+    core.NLP = StanfordCoreNLP(server.url)
+    core.ANNOTATION_CACHE = None
+    texts = synthetic_texts(options.articles)
+    try:
+        print("%10s  %7s  %9s  %9s  %12s" % ("batch", "threads", "requests", "annotated", "sentences/s"))
+        for max_chars in [ int(value) for value in options.batch_chars.split(",") ]:
+            for threads in [ int(value) for value in options.threads.split(",") ]:
+                before = server.get_stats()['requests']
+                sentences, annotated, seconds = run(texts, max_chars, threads)
+                print("%10s  %7s  %9s  %9s  %12.2f" % (max_chars, threads, server.get_stats()['requests'] - before,
+                                                      "%s/%s" % (annotated, sentences), sentences / max(seconds, 1e-9)))
+    finally:
+        server.shutdown()
+        server.server_close()
+    stats = server.get_stats()
+    print("Server: %s requests, %s errors, at most %s concurrent" % (stats['requests'], stats['errors'], stats['max_running']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+'''
+Benchmark of the memory used by the tokens of a sentence: list of CoreNLP
+dictionaries vs TokenStore. Reports bytes per token, with and without the shared
+string vocabulary (which is paid once per process, not per sentence).
+
+Usage:
+    python benchmarks/tokens.py                      # synthetic tokens
+    python benchmarks/tokens.py -j corenlp_output.json  # tokens in a CoreNLP json response
+'''
+from ppaxe import tokenstore
+import argparse
+import json
+import random
+import sys
+
+
+def deep_size(obj, seen=None):
+    '''
+    Returns the size in bytes of obj and all the objects it references
+    '''
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_size(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+def synthetic_sentences(nsentences, ntokens=30, vocabulary=5000):
+    '''
+    Returns a list of sentences (lists of CoreNLP-like token dictionaries)
+    '''
+    random.seed(1)
+    words = [ "word%s" % i for i in range(vocabulary) ]
+    tags  = ["NN", "NNS", "VBZ", "VBD", "IN", "DT", "JJ", "CD", ",", "."]
+    sentences = list()
+    for i in range(nsentences):
+        tokens = list()
+        offset = 0
+        for idx in range(ntokens):
+            word = random.choice(words)
+            tokens.append({
+                'index': idx + 1, 'word': word, 'originalText': word, 'lemma': word,
+                'characterOffsetBegin': offset, 'characterOffsetEnd': offset + len(word),
+                'pos': random.choice(tags), 'ner': "P" if random.random() < 0.05 else "O",
+                'before': " " if idx else "", 'after': " "
+            })
+            offset += len(word) + 1
+        sentences.append(tokens)
+    return sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-j', '--json', help="StanfordCoreNLP json response")
+    parser.add_argument('-n', '--sentences', type=int, default=10000)
+    options = parser.parse_args()
+
+    if options.json:
+        with open(options.json) as fh:
+            sentences = [ sentence['tokens'] for sentence in json.load(fh)['sentences'] ]
+    else:
+        sentences = synthetic_sentences(options.sentences)
+    ntokens = sum(len(tokens) for tokens in sentences)
+    # Strings are shared with the vocabulary in both cases, so measure each sentence separately
+    dict_bytes  = sum(deep_size(json.loads(json.dumps(tokens))) for tokens in sentences)
+    stores      = [ tokenstore.TokenStore(tokens) for tokens in sentences ]
+    # The strings shared by the stores (vocabularies, whitespace) are counted once
+    vocab_seen  = set()
+    vocab_bytes = deep_size(tokenstore.STRINGS, vocab_seen) + deep_size(tokenstore.TAGS, vocab_seen)
+    store_bytes = sum(deep_size(store, seen=vocab_seen) for store in stores)
+    print("Tokens:                           %d" % ntokens)
+    print("list of dicts (bytes/token):      %.1f" % (dict_bytes / float(ntokens)))
+    print("TokenStore (bytes/token):         %.1f" % (store_bytes / float(ntokens)))
+    print("TokenStore + vocabulary (b/token): %.1f" % ((store_bytes + vocab_bytes) / float(ntokens)))
+
+
+if __name__ == "__main__":
+    main()
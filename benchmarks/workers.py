@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+'''
+Benchmark of the analysis of articles with 1, 2, 4 and 8 worker processes.
+Reports articles per second and speedup over one worker, and checks that all
+the runs give the same results in the same order.
+
+With --annotation-cache, a first run fills the cache so that the timed runs
+measure feature extraction and prediction (the CPU-bound part) and not the
+StanfordCoreNLP server.
+
+Usage:
+    python benchmarks/workers.py -p pmids.txt -d PMC -i http://localhost:9000
+    python benchmarks/workers.py -n 200 --annotation-cache /tmp/annotations.db
+'''
+from ppaxe import core
+from ppaxe import workers
+import argparse
+import random
+import time
+
+
+WORDS = ["seems", "to", "interact", "with", "binds", "the", "and", "is", "activated", "by",
+         "expression", "of", "in", "cells", "which", "inhibits", "phosphorylation", "complex"]
+PROTEINS = ["MAPK13", "MAPK12", "ALB", "TP53", "MDM2", "EGFR", "GRB2", "SOS1", "AKT1", "PTEN"]
+
+
+def get_options():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--pmids', help='Text file with a list of PMids (default: synthetic articles)')
+    parser.add_argument('-d', '--database', default="PMC")
+    parser.add_argument('-n', '--articles', type=int, default=100, help='Number of synthetic articles')
+    parser.add_argument('-i', '--ip', default="http://localhost:9000")
+    parser.add_argument('-w', '--workers', default="1,2,4,8", help='Comma-separated numbers of workers')
+    parser.add_argument('--annotation-cache', help='SQLite file of the annotation cache')
+    return parser.parse_args()
+
+
+def synthetic_texts(number, sentences=20, seed=1):
+    '''
+    Returns number texts with random sentences mentioning proteins
+    '''
+    rand = random.Random(seed)
+    texts = list()
+    for idx in range(number):
+        text = list()
+        for i in range(sentences):
+            words = [ rand.choice(WORDS) for j in range(rand.randint(8, 30)) ]
+            for j in range(rand.randint(0, 4)):
+                words.insert(rand.randint(0, len(words)), rand.choice(PROTEINS))
+            # Upper-case only the first character: capitalize() would lower-case the symbols
+            sentence = " ".join(words)
+            text.append(sentence[0].upper() + sentence[1:] + ".")
+        texts.append(" ".join(text))
+    return texts
+
+def synthetic_articles(number, sentences=20, seed=1):
+    '''
+    Returns number Article objects with random sentences mentioning proteins
+    (see synthetic_texts())
+    '''
+    return [ core.Article(pmid=str(idx), fulltext=text) for idx, text in enumerate(synthetic_texts(number, sentences, seed)) ]
+
+
+def run(articles, nworkers, settings):
+    '''
+    Analyzes the articles with nworkers processes and returns (results, seconds)
+    '''
+    # Start the workers (and load the resources) before timing
+    pool = workers.ArticlePool(nworkers, settings)
+    list(pool.imap(articles[:nworkers]))
+    start = time.time()
+    results = list(pool.imap(articles))
+    seconds = time.time() - start
+    pool.close()
+    return results, seconds
+
+
+def main():
+    options = get_options()
+    if options.pmids:
+        with open(options.pmids) as fh:
+            pmids = [line.strip() for line in fh if line.strip()]
+        query = core.PMQuery(ids=pmids, database=options.database)
+        query.get_articles()
+        articles = query.articles
+    else:
+        articles = synthetic_articles(options.articles)
+    settings = {
+        'nlp_url': options.ip,
+        'source': "abstract" if options.pmids and options.database == "PUBMED" else "fulltext",
+        'max_chars': core.BATCH_MAX_CHARS,
+        'threads': 1,
+        'cache': options.annotation_cache,
+        'cache_max_size': 1024**3
+    }
+    if options.annotation_cache:
+        run(articles, 1, settings)
+    reference = None
+    base = None
+    for nworkers in [ int(number) for number in options.workers.split(",") ]:
+        results, seconds = run(articles, nworkers, settings)
+        base = base or seconds
+        if reference is None:
+            reference = results
+        print("workers: %2d  articles: %5d  articles/s: %8.2f  speedup: %5.2f  same results: %s" % (
+            nworkers, len(results), len(results) / max(seconds, 1e-9), base / max(seconds, 1e-9), results == reference
+        ))
+
+
+if __name__ == "__main__":
+    main()
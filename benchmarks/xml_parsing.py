@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+'''
+Benchmark of the parsing of efetch XML: minidom (as PMQuery did before) vs the
+streaming parser (core.iter_article_elements). Each parser runs in a new python
+process, which reports the parsing time and the peak RSS increase.
+
+Usage:
+    python benchmarks/xml_parsing.py                       # synthetic 200 full-text articles
+    python benchmarks/xml_parsing.py -f efetch_pmc.xml -d PMC  # recorded efetch payload
+'''
+from ppaxe import core
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+WORDS = ["protein", "binds", "MAPK", "ALB", "cells", "expression", "the", "of", "interaction", "kinase"]
+
+
+def synthetic_pmc(filename, narticles=200, nparagraphs=80, nwords=120):
+    '''
+    Writes a PMC efetch-like XML file with narticles full-text articles
+    '''
+    random.seed(1)
+    with open(filename, "w") as fh:
+        fh.write("<pmc-articleset>")
+        for i in range(narticles):
+            fh.write(
+                '<article><front><journal-meta><journal-id journal-id-type="nlm-ta">J Test</journal-id></journal-meta>'
+                '<article-meta><article-id pub-id-type="pmid">%s</article-id><article-id pub-id-type="pmc">%s</article-id>'
+                '<pub-date><year>2017</year></pub-date></article-meta></front><body><sec>' % (1000 + i, 2000 + i)
+            )
+            for j in range(nparagraphs):
+                words = [ random.choice(WORDS) for k in range(nwords) ]
+                words[5] = "<italic>%s</italic>" % words[5]
+                fh.write("<p>%s.</p>" % " ".join(words))
+            fh.write("</sec></body></article>")
+        fh.write("</pmc-articleset>")
+
+
+def minidom_to_text(node):
+    '''
+    Returns the text directly contained in a minidom node, without the tags
+    '''
+    return " ".join(t.nodeValue for t in node.childNodes if t.nodeType == t.TEXT_NODE)
+
+
+def parse(parser, database, filename):
+    '''
+    Parses filename with parser ("minidom" or "stream") and prints the time and
+    the peak RSS increase (kB) as json
+    '''
+    with open(filename, "rb") as fh:
+        content = fh.read()
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if parser == "minidom":
+        from xml.dom import minidom
+        tag = core.ARTICLE_TAGS[database][1]
+        narticles = 0
+        for article in minidom.parseString(content).getElementsByTagName(tag):
+            if database == "PMC":
+                body = article.getElementsByTagName('body')
+                text = "\n".join(minidom_to_text(par) for par in body[0].getElementsByTagName('p'))
+            else:
+                text = "\n".join(minidom_to_text(abst) for abst in article.getElementsByTagName('AbstractText'))
+            narticles += 1
+    else:
+        make_article = core.pmc_article if database == "PMC" else core.pubmed_article
+        articles = [ make_article(element) for element in core.iter_article_elements(database, content) ]
+        narticles = len([ article for article in articles if article is not None ])
+    elapsed = time.time() - start
+    print(json.dumps({
+        'time': elapsed,
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss,
+        'articles': narticles
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-f', '--file', default=None, help="efetch XML file")
+    parser.add_argument('-d', '--database', default="PMC", help="PMC or PUBMED")
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+    if options.child:
+        parse(options.child, options.database, options.file)
+        return
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filename = options.file
+        if filename is None:
+            filename = os.path.join(tmpdir, "efetch.xml")
+            synthetic_pmc(filename)
+        print("%s: %.1f MB" % (filename, os.path.getsize(filename) / 1024.0**2))
+        print("%-8s %9s %14s %9s" % ("", "time (s)", "peak RSS (MB)", "articles"))
+        for name in ("minidom", "stream"):
+            output = subprocess.check_output([
+                sys.executable, __file__, "--child", name, "-d", options.database, "-f", filename
+            ])
+            result = json.loads(output.decode('utf-8'))
+            print("%-8s %9.2f %14.1f %9s" % (name, result['time'], result['rss'] / 1024.0, result['articles']))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+'''
+Persistent caches for ppaxe
+'''
+
+import sqlite3
+import hashlib
+import json
+import zlib
+import time
+import threading
+import contextlib
+import os
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def read_properties(filename):
+    '''
+    Returns the "key = value" lines of a StanfordCoreNLP properties file as a sorted list
+    of (key, value) tuples, skipping blank lines and comments.
+    '''
+    properties = list()
+    with open(filename, "r") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            properties.append((key.strip(), value.strip()))
+    return sorted(properties)
+
+# CLASSES
+# ----------------------------------------------
+class SQLiteCache(object):
+    '''
+    Base class of the on-disk (SQLite) caches: a table of compressed entries with
+    their size and last access time, where the least recently used entries are
+    evicted when the cache exceeds max_size. Several processes can share the same
+    file: the size of the cache is kept in the database and updated in the same
+    transaction as the entries. Subclasses set TABLE and COLUMNS.
+
+    Attributes
+    ----------
+    path : str, no default
+        Path of the SQLite database file.
+
+    max_size : int, no default
+        Maximum size (in bytes) of the stored entries.
+
+    hits : int, no default
+        Number of lookups found in cache.
+
+    misses : int, no default
+        Number of lookups not found in cache.
+
+    size : int, no default
+        Current size (in bytes) of the stored entries (read from the database).
+
+    accessed : dict, no default
+        Access times of the hits not written yet to the database (see ACCESS_BATCH).
+    '''
+    # Name of the table and (name, type) of its columns besides key, size and accessed
+    TABLE   = None
+    COLUMNS = ()
+    # Access times of the hits are written every ACCESS_BATCH hits (and before evicting)
+    ACCESS_BATCH = 100
+    # Seconds to wait for another process writing to the same file
+    TIMEOUT = 60
+
+    def __init__(self, path, max_size=1024**3):
+        '''
+        Parameters
+        ----------
+        path : str, required, no default
+            Path of the SQLite database file. Will be created if it does not exist.
+
+        max_size : int, optional, default = 1024**3
+            Maximum size (in bytes) of the stored entries.
+        '''
+        self.path     = path
+        self.max_size = max_size
+        self.hits     = 0
+        self.misses   = 0
+        self.accessed = dict()
+        self.lock     = threading.Lock()
+        # Transactions are explicit (see _write())
+        self.conn     = sqlite3.connect(path, timeout=self.TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self._write():
+            self.create_tables()
+
+    def create_tables(self):
+        '''
+        Creates the table of the entries and the row of its size in the meta table
+        '''
+        columns = "".join(", %s %s" % column for column in self.COLUMNS)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY%s, size INTEGER, accessed REAL)" % (self.TABLE, columns)
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS %s_accessed_idx ON %s (accessed)" % (self.TABLE, self.TABLE))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self.conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) SELECT ?, COALESCE(SUM(size), 0) FROM %s" % self.TABLE,
+            (self.TABLE,)
+        )
+
+    @contextlib.contextmanager
+    def _write(self):
+        '''
+        Runs the statements of the block in a write transaction: other processes
+        wait until it is committed (or rolled back if the block raises)
+        '''
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    @property
+    def size(self):
+        with self.lock:
+            return self.conn.execute("SELECT value FROM meta WHERE name = ?", (self.TABLE,)).fetchone()[0]
+
+    def _read(self, key):
+        '''
+        Returns the row with the COLUMNS of key or None if it is not in the cache.
+        Must be called holding lock.
+        '''
+        return self.conn.execute(
+            "SELECT %s FROM %s WHERE key = ?" % (", ".join(name for name, kind in self.COLUMNS), self.TABLE), (key,)
+        ).fetchone()
+
+    def _hit(self, key):
+        '''
+        Counts a hit of key and records its access time. Must be called holding lock.
+        '''
+        self.hits += 1
+        self.accessed[key] = time.time()
+        if len(self.accessed) >= self.ACCESS_BATCH:
+            with self._write():
+                self.__write_accessed()
+
+    def _store(self, key, values, size):
+        '''
+        Stores the values of the COLUMNS of key, of size bytes, evicting the least
+        recently used entries if the cache exceeds max_size.
+        '''
+        names = ", ".join(name for name, kind in self.COLUMNS)
+        marks = ", ".join("?" for column in self.COLUMNS)
+        with self.lock, self._write():
+            row = self.conn.execute("SELECT size FROM %s WHERE key = ?" % self.TABLE, (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO %s (key, %s, size, accessed) VALUES (?, %s, ?, ?)" % (self.TABLE, names, marks),
+                (key,) + tuple(values) + (size, time.time())
+            )
+            total = self.__add_size(size - (row[0] if row is not None else 0))
+            if total > self.max_size:
+                self.__write_accessed()
+                self.__evict(total)
+
+    def __add_size(self, delta):
+        '''
+        Adds delta to the size of the cache in the database and returns the new size
+        '''
+        self.conn.execute("UPDATE meta SET value = value + ? WHERE name = ?", (delta, self.TABLE))
+        return self.conn.execute("SELECT value FROM meta WHERE name = ?", (self.TABLE,)).fetchone()[0]
+
+    def __write_accessed(self):
+        '''
+        Writes the access times of the hits not written yet
+        '''
+        self.conn.executemany(
+            "UPDATE %s SET accessed = MAX(accessed, ?) WHERE key = ?" % self.TABLE,
+            [ (accessed, key) for key, accessed in self.accessed.items() ]
+        )
+        self.accessed.clear()
+
+    def __evict(self, size):
+        '''
+        Removes the least recently used entries until the cache is 90% of max_size.
+        '''
+        target = self.max_size * 0.9
+        cursor = self.conn.execute("SELECT key, size FROM %s ORDER BY accessed ASC" % self.TABLE)
+        evicted = list()
+        freed = 0
+        for key, entry_size in cursor:
+            if size - freed <= target:
+                break
+            evicted.append((key,))
+            freed += entry_size
+        cursor.close()
+        self.conn.executemany("DELETE FROM %s WHERE key = ?" % self.TABLE, evicted)
+        self.__add_size(-freed)
+
+    def hit_rate(self):
+        '''
+        Returns the fraction of lookups found in cache.
+        '''
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / float(lookups)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM %s" % self.TABLE).fetchone()[0]
+
+    def close(self):
+        '''
+        Writes the pending access times and closes the database connection
+        '''
+        with self.lock:
+            if self.accessed:
+                with self._write():
+                    self.__write_accessed()
+            self.conn.close()
+
+
+class AnnotationCache(SQLiteCache):
+    '''
+    On-disk (SQLite) cache of StanfordCoreNLP annotations. Tokens are stored
+    compressed, keyed by the hash of the sentence text and the server configuration,
+    and the least recently used entries are evicted when the cache exceeds max_size.
+
+    Attributes
+    ----------
+    config : str, no default
+        Hash of the StanfordCoreNLP server configuration (annotators, NER model...).
+
+    See SQLiteCache for the rest of attributes.
+    '''
+    PROPERTIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'server.properties')
+    TABLE   = "annotations"
+    COLUMNS = (("tokens", "BLOB"),)
+
+    def __init__(self, path, max_size=1024**3, properties=None):
+        '''
+        Parameters
+        ----------
+        path : str, required, no default
+            Path of the SQLite database file. Will be created if it does not exist.
+
+        max_size : int, optional, default = 1024**3
+            Maximum size (in bytes) of the stored annotations.
+
+        properties : str, optional, default = None
+            StanfordCoreNLP properties file used by the server. If None, data/server.properties.
+        '''
+        if properties is None:
+            properties = AnnotationCache.PROPERTIES_FILE
+        self.config = hashlib.sha1(json.dumps(read_properties(properties)).encode('utf-8')).hexdigest()
+        super(AnnotationCache, self).__init__(path, max_size)
+
+    def key(self, text):
+        '''
+        Returns the cache key of a sentence text
+        '''
+        return hashlib.sha1((self.config + "\n" + text).encode('utf-8')).hexdigest()
+
+    def get(self, text):
+        '''
+        Returns the cached tokens of text or None if they are not in the cache.
+        '''
+        key = self.key(text)
+        with self.lock:
+            row = self._read(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._hit(key)
+        return json.loads(zlib.decompress(bytes(row[0])).decode('utf-8'))
+
+    def set(self, text, tokens):
+        '''
+        Stores the tokens of text in the cache, evicting the least recently used
+        annotations if the cache exceeds max_size.
+        '''
+        blob = zlib.compress(json.dumps(tokens).encode('utf-8'))
+        self._store(self.key(text), (sqlite3.Binary(blob),), len(blob))
+
+
+class ArticleCache(SQLiteCache):
+    '''
+    On-disk (SQLite) cache of the XML of the articles downloaded from PubMed/PMC,
+    keyed by database and identifier. XML is stored compressed, entries older than
+    ttl seconds are fetched again and the least recently used entries are evicted
+    when the cache exceeds max_size. In offline mode, expired entries are still used
+    and articles not in the cache are not fetched.
+
+    The PubMed to PMC id conversions are kept in a table of their own, with the same
+    ttl, but they are not counted in the lookups nor in the size of the cache.
+
+    Attributes
+    ----------
+    ttl : float, no default
+        Seconds after which the cached articles are fetched again (None to keep them forever).
+
+    offline : bool, no default
+        True if only the cached articles have to be used.
+
+    expired : int, no default
+        Number of lookups found in cache but expired (also counted in misses).
+
+    See SQLiteCache for the rest of attributes.
+    '''
+    TABLE   = "articles"
+    COLUMNS = (("xml", "BLOB"), ("fetched", "REAL"))
+
+    def __init__(self, path, max_size=1024**3, ttl=30*24*3600, offline=False):
+        '''
+        Parameters
+        ----------
+        path : str, required, no default
+            Path of the SQLite database file. Will be created if it does not exist.
+
+        max_size : int, optional, default = 1024**3
+            Maximum size (in bytes) of the stored articles.
+
+        ttl : float, optional, default = 30 days
+            Seconds after which the cached articles are fetched again (None to keep them forever).
+
+        offline : bool, optional, default = False
+            Use only the cached articles.
+        '''
+        self.ttl     = ttl
+        self.offline = offline
+        self.expired = 0
+        super(ArticleCache, self).__init__(path, max_size)
+
+    def key(self, database, identifier):
+        '''
+        Returns the cache key of an article
+        '''
+        return "%s:%s" % (database, identifier)
+
+    def create_tables(self):
+        '''
+        Creates the table of the articles and the table of the id conversions
+        '''
+        super(ArticleCache, self).create_tables()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS idconv (pmid TEXT PRIMARY KEY, pmcid TEXT, fetched REAL)")
+
+    def __is_expired(self, fetched):
+        '''
+        Returns True if an entry fetched at that time has to be fetched again
+        '''
+        return self.ttl is not None and not self.offline and time.time() - fetched > self.ttl
+
+    def get(self, database, identifier):
+        '''
+        Returns the cached XML (bytes) of the article or None if it is not
+        in the cache or it has expired.
+        '''
+        key = self.key(database, identifier)
+        with self.lock:
+            row = self._read(key)
+            if row is None:
+                self.misses += 1
+                return None
+            if self.__is_expired(row[1]):
+                self.misses  += 1
+                self.expired += 1
+                return None
+            self._hit(key)
+        return zlib.decompress(bytes(row[0]))
+
+    def has(self, database, identifier):
+        '''
+        Returns True if the article is in the cache and has not expired. Misses are
+        counted here, hits are counted when the article is read with get().
+        '''
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched FROM articles WHERE key = ?", (self.key(database, identifier),)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False
+            if self.__is_expired(row[0]):
+                self.misses  += 1
+                self.expired += 1
+                return False
+        return True
+
+    def set(self, database, identifier, xml):
+        '''
+        Stores the XML (bytes) of the article in the cache, evicting the least
+        recently used articles if the cache exceeds max_size.
+        '''
+        blob = zlib.compress(xml)
+        self._store(self.key(database, identifier), (sqlite3.Binary(blob), time.time()), len(blob))
+
+    def get_pmcid(self, pmid):
+        '''
+        Returns the cached PMC id of a PubMed id ("" if the article is not in PMC), or
+        None if the conversion is not in the cache or it has expired.
+        '''
+        with self.lock:
+            row = self.conn.execute("SELECT pmcid, fetched FROM idconv WHERE pmid = ?", (pmid,)).fetchone()
+        if row is None or self.__is_expired(row[1]):
+            return None
+        return row[0]
+
+    def set_pmcids(self, conversions):
+        '''
+        Stores a list of (PubMed id, PMC id) conversions, with "" as the PMC id of
+        the articles not in PMC.
+        '''
+        now = time.time()
+        with self.lock, self._write():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO idconv (pmid, pmcid, fetched) VALUES (?, ?, ?)",
+                [ (pmid, pmcid, now) for pmid, pmcid in conversions ]
+            )
@@ -3,18 +3,27 @@
 Core classes for ppaxe ppi predictor
 '''
 
-import requests
-from xml.dom import minidom
+from xml.etree import ElementTree
+import io
 import json
 import re
-import time
 from pycorenlp import StanfordCoreNLP
 import itertools
+import collections
+from multiprocessing.pool import ThreadPool
 from bisect import bisect_left
 import math
 import sys
-import pkg_resources
+import os
+import threading
+import atexit
 from scipy import sparse
+import numpy as np
+from ppaxe.tokenstore import TokenStore
+from ppaxe import genedict
+from ppaxe import fetch
+from ppaxe import instrument
+from ppaxe import nlppool
 import logging
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -23,42 +32,310 @@ try:
     # For python 2.7
     import cPickle as pickle
     from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
     reload(sys)
     sys.setdefaultencoding('utf8')
 except:
     # For python 3
     import _pickle as pickle
     from html.parser import HTMLParser
+    # HTMLParser.unescape() was removed in python 3.9
+    from html import unescape
     from importlib import reload
 
 
-NLP = StanfordCoreNLP('http://localhost:9000')
+# StanfordCoreNLP client, created on first use by get_nlp().
+# Assign a new client to use another server. NLP_URL can have several
+# comma-separated addresses (see nlppool.BalancedNLP).
+NLP = None
+NLP_URL = 'http://localhost:9000'
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+# Lock to load the classifier and the gene dictionary only once
+RESOURCE_LOCK = threading.Lock()
+
+# Maximum number of characters sent to StanfordCoreNLP in a single batched request
+BATCH_MAX_CHARS = 10000
+# Sentences in a batch are sent one per line, and CoreNLP is told to
+# never let a sentence cross a line break.
+BATCH_SEPARATOR  = "\n"
+BATCH_PROPERTIES = {'ssplit.newlineIsSentenceBreak': 'always'}
+# Thread pool used for concurrent annotation (by number of threads, at most one)
+THREAD_POOLS = dict()
+THREAD_POOLS_LOCK = threading.Lock()
+# cache.AnnotationCache used by Sentence.annotate() and annotate_batch() (None to disable)
+ANNOTATION_CACHE = None
+
+# NCBI web services
+EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+IDCONV_URL = "https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/"
+# fetch.Fetcher used for the NCBI requests, created on first use by get_fetcher().
+# Assign a new one to use an API key or to change the number of concurrent requests.
+FETCHER = None
+# cache.ArticleCache with the XML of the downloaded articles (None to disable)
+ARTICLE_CACHE = None
+# Root and article tags of the efetch XML of each database
+ARTICLE_TAGS = {
+    'PMC':    ('pmc-articleset', 'article'),
+    'PUBMED': ('PubmedArticleSet', 'PubmedArticle')
+}
 
 # FUNCTIONS
 # ----------------------------------------------
-def pmid_2_pmc(identifiers):
+def get_nlp():
     '''
-    Transforms a list of PubMed Ids to PMC ids
+    Returns the StanfordCoreNLP client (NLP), connecting to NLP_URL if not set.
+    With several addresses in NLP_URL (list or comma-separated), the client is a
+    nlppool.BalancedNLP that spreads the requests over them.
     '''
-    pmcids = set()
-    maxidents = 200
+    global NLP
+    if NLP is None:
+        urls = nlppool.split_urls(NLP_URL)
+        if len(urls) > 1:
+            NLP = nlppool.BalancedNLP(urls)
+        else:
+            NLP = StanfordCoreNLP(urls[0])
+    return NLP
 
-    for subset in [identifiers[x:x+maxidents] for x in range(0, len(identifiers),maxidents)]:
-        params = {
-            'ids': ",".join(subset),
-            'format': 'json'
-        }
-        req = requests.get("https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/", params=params)
-        if req.status_code == 200:
-            response = json.loads(req.content.decode('latin1'))
-            for record in response['records']:
-                if 'status' in record:
-                    continue
-                pmcids.add(record['pmcid'][3:])
+def get_predictor():
+    '''
+    Returns the Random Forest classifier, unpickling it from
+    InteractionCandidate.PRED_FILE the first time.
+    '''
+    if InteractionCandidate.predictor is None:
+        with RESOURCE_LOCK:
+            if InteractionCandidate.predictor is None:
+                with open(InteractionCandidate.PRED_FILE, 'rb') as f:
+                    try:
+                        predictor = pickle.load(f)
+                    except:
+                        f.seek(0)
+                        predictor = pickle.load(f, encoding='latin1')
+                InteractionCandidate.predictor = predictor
+    return InteractionCandidate.predictor
+
+def get_gene_dictionary():
+    '''
+    Returns the HGNC dictionary (upper-case alias -> approved symbol), loading it the first time:
+    a genedict.GeneIndex mapping Protein.GENEINDEXFILE, that is compiled from
+    Protein.GENEDICTFILE if it does not exist or is outdated. If the index can't be
+    written there (e.g. read-only installation), it is compiled in the user cache
+    directory (genedict.user_index_path). If that also fails, the text dictionary is
+    read into a dict.
+    '''
+    if Protein.GENEDICT is None:
+        with RESOURCE_LOCK:
+            if Protein.GENEDICT is None:
+                for index in (Protein.GENEINDEXFILE, genedict.user_index_path(Protein.GENEDICTFILE)):
+                    try:
+                        Protein.GENEDICT = load_gene_index(index)
+                        break
+                    except (IOError, OSError, ValueError) as err:
+                        logging.info("Can't use the gene dictionary index %s: %s", index, err)
+                else:
+                    if os.path.exists(Protein.GENEDICTFILE):
+                        logging.warning("Can't compile the gene dictionary index. Reading %s into memory.", Protein.GENEDICTFILE)
+                    try:
+                        Protein.GENEDICT = genedict.read_dictionary(Protein.GENEDICTFILE)
+                    except Exception:
+                        raise GeneDictError("Can't read %s\n" % Protein.GENEDICTFILE)
+    return Protein.GENEDICT
+
+def load_gene_index(index):
+    '''
+    Returns the genedict.GeneIndex in index, compiling Protein.GENEDICTFILE into
+    it if it does not exist or is outdated.
+    '''
+    if not genedict.is_current(index, Protein.GENEDICTFILE):
+        directory = os.path.dirname(index)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        genedict.compile_dictionary(Protein.GENEDICTFILE, index)
+    return genedict.GeneIndex(index)
+
+def get_fetcher():
+    '''
+    Returns the fetch.Fetcher used for the NCBI requests (FETCHER), creating one
+    with the default limits (no API key) if not set.
+    '''
+    global FETCHER
+    if FETCHER is None:
+        FETCHER = fetch.Fetcher()
+    return FETCHER
+
+def warmup():
+    '''
+    Loads the classifier, the gene dictionary and the StanfordCoreNLP client,
+    that are otherwise loaded the first time they are needed.
+    Useful for servers, to avoid paying the loading time in the first request.
+    '''
+    get_predictor()
+    get_gene_dictionary()
+    get_nlp()
+
+def pmid_2_pmc(identifiers, batch_size=200):
+    '''
+    Transforms a list of PubMed Ids to PMC ids. Yields the list of PMC ids of each
+    batch of batch_size PubMed Ids (in their order and without repeated ids) as soon
+    as it is converted, so the articles can be requested while the rest are converted.
+    Conversions are looked up in ARTICLE_CACHE first (if set) and only the missing
+    ones are requested.
+    '''
+    identifiers = list(identifiers)
+    offline = ARTICLE_CACHE is not None and ARTICLE_CACHE.offline
+    batches = list()
+    queries = list()
+    for x in range(0, len(identifiers), batch_size):
+        known = dict()
+        if ARTICLE_CACHE is not None:
+            for pmid in identifiers[x:x+batch_size]:
+                pmcid = ARTICLE_CACHE.get_pmcid(pmid)
+                if pmcid is not None:
+                    known[pmid] = pmcid
+        missing = list(collections.OrderedDict.fromkeys(
+            pmid for pmid in identifiers[x:x+batch_size] if pmid not in known
+        ))
+        if offline:
+            missing = list()
+        if missing:
+            queries.append((IDCONV_URL, {'ids': ",".join(missing), 'format': 'json'}))
+        batches.append((identifiers[x:x+batch_size], known, missing))
+
+    responses = get_fetcher().imap(queries)
+    seen = set()
+    for batch, known, missing in batches:
+        unmatched = list()
+        if missing:
+            conversions = read_idconv(next(responses))
+            if ARTICLE_CACHE is not None:
+                # Articles not in PMC are cached too (as empty strings)
+                ARTICLE_CACHE.set_pmcids([ (pmid, pmcid) for pmid, pmcid in conversions if pmid is not None ])
+            for pmid, pmcid in conversions:
+                if pmid is not None:
+                    known[pmid] = pmcid
+                else:
+                    unmatched.append(pmcid)
+        pmcids = list()
+        for pmcid in [ known.get(pmid) for pmid in batch ] + unmatched:
+            if pmcid and pmcid not in seen:
+                seen.add(pmcid)
+                pmcids.append(pmcid)
+        yield pmcids
+
+def read_idconv(req):
+    '''
+    Returns the list of (PubMed id, PMC id) conversions of an idconv response,
+    with "" as the PMC id of the articles not in PMC.
+    '''
+    if req.status_code != 200:
+        raise PubMedQueryError("Can't convert identifiers through Pubmed idconv tool.")
+    response = json.loads(req.content.decode('latin1'))
+    conversions = list()
+    for record in response['records']:
+        pmid = record.get('requested-id', record.get('pmid'))
+        if 'status' in record:
+            pmcid = ""
         else:
-            raise PubMedQueryError("Can't convert identifiers through Pubmed idconv tool.")
-        time.sleep(3)
-    return list(pmcids)
+            pmcid = record['pmcid'][3:]
+        conversions.append((pmid, pmcid))
+    return conversions
+
+def iter_article_elements(database, content):
+    '''
+    Parses the efetch XML of database ("PMC" or "PUBMED") incrementally and yields the
+    ElementTree element of each article. Articles are cleared once the consumer asks for
+    the next one, so only one article is kept in memory at a time.
+    '''
+    tag = ARTICLE_TAGS[database][1]
+    root = None
+    depth = 0
+    for event, element in ElementTree.iterparse(io.BytesIO(content), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1 and element.tag == tag:
+            yield element
+            root.clear()
+
+def article_identifier(database, element):
+    '''
+    Returns the identifier of an article element: the PMC id (without "PMC")
+    or the PubMed id. None if not found.
+    '''
+    if database == "PMC":
+        for article_id in element.iter('article-id'):
+            if article_id.get('pub-id-type') in ("pmc", "pmcid") and article_id.text:
+                identifier = article_id.text.strip()
+                if identifier.startswith("PMC"):
+                    identifier = identifier[3:]
+                return identifier
+        return None
+    return element.findtext('.//PMID')
+
+def split_articles(database, content):
+    '''
+    Splits the efetch XML of database ("PMC" or "PUBMED") in articles. Returns a list
+    of (identifier, xml) tuples, with the PMC id (without "PMC") or the PubMed id.
+    '''
+    articles = list()
+    for element in iter_article_elements(database, content):
+        identifier = article_identifier(database, element)
+        if identifier:
+            articles.append((identifier, ElementTree.tostring(element)))
+    return articles
+
+def element_to_text(element):
+    '''
+    Takes an ElementTree element and returns the text directly contained in it (without
+    the text of its children), joined by spaces.
+    '''
+    texts = [element.text] + [ child.tail for child in element ]
+    return " ".join(text for text in texts if text is not None)
+
+def pmc_article(element):
+    '''
+    Returns the Article of a PMC <article> element, or None if it has no PMC id or no body.
+    The first two article-id are the PubMed and the PMC identifiers, and the fulltext is
+    made of the paragraphs of the first body.
+    '''
+    article_ids = list(element.iter('article-id'))
+    if len(article_ids) < 2 or not article_ids[1].text:
+        return None
+    body = element.find('.//body')
+    if body is None:
+        return None
+    fulltext = [ element_to_text(par) for par in body.iter('p') ]
+    return Article(
+        pmid=article_ids[0].text,
+        pmcid=article_ids[1].text,
+        journal=element.findtext('.//journal-id'),
+        year=element.findtext('.//year'),
+        fulltext="\n".join(fulltext)
+    )
+
+def pubmed_article(element):
+    '''
+    Returns the Article of a <PubmedArticle> element, or None if it has no abstract.
+    '''
+    abstract_text = "\n".join(element_to_text(abst) for abst in element.iter('AbstractText'))
+    if not abstract_text.strip():
+        return None
+    return Article(
+        pmid=element_to_text(element.find('.//PMID')),
+        journal=element_to_text(element.find('.//Journal').find('.//Title')),
+        year=element.findtext('.//Year'),
+        abstract=abstract_text
+    )
+
+def join_articles(database, articles):
+    '''
+    Joins the XML of several articles (list of bytes) in a single efetch XML document
+    '''
+    root = ARTICLE_TAGS[database][0].encode('utf-8')
+    return b"<" + root + b">" + b"".join(articles) + b"</" + root + b">"
 
 def take_closest(mylist, mynumber):
     """
@@ -89,14 +366,217 @@ def take_farthest(mylist, mynumber):
     else:
         return mylist[-1]
 
-def minidom_to_text(minidom):
+def make_batches(sentences, max_chars=BATCH_MAX_CHARS):
+    '''
+    Groups a list of Sentence objects in lists of consecutive sentences whose
+    text (plus separators) is at most max_chars long. Sentences longer than max_chars
+    and sentences with line breaks in them (which can't be sent in a line-delimited batch)
+    go alone in their own batch.
+    '''
+    batch = list()
+    batch_chars = 0
+    for sentence in sentences:
+        length = len(sentence.originaltext) + len(BATCH_SEPARATOR)
+        if BATCH_SEPARATOR in sentence.originaltext:
+            if batch:
+                yield batch
+            yield [sentence]
+            batch = list()
+            batch_chars = 0
+            continue
+        if batch and batch_chars + length > max_chars:
+            yield batch
+            batch = list()
+            batch_chars = 0
+        batch.append(sentence)
+        batch_chars += length
+    if batch:
+        yield batch
+
+def annotate_batch(sentences):
+    '''
+    Annotates a list of Sentence objects with a single request to StanfordCoreNLP.
+    The sentences are sent one per line and the returned sentences are split back
+    using their character offsets, so that each Sentence object gets the same
+    tokens it would get with Sentence.annotate(). Raises ValueError if the server
+    does not return a valid json response.
+
+    Parameters
+    ----------
+    sentences : list, required, no default
+        List of Sentence objects.
+    '''
+    if len(sentences) == 1 and BATCH_SEPARATOR in sentences[0].originaltext:
+        sentences[0].annotate()
+        return
+    # Blank sentences are not sent (CoreNLP would return nothing for them)
+    # Cached sentences are not sent either
+    to_send = list()
+    for sentence in sentences:
+        if not sentence.originaltext.strip():
+            sentence.tokens = ""
+        elif ANNOTATION_CACHE is not None and sentence.annotate_from_cache():
+            continue
+        else:
+            to_send.append(sentence)
+    if not to_send:
+        return
+    starts = list()
+    offset = 0
+    for sentence in to_send:
+        starts.append(offset)
+        offset += len(sentence.originaltext) + len(BATCH_SEPARATOR)
+    text = BATCH_SEPARATOR.join([sentence.originaltext for sentence in to_send])
+    instrument.observe("corenlp.request_chars", len(text))
+    instrument.observe("corenlp.request_sentences", len(to_send))
+    with instrument.timer("corenlp.request"):
+        response = get_nlp().annotate(text, properties=BATCH_PROPERTIES)
+    annotated = json.loads(response)
+
+    # Group CoreNLP sentences by the line (Sentence object) they come from
+    grouped = [list() for sentence in to_send]
+    for nlp_sentence in annotated['sentences']:
+        if not nlp_sentence['tokens']:
+            continue
+        begin = nlp_sentence['tokens'][0]['characterOffsetBegin']
+        grouped[bisect_left(starts, begin + 1) - 1].append(nlp_sentence)
+
+    for sentence, nlp_sentences, start in zip(to_send, grouped, starts):
+        if not nlp_sentences:
+            continue
+        # Only the first sentence is kept, as Sentence.annotate() does
+        tokens = nlp_sentences[0]['tokens']
+        for token in tokens:
+            token['characterOffsetBegin'] -= start
+            token['characterOffsetEnd']   -= start
+        # Restore the whitespace around the sentence, which now includes the separators
+        if 'before' in tokens[0]:
+            tokens[0]['before'] = sentence.originaltext[:tokens[0]['characterOffsetBegin']]
+        if 'after' in tokens[-1] and len(nlp_sentences) == 1:
+            tokens[-1]['after'] = sentence.originaltext[tokens[-1]['characterOffsetEnd']:]
+        sentence.tokens = tokens
+    if ANNOTATION_CACHE is not None:
+        for sentence in to_send:
+            ANNOTATION_CACHE.set(sentence.originaltext, sentence.tokens.to_list())
+
+def annotate_or_skip(batch):
+    '''
+    Annotates a batch of Sentence objects and returns the ones that could be annotated.
+    If the batch request fails, the sentences are annotated one by one, and those
+    that fail again (ValueError) are skipped.
+    '''
+    if len(batch) > 1:
+        try:
+            annotate_batch(batch)
+            return batch
+        except ValueError:
+            logging.warning("Batch annotation failed. Annotating %s sentences one by one.", len(batch))
+    annotated = list()
+    for sentence in batch:
+        try:
+            sentence.annotate()
+        except ValueError:
+            continue
+        annotated.append(sentence)
+    return annotated
+
+def get_thread_pool(threads):
+    '''
+    Returns a ThreadPool with the specified number of threads. The pool is created
+    once and reused in subsequent calls; asking for a different number of threads
+    closes it and creates a new one, so only one pool is kept.
+    '''
+    with THREAD_POOLS_LOCK:
+        if threads not in THREAD_POOLS:
+            close_thread_pools()
+            THREAD_POOLS[threads] = ThreadPool(threads)
+        return THREAD_POOLS[threads]
+
+def close_thread_pools():
     '''
-    Takes a minidom object and returns the text contained in it without the tags
+    Closes the pools of get_thread_pool() and waits for their threads to finish.
+    Called at exit.
     '''
-    return " ".join(t.nodeValue for t in minidom.childNodes if t.nodeType == t.TEXT_NODE)
+    for threads in list(THREAD_POOLS):
+        pool = THREAD_POOLS.pop(threads)
+        pool.close()
+        pool.join()
+
+atexit.register(close_thread_pools)
+
+def annotate_sentences(sentences, max_chars=BATCH_MAX_CHARS, threads=1):
+    '''
+    Annotates a list of Sentence objects in batches of at most max_chars characters,
+    keeping up to "threads" requests to StanfordCoreNLP in flight at the same time.
+    Returns the Sentence objects that could be annotated, in the same order as in "sentences".
+
+    Parameters
+    ----------
+    sentences : list, required, no default
+        List of Sentence objects.
+
+    max_chars : int, optional, default = BATCH_MAX_CHARS
+        Maximum number of characters per request. If 0, annotates one sentence per request.
+
+    threads : int, optional, default = 1
+        Maximum number of concurrent requests to StanfordCoreNLP.
+    '''
+    if max_chars > 0:
+        batches = list(make_batches(sentences, max_chars))
+    else:
+        batches = [[sentence] for sentence in sentences]
+    if threads > 1 and len(batches) > 1:
+        # map() keeps the order of the batches
+        results = get_thread_pool(threads).map(annotate_or_skip, batches)
+    else:
+        results = [annotate_or_skip(batch) for batch in batches]
+    annotated = list()
+    for result in results:
+        annotated.extend(result)
+    return annotated
+
+def predict_candidates(candidates):
+    '''
+    Predicts a list of InteractionCandidate objects with a single call to the
+    Random Forest classifier, instead of one call per candidate. Computes the
+    features of the candidates that don't have them yet, and fills the attributes
+    votes and label of each candidate, as InteractionCandidate.predict() does.
+
+    Parameters
+    ----------
+    candidates : list, required, no default
+        List of InteractionCandidate objects.
+    '''
+    if not candidates:
+        return
+    for candidate in candidates:
+        if candidate.features_sparse is None:
+            candidate.compute_features()
+    features = sparse.vstack([candidate.features_sparse for candidate in candidates], format="csr")
+    instrument.observe("predict.batch_size", len(candidates))
+    with instrument.timer("predict"):
+        pred = get_predictor().predict_proba(features)[:,1]
+    for candidate, votes in zip(candidates, pred):
+        candidate.votes = round(votes, 3)
+        if votes >= 0.55:
+            candidate.label = True
+        else:
+            candidate.label = False
 
 # CLASSES
 # ----------------------------------------------
+# Compact results of an analyzed article, returned by Article.summarize(): identifiers,
+# numbers of sentences and candidates, disambiguated symbols of all the proteins found and
+# the interactions (candidates predicted as positive).
+ArticleResult = collections.namedtuple(
+    'ArticleResult', ['pmid', 'pmcid', 'journal', 'year', 'sentences', 'candidates', 'proteins', 'interactions']
+)
+# Interaction in an ArticleResult: votes, symbols as found in the text and disambiguated,
+# and html of the candidate and of the sentence.
+Interaction = collections.namedtuple(
+    'Interaction', ['votes', 'prot1', 'symbol1', 'prot2', 'symbol2', 'candidate_html', 'sentence_html']
+)
+
 class PMQuery(object):
     '''
     Class for PubMed queries. Will have Article objects. Will try to
@@ -136,97 +616,120 @@ class PMQuery(object):
         self.found    = set()
         self.notfound = set()
 
-    def __get_pmc(self, req):
+    def __parse_articles(self, content, make_article, store):
+        '''
+        Parses the articles in content one by one with make_article (pmc_article or
+        pubmed_article) and yields them, adding their identifiers to found.
         '''
-        Gets PMC article request and fills articles attribute
+        for element in iter_article_elements(self.database, content):
+            if store:
+                identifier = article_identifier(self.database, element)
+                if identifier:
+                    ARTICLE_CACHE.set(self.database, identifier, ElementTree.tostring(element))
+            with instrument.timer("parse_article"):
+                article = make_article(element)
+            if article is None:
+                continue
+            self.found.add(article.pmid)
+            yield article
 
-        Parameters
-        ----------
-        req : requests.models.Response, required, no default
-            response object to pubmedCentral
-        '''
-        if req.status_code == 200:
-            article_text = minidom.parseString(req.content)
-            articles = article_text.getElementsByTagName('article')
-            for article in articles:
-                pmid    = article.getElementsByTagName('article-id')[0].firstChild.nodeValue
-                journal = article.getElementsByTagName('journal-id')[0].firstChild.nodeValue
-                year = article.getElementsByTagName('year')[0].firstChild.nodeValue
-                try:
-                    pmcid = article.getElementsByTagName('article-id')[1].firstChild.nodeValue
-                except:
-                    continue
-                body =  article.getElementsByTagName('body')
-                if len(body) == 0:
-                    continue
-                self.found.add(pmid)
-                paragraphs = body[0].getElementsByTagName('p')
-                fulltext = list()
-                for par in paragraphs:
-                    fulltext.append(minidom_to_text(par))
-                self.articles.append(Article(pmid=pmid, pmcid=pmcid, journal=journal, year=year, fulltext="\n".join(fulltext)))
-            self.notfound = set(self.ids).difference(self.found)
-        else:
-            PubMedQueryError("Can't connect to PMC...")
+    def get_articles(self):
+        '''
+        Retrieves the Fulltext or the abstracts of the specified Articles
+        and fills the articles attribute.
+        '''
+        for article in self.iter_articles():
+            pass
 
-    def __get_pubmed(self, req):
+    def iter_articles(self, keep=True):
         '''
-        Gets PUBMED article request and fills article attribute.
+        Retrieves the Fulltext or the abstracts of the specified Articles and yields them
+        as soon as each batch is downloaded. Articles in ARTICLE_CACHE (if set) are read
+        from there, and the rest are requested concurrently by the fetch.Fetcher returned
+        by get_fetcher() and added to the cache. For PMC, the articles of each batch of
+        converted identifiers are requested while the next batches are converted.
 
         Parameters
         ----------
-        req : requests.models.Response, required, no default
-            response object to pubmed
-        '''
-        if req.status_code == 200:
-            article_text = minidom.parseString(req.content)
-            articles = article_text.getElementsByTagName('PubmedArticle')
-            for article in articles:
-                pmid = article.getElementsByTagName('PMID')[0]
-                pmid_text = minidom_to_text(pmid)
-                journal = article.getElementsByTagName('Journal')[0].getElementsByTagName('Title')[0]
-                journal_text = minidom_to_text(journal)
-                year = article.getElementsByTagName('Year')[0].firstChild.nodeValue
-                abstracts = article.getElementsByTagName('AbstractText')
-                abstract_text = list()
-                for abst in abstracts:
-                    abstract_text.append(minidom_to_text(abst))
-                abstract_text = "\n".join(abstract_text)
-                if not abstract_text.strip():
-                    continue
-                self.found.add(pmid_text)
-                self.articles.append(Article(pmid=pmid_text, journal=journal_text, year=year, abstract=abstract_text))
-            self.notfound = set(self.ids).difference(self.found)
-        else:
-            PubMedQueryError("Can't connect to PubMed...")
+        keep : bool, optional, default = True
+            Add the articles to the articles attribute. Set to False to keep
+            in memory only the articles in use.
+        '''
+        maxidents = 200 # max number of articles per GET request
 
-    def get_articles(self):
+        if self.database == "PMC":
+            # Do fulltext query
+            batches = pmid_2_pmc(self.ids, maxidents)
+            params = {'db': 'pmc'}
+            make_article = pmc_article
+        elif self.database == "PUBMED":
+            # Do abstract query
+            batches = ( self.ids[x:x+maxidents] for x in range(0, len(self.ids), maxidents) )
+            params = {'db': 'pubmed', 'retmode': 'xml'}
+            make_article = pubmed_article
+        else:
+            logging.error('%s: Incorrect database. Choose "PMC" or "PUBMED"', self.database)
+            return
+        # Batches of cached identifiers (or None for a request), in the order of the identifiers
+        order = collections.deque()
+        def queries():
+            for identifiers in batches:
+                cached, missing = self.__split_cached(identifiers)
+                for x in range(0, len(cached), maxidents):
+                    order.append(cached[x:x+maxidents])
+                for x in range(0, len(missing), maxidents):
+                    order.append(None)
+                    query_params = dict(params)
+                    query_params['id'] = ",".join(missing[x:x+maxidents])
+                    yield (EFETCH_URL, query_params)
+        def contents():
+            # The batches of cached articles queued before each response are read first
+            for req in get_fetcher().imap(queries()):
+                while order[0] is not None:
+                    yield self.__read_cached(order.popleft()), False
+                order.popleft()
+                if self.__check_response(req):
+                    yield req.content, True
+            while order:
+                yield self.__read_cached(order.popleft()), False
+        for content, store in contents():
+            for article in self.__parse_articles(content, make_article, store and ARTICLE_CACHE is not None):
+                if keep:
+                    self.articles.append(article)
+                yield article
+        self.notfound = set(self.ids).difference(self.found)
+
+    def __split_cached(self, identifiers):
         '''
-        Retrieves the Fulltext or the abstracts of the specified Articles
+        Returns the lists of identifiers in ARTICLE_CACHE and of identifiers to request
+        (none when the cache is offline).
         '''
-        maxidents = 200 # max number of articles per GET request
+        if ARTICLE_CACHE is None:
+            return list(), list(identifiers)
+        cached  = list()
+        missing = list()
+        for identifier in identifiers:
+            if ARTICLE_CACHE.has(self.database, identifier):
+                cached.append(identifier)
+            elif not ARTICLE_CACHE.offline:
+                missing.append(identifier)
+        return cached, missing
+
+    def __read_cached(self, identifiers):
+        '''
+        Returns the efetch XML with the cached articles of identifiers
+        '''
+        xmls = [ ARTICLE_CACHE.get(self.database, identifier) for identifier in identifiers ]
+        return join_articles(self.database, [ xml for xml in xmls if xml is not None ])
 
-        for subset in [self.ids[x:x+maxidents] for x in range(0, len(self.ids), maxidents)]:
-            if self.database == "PMC":
-                # Do fulltext query
-
-                params = {
-                    'id': ",".join(pmid_2_pmc(subset)),
-                    'db': 'pmc',
-                }
-                req = requests.get("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi", params=params)
-                self.__get_pmc(req)
-            elif self.database == "PUBMED":
-                # Do abstract query
-                params = {
-                    'id':      ",".join(subset),
-                    'db':      'pubmed',
-                    'retmode': 'xml'
-                }
-                req = requests.get("https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi", params=params)
-                self.__get_pubmed(req)
-            else:
-                logging.error('%s: Incorrect database. Choose "PMC" or "PUBMED"', self.database)
+    def __check_response(self, req):
+        '''
+        Returns True if the efetch request succeeded, logs an error otherwise.
+        '''
+        if req.status_code != 200:
+            logging.error("Can't connect to %s (status %s)", self.database, req.status_code)
+            return False
+        return True
 
     def __iter__(self):
         return iter(self.articles)
@@ -299,8 +802,70 @@ class Article(object):
         for sentence in self.sentences:
             sentence.annotate()
             sentence.get_candidates()
+        self.predict_all()
+
+    def predict_all(self):
+        '''
+        Predicts all the candidates of the article (already annotated) with a single
+        call to the classifier. See predict_candidates().
+        '''
+        candidates = list()
+        for sentence in self.sentences:
+            if sentence.candidates:
+                if sentence.candidates[0].features_sparse is None:
+                    sentence.compute_features()
+                candidates.extend(sentence.candidates)
+        predict_candidates(candidates)
+
+    def summarize(self):
+        '''
+        Returns the compact ArticleResult of the article (already predicted), with all
+        the information needed for the output and the report but without the sentences.
+        '''
+        proteins = list()
+        interactions = list()
+        ncandidates = 0
+        for sentence in self.sentences:
+            proteins.extend(prot.disambiguate() for prot in sentence.proteins)
+            ncandidates += len(sentence.candidates)
+            sentence_html = None
             for candidate in sentence.candidates:
-                candidate.predict()
+                if candidate.label is not True:
+                    continue
+                if sentence_html is None:
+                    sentence_html = sentence.to_html()
+                interactions.append(Interaction(
+                    candidate.votes,
+                    candidate.prot1.symbol,
+                    candidate.prot1.disambiguate(),
+                    candidate.prot2.symbol,
+                    candidate.prot2.disambiguate(),
+                    candidate.to_html(),
+                    sentence_html
+                ))
+        return ArticleResult(
+            self.pmid, self.pmcid, self.journal, self.year,
+            len(self.sentences), ncandidates, proteins, interactions
+        )
+
+    @instrument.timed("annotate_sentences")
+    def annotate_sentences(self, max_chars=BATCH_MAX_CHARS, threads=1):
+        '''
+        Annotates all the sentences of the article sending them to StanfordCoreNLP
+        in batches of at most max_chars characters, instead of doing one request
+        per sentence. The tokens of each Sentence are the same as with Sentence.annotate().
+        Returns the list of Sentence objects that could be annotated: if a batch fails, its
+        sentences are annotated one by one, and those that still fail are skipped.
+
+        Parameters
+        ----------
+        max_chars : int, optional, default = BATCH_MAX_CHARS
+            Maximum number of characters per request. If 0, annotates one sentence per request.
+
+        threads : int, optional, default = 1
+            Maximum number of requests sent to StanfordCoreNLP at the same time.
+        '''
+        return annotate_sentences(self.sentences, max_chars=max_chars, threads=threads)
 
     def as_html(self):
         '''
@@ -308,6 +873,7 @@ class Article(object):
         '''
         pass
 
+    @instrument.timed("extract_sentences")
     def extract_sentences(self, mode="split", source="fulltext"):
         '''
         Finds sentence boundaries and saves them as sentence objects in the
@@ -378,9 +944,8 @@ class Article(object):
             sentences = text.split("<stop>")
             #sentences = sentences[:-1]
             sentences = [s.strip() for s in sentences]
-            h = HTMLParser()
             for sentence in sentences:
-                sentence = str(h.unescape(sentence))
+                sentence = str(unescape(sentence))
                 if not sentence.strip() or not isinstance(sentence, str):
                     continue
                 self.sentences.append(Sentence(originaltext=sentence))
@@ -401,6 +966,108 @@ class Article(object):
     def __str__(self):
         return "Article with PubMED id:%s" % (self.pmid)
 
+# ----------------------------------------------
+class SymbolCache(object):
+    '''
+    Bounded memo of protein symbols (as found in the text) to their disambiguated
+    symbols, shared by all the Protein objects. The least recently used symbol is
+    evicted when it reaches max_size symbols, and the memo is emptied when the gene
+    dictionary changes.
+
+    Attributes
+    ----------
+    max_size : int, no default
+        Maximum number of symbols in the memo.
+
+    symbols : collections.OrderedDict, no default
+        Dictionary with symbols as keys and disambiguated symbols as values,
+        from the least to the most recently used.
+
+    hits : int, no default
+        Number of symbols found in the memo.
+
+    misses : int, no default
+        Number of symbols normalized and looked up in the gene dictionary.
+
+    reused : int, no default
+        Number of Protein.disambiguate() calls answered by the Protein itself.
+    '''
+    def __init__(self, max_size=100000):
+        '''
+        Parameters
+        ----------
+        max_size : int, optional, default = 100000
+            Maximum number of symbols in the memo.
+        '''
+        self.max_size = max_size
+        self.symbols  = collections.OrderedDict()
+        self.genedict = None
+        self.hits     = 0
+        self.misses   = 0
+        self.reused   = 0
+
+    def get(self, symbol):
+        '''
+        Returns the disambiguated symbol: the approved symbol if the normalized symbol
+        (upper-case, without quotes) is in the gene dictionary or the normalized symbol otherwise.
+        '''
+        genedict = Protein.GENEDICT
+        if genedict is None or genedict is not self.genedict:
+            genedict = get_gene_dictionary()
+            if genedict is not self.genedict:
+                self.symbols.clear()
+                self.genedict = genedict
+        disambiguated = self.symbols.get(symbol)
+        if disambiguated is not None:
+            self.hits += 1
+            try:
+                self.symbols.move_to_end(symbol)
+            except KeyError:
+                # Evicted by another thread
+                pass
+            return disambiguated
+        self.misses += 1
+        normalized = symbol.upper().replace("'", "").replace('"', '')
+        disambiguated = genedict.get(normalized, normalized)
+        self.symbols[symbol] = disambiguated
+        while len(self.symbols) > self.max_size:
+            try:
+                self.symbols.popitem(last=False)
+            except KeyError:
+                break
+        return disambiguated
+
+    def hit_rate(self):
+        '''
+        Returns the fraction of disambiguations that did not need a lookup in the gene dictionary.
+        '''
+        calls = self.hits + self.misses + self.reused
+        if calls == 0:
+            return 0.0
+        return (self.hits + self.reused) / float(calls)
+
+    def stats(self):
+        '''
+        Returns a dictionary with the counters of the memo
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reused': self.reused,
+            'size': len(self.symbols),
+            'hit_rate': self.hit_rate()
+        }
+
+    def clear(self):
+        '''
+        Empties the memo and resets the counters
+        '''
+        self.symbols.clear()
+        self.hits   = 0
+        self.misses = 0
+        self.reused = 0
+
+
 # ----------------------------------------------
 class Protein(object):
     '''
@@ -423,20 +1090,16 @@ class Protein(object):
     count : int, no default
         Length of position list.
 
-    '''
-    GENEDICT = dict()
-    GENEDICTFILE = pkg_resources.resource_filename('ppaxe', 'data/HGNC_gene_dictionary.txt')
-
-    try:
-        with open(GENEDICTFILE, 'rb') as f:
-            for line in f:
-                line = line.strip()
-                cols = line.split("\t")
-                for alias in cols[1:]:
-                    GENEDICT[alias.upper()] = cols[0]
-    except Exception:
-        raise GeneDictError("Can't read %s\n" % GENEDICTFILE)
+    disambiguated : str, no default
+        Disambiguated symbol, set by the first call to disambiguate().
 
+    '''
+    # Memo of disambiguated symbols shared by all proteins
+    SYMBOL_CACHE = SymbolCache()
+    # Loaded on first use by get_gene_dictionary()
+    GENEDICT = None
+    GENEDICTFILE = os.path.join(DATA_DIR, 'HGNC_gene_dictionary.txt')
+    GENEINDEXFILE = os.path.join(DATA_DIR, 'HGNC_gene_dictionary.idx')
 
     def __init__(self, symbol, positions, sentence):
         '''
@@ -458,18 +1121,18 @@ class Protein(object):
         self.sentence = sentence
         self.synonym = list()
         self.count = len(positions)
+        self.disambiguated = None
 
     def disambiguate(self):
         '''
         Method for disambiguating the gene (convert it to the approved symbol if possible).
+        The result is stored in the protein and memoized in Protein.SYMBOL_CACHE.
         '''
-        disambiguated = self.symbol.upper()
-        disambiguated = disambiguated.replace("'", "")
-        disambiguated = disambiguated.replace('"', '')
-        if disambiguated in Protein.GENEDICT:
-            return Protein.GENEDICT[disambiguated]
+        if self.disambiguated is None:
+            self.disambiguated = Protein.SYMBOL_CACHE.get(self.symbol)
         else:
-            return disambiguated
+            Protein.SYMBOL_CACHE.reused += 1
+        return self.disambiguated
 
     def __str__(self):
         return "%s found in positions %s" % (self.symbol, ":".join([ str(idx) for idx in self.positions ]))
@@ -485,14 +1148,15 @@ class Sentence(object):
     originaltext : str, no default
         Original text string of the sentence.
 
-    tokens : list, no default
-        List of tokens retrieved from StanfordCoreNLP. Each element is a dictionary
-        with keys:
+    tokens : TokenStore, no default
+        Tokens retrieved from StanfordCoreNLP, stored in a compact TokenStore that
+        behaves like a list of read-only dictionaries with keys:
             "index" : Position of token (1-Indexed).
             "word"  : Word of the token.
             "lemma" : Lemma of the token.
             "ner"   : Protein ("P") or Other ("O").
             "pos"   : Part-of-Speech tag.
+        Assigning a list of token dictionaries to this attribute converts it to a TokenStore.
 
     candidates : list, no default
         List of Candidate objects in sentence.
@@ -514,6 +1178,17 @@ class Sentence(object):
         self.candidates   = list()
         self.proteins     = list()
 
+    @property
+    def tokens(self):
+        return self.__tokens
+
+    @tokens.setter
+    def tokens(self, tokens):
+        if isinstance(tokens, TokenStore):
+            self.__tokens = tokens
+        else:
+            self.__tokens = TokenStore(tokens)
+
     def annotate(self):
         '''
         Annotates the genes/proteins in the sentence using StanfordCoreNLP
@@ -521,21 +1196,39 @@ class Sentence(object):
         '''
         if not self.originaltext.strip():
             self.tokens = ""
-        annotated = json.loads(NLP.annotate(self.originaltext))
+        if ANNOTATION_CACHE is not None and self.annotate_from_cache():
+            return
+        instrument.observe("corenlp.request_chars", len(self.originaltext))
+        instrument.observe("corenlp.request_sentences", 1)
+        with instrument.timer("corenlp.request"):
+            response = get_nlp().annotate(self.originaltext)
+        annotated = json.loads(response)
         if annotated['sentences']:
             self.tokens = annotated['sentences'][0]['tokens']
+        if ANNOTATION_CACHE is not None:
+            ANNOTATION_CACHE.set(self.originaltext, self.tokens.to_list())
 
-    def get_candidates(self):
+    def annotate_from_cache(self):
         '''
-        Gets interaction candidates candidates for sentence (attribute: candidates)
-        and all the proteins (attribute: proteins).
+        Fills the attribute "tokens" with the annotation stored in ANNOTATION_CACHE.
+        Returns True if the sentence was in the cache and False otherwise.
+        '''
+        tokens = ANNOTATION_CACHE.get(self.originaltext)
+        if tokens is None:
+            return False
+        self.tokens = tokens
+        return True
+
+    def get_proteins(self):
+        '''
+        Gets the proteins of the sentence (attribute: proteins) from the NER
+        annotation, without making interaction candidates. Returns the proteins.
         '''
         if not self.tokens:
             self.annotate()
-        if self.candidates:
-            return
-            
-        # Get the proteins
+        if self.proteins:
+            return self.proteins
+
         prot_counter = 0
         state        = 0
         prot_list = list()
@@ -550,7 +1243,6 @@ class Sentence(object):
                     prot_counter += 1
                     state = 0
         # Create protein objects for sentence
-        prots_in_sentence = list()
         for prot_pos in prot_list:
             # Must substract 1 to token_idx because Stanford CoreNLP has indexes from 1-n, while
             # python lists go from 0-n
@@ -561,11 +1253,31 @@ class Sentence(object):
                 sentence=self
             )
             self.proteins.append(protein)
-            prots_in_sentence.append(protein)
+        return self.proteins
+
+    def get_candidates(self):
+        '''
+        Gets interaction candidates candidates for sentence (attribute: candidates)
+        and all the proteins (attribute: proteins).
+        '''
+        if not self.tokens:
+            self.annotate()
+        if self.candidates:
+            return
         # Create candidates for sentence
-        for prot in itertools.combinations(prots_in_sentence, r=2):
+        for prot in itertools.combinations(self.get_proteins(), r=2):
             self.candidates.append(InteractionCandidate(prot1=prot[0], prot2=prot[1]))
 
+    @instrument.timed("compute_features")
+    def compute_features(self):
+        '''
+        Computes the features of all the candidates of the sentence at once (see SentenceFeatures).
+        Returns a sparse matrix with the features of each candidate in rows.
+        '''
+        if not self.candidates:
+            self.get_candidates()
+        return SentenceFeatures(self).compute()
+
     def to_html(self):
         '''
         Sentence to HTML string tagging the proteins and the verbs using <span> tags.
@@ -663,13 +1375,33 @@ class InteractionCandidate(object):
         "discharge":1, "mediate":1, "modulate":1, "repress":1, "transactivate":1
     })
 
-    PRED_FILE = pkg_resources.resource_filename('ppaxe', 'data/RF_scikit.pkl')
-    with open(PRED_FILE, 'rb') as f:
-        try:
-            predictor = pickle.load(f)
-        except:
-            predictor = pickle.load(f, encoding='latin1')
-
+    # POS tags and keyword lemmas counted as features (in sorted order in the feature vector)
+    pos_tags = [
+        "CC", "LS", "MD", "NN", "NNS", "NNP", "NNPS", "PDT", "POS",
+        "PRP", "PRP$", "RB", "RBR", "RBS", "RP", "SYM", "TO", "UH",
+        "VB", "VBD", "VBG", "VBN", "VBP", "VBZ", "WDT", "WP", "WP$",
+        "WRB", "IN", "DT", ".", "JJ", "CD", "", "-LRB-", "-RRB-",
+        "JJR", ":", "FW", "JJS", "EX", "''", ","
+    ]
+
+    keywords = [
+        'acetylate', 'activate', 'acylate', 'amidate', 'assemble', 'attach',
+        'bind', 'biotinylate', 'block', 'brominate', 'carboxylate', 'catalyze',
+        'cleave', 'complex', 'conjugate', 'contact', 'couple', 'cysteinylate',
+        'demethylate', 'dephosphorylate', 'dimerise', 'dimerize',
+        'disassemble', 'discharge', 'dissociate', 'down-regulate', 'downregulate',
+        'farnesylate', 'formylate', 'hydroxilate', 'hydroxylate', 'inactivate',
+        'induce', 'inhibit', 'interact', 'mediate', 'methylate', 'modify',
+        'modulate', 'multimerise', 'multimerize', 'myristoylate', 'myristylate',
+        'nitrosylate', 'overexpress', 'palmitoylate', 'palmitylate', 'phosphorylate',
+        'precipitate', 'promote', 'pyruvate', 'regulate', 'repress', 'stimulate',
+        'substitute', 'sumoylate', 'suppress', 'transactivate', 'ubiquitinate',
+        'ubiquitinylate', 'up-regulate', 'upregulate'
+    ]
+
+    # Loaded on first use by get_predictor()
+    PRED_FILE = os.path.join(DATA_DIR, 'RF_scikit.pkl')
+    predictor = None
 
     def __init__(self, prot1, prot2):
         '''
@@ -808,21 +1540,7 @@ class InteractionCandidate(object):
         mode : str, required, no default
             Counts POS tags in whole sentence (mode="all") or between candidate proteins (mode="between").
         '''
-        pos_counts = {
-            "CC": 0, "LS": 0, "MD": 0,
-            "NN": 0, "NNS": 0, "NNP": 0,
-            "NNPS": 0, "PDT": 0, "POS": 0,
-            "PRP": 0, "PRP$": 0, "RB": 0,
-            "RBR": 0, "RBS": 0, "RP": 0,
-            "SYM": 0, "TO": 0, "UH": 0,
-            "VB": 0, "VBD": 0, "VBG": 0,
-            "VBN": 0, "VBP": 0, "VBZ": 0,
-            "WDT": 0, "WP": 0, "WP$": 0,
-            "WRB": 0, "IN": 0, "DT": 0, ".": 0,
-            "JJ" :0, "CD": 0, "": 0, "-LRB-": 0,
-            "-RRB-": 0, "JJR": 0, ":": 0, "FW": 0,
-            'JJS': 0, "EX": 0, "''": 0, ",":0
-        }
+        pos_counts = dict.fromkeys(InteractionCandidate.pos_tags, 0)
 
         if mode == "all" or mode == "between":
             for pos in self.__get_token_pos(mode=mode).split(","):
@@ -920,20 +1638,7 @@ class InteractionCandidate(object):
             Count keywords in whole sentence (mode="all") or between candidate proteins (mode="between").
         '''
 
-        keywords = dict({
-        'acetylate': 0, 'activate': 0, 'acylate': 0, 'amidate': 0, 'assemble': 0, 'attach': 0,
-        'bind': 0, 'biotinylate': 0, 'block': 0, 'brominate': 0, 'carboxylate': 0, 'catalyze': 0,
-        'cleave': 0, 'complex': 0, 'conjugate': 0, 'contact': 0, 'couple': 0, 'cysteinylate': 0,
-        'demethylate': 0, 'dephosphorylate': 0, 'dimerise': 0, 'dimerize': 0,
-        'disassemble': 0, 'discharge': 0, 'dissociate': 0, 'down-regulate': 0, 'downregulate': 0,
-        'farnesylate': 0, 'formylate': 0, 'hydroxilate': 0, 'hydroxylate': 0, 'inactivate': 0,
-        'induce': 0, 'inhibit': 0, 'interact': 0, 'mediate': 0, 'methylate': 0, 'modify': 0,
-        'modulate': 0, 'multimerise': 0, 'multimerize': 0, 'myristoylate': 0, 'myristylate': 0,
-        'nitrosylate': 0, 'overexpress': 0, 'palmitoylate': 0, 'palmitylate': 0, 'phosphorylate': 0,
-        'precipitate': 0, 'promote': 0, 'pyruvate': 0, 'regulate': 0, 'repress': 0, 'stimulate': 0,
-        'substitute': 0, 'sumoylate': 0, 'suppress': 0, 'transactivate': 0, 'ubiquitinate': 0,
-        'ubiquitinylate': 0, 'up-regulate': 0, 'upregulate': 0
-        })
+        keywords = dict.fromkeys(InteractionCandidate.keywords, 0)
 
         tokens = list()
         if mode == "all":
@@ -968,7 +1673,8 @@ class InteractionCandidate(object):
         '''
         if self.features_sparse is None:
             self.compute_features()
-        pred = InteractionCandidate.predictor.predict_proba(self.features_sparse)[:,1]
+        with instrument.timer("predict"):
+            pred = get_predictor().predict_proba(self.features_sparse)[:,1]
 
         self.votes = round(pred[0], 3)
         if pred >= 0.55:
@@ -1038,6 +1744,203 @@ class InteractionCandidate(object):
         return "[%s] may interact with [%s]" % (self.prot1.symbol, self.prot2.symbol)
 
 
+# ----------------------------------------------
+class SentenceFeatures(object):
+    '''
+    Computes the features of all the InteractionCandidate objects of a sentence at once.
+    The per-token counts (POS tags, verbs, verb scores and keywords) are computed only once
+    for the sentence and stored as prefix sums, so the counts between any two proteins are
+    just a difference of two rows. The result is the same as calling
+    InteractionCandidate.compute_features() for each candidate.
+
+    Attributes
+    ----------
+    sentence : Sentence, no default
+        Sentence object with the candidates.
+
+    prefix : numpy.ndarray, no default
+        Prefix sums (rows: tokens + 1, columns: counts) of the per-token counts.
+
+    verb_idxes : list, no default
+        Sorted indexes of the verbs in the sentence (1-Indexed).
+
+    word_idxes : dict, no default
+        Positions (0-Indexed) of each word in the sentence.
+    '''
+    NUM_FEATURES = 178
+    VERB_TYPES   = ['VB', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ']
+    POS_TAGS     = sorted(InteractionCandidate.pos_tags)
+    KEYWORDS     = sorted(InteractionCandidate.keywords)
+    SCORES       = sorted(set(InteractionCandidate.verb_scores.values()))
+    # Columns of the per-token count matrix
+    POS_COL     = 0
+    VERB_COL    = POS_COL + len(POS_TAGS)
+    SCORE_COL   = VERB_COL + len(VERB_TYPES)
+    KEYWORD_COL = SCORE_COL + len(SCORES)
+    NUM_COUNTS  = KEYWORD_COL + len(KEYWORDS)
+    # Features that are stored even when they are 0
+    ALWAYS_STORED = list(range(2, 26)) + list(range(112, 116))
+
+    def __init__(self, sentence):
+        '''
+        Parameters
+        ----------
+        sentence : Sentence, required, no default
+            Sentence object with tokens and candidates.
+        '''
+        self.sentence = sentence
+        pos_idx     = dict((tag, i) for i, tag in enumerate(SentenceFeatures.POS_TAGS))
+        verb_idx    = dict((tag, i) for i, tag in enumerate(SentenceFeatures.VERB_TYPES))
+        score_idx   = dict((score, i) for i, score in enumerate(SentenceFeatures.SCORES))
+        keyword_idx = dict((lemma, i) for i, lemma in enumerate(SentenceFeatures.KEYWORDS))
+        rows = list()
+        cols = list()
+        self.verb_idxes = list()
+        self.word_idxes = dict()
+        for position, token in enumerate(sentence.tokens):
+            row = position + 1
+            # POS tags are joined by commas and split again in InteractionCandidate, so
+            # the POS "," counts as two "" tags.
+            for pos in token['pos'].split(","):
+                if pos in pos_idx:
+                    rows.append(row)
+                    cols.append(SentenceFeatures.POS_COL + pos_idx[pos])
+            if re.match('VB[DGNPZ]?', token['pos']):
+                self.verb_idxes.append(token['index'])
+                rows.append(row)
+                cols.append(SentenceFeatures.VERB_COL + verb_idx[token['pos']])
+                if token['lemma'] in InteractionCandidate.verb_scores:
+                    rows.append(row)
+                    cols.append(SentenceFeatures.SCORE_COL + score_idx[InteractionCandidate.verb_scores[token['lemma']]])
+            if token['lemma'] in keyword_idx:
+                rows.append(row)
+                cols.append(SentenceFeatures.KEYWORD_COL + keyword_idx[token['lemma']])
+            self.word_idxes.setdefault(token['word'], list()).append(position)
+        self.numtokens = len(sentence.tokens)
+        counts = np.zeros((self.numtokens + 1, SentenceFeatures.NUM_COUNTS), dtype=np.int64)
+        np.add.at(counts, (rows, cols), 1)
+        self.prefix = np.cumsum(counts, axis=0)
+
+    def __slice_bounds(self, init_coord, final_coord):
+        '''
+        Returns the bounds of tokens[init_coord:final_coord] as python would slice them
+        '''
+        init_coord  = min(max(init_coord, 0), self.numtokens)
+        final_coord = min(max(final_coord, 0), self.numtokens)
+        return init_coord, max(init_coord, final_coord)
+
+    def __range_counts(self, bounds):
+        '''
+        Returns the per-token counts summed for each (init, final) token slice in bounds
+        '''
+        bounds = np.array(bounds, dtype=np.int64).reshape(-1, 2)
+        return self.prefix[bounds[:, 1]] - self.prefix[bounds[:, 0]]
+
+    def __verb_distances(self, pidx, init, final):
+        '''
+        Closest and farthest verb distances from pidx for the verbs in verb_idxes[init:final].
+        Same as take_closest() and take_farthest() on the sublist.
+        '''
+        if init >= final:
+            return (0, 0)
+        vidxes = self.verb_idxes
+        pos = bisect_left(vidxes, pidx, init, final)
+        if pos == init:
+            closest = vidxes[init]
+        elif pos == final:
+            closest = vidxes[final - 1]
+        elif vidxes[pos] - pidx < pidx - vidxes[pos - 1]:
+            closest = vidxes[pos]
+        else:
+            closest = vidxes[pos - 1]
+        if math.fabs(vidxes[init] - pidx) > math.fabs(vidxes[final - 1] - pidx):
+            farthest = vidxes[init]
+        else:
+            farthest = vidxes[final - 1]
+        return (int(math.fabs(closest - pidx)), int(math.fabs(farthest - pidx)))
+
+    def __verb_block(self, counts, candidates, bounds):
+        '''
+        Returns the 12 verb features for each candidate (rows) given the counts
+        in the candidate slices and the slice bounds.
+        '''
+        block = np.zeros((len(candidates), 12), dtype=np.int64)
+        block[:, 0:6] = counts[:, SentenceFeatures.VERB_COL:SentenceFeatures.SCORE_COL]
+        scores = counts[:, SentenceFeatures.SCORE_COL:SentenceFeatures.KEYWORD_COL]
+        for i, score in enumerate(SentenceFeatures.SCORES):
+            block[:, 6] = np.where(scores[:, i] > 0, score, block[:, 6])
+        block[:, 7] = scores.dot(np.array(SentenceFeatures.SCORES, dtype=np.int64))
+        for row, (candidate, (init_coord, final_coord)) in enumerate(zip(candidates, bounds)):
+            # Verbs in tokens[init_coord:final_coord] have indexes init_coord + 1 ... final_coord
+            vinit  = bisect_left(self.verb_idxes, init_coord + 1)
+            vfinal = bisect_left(self.verb_idxes, final_coord + 1)
+            block[row, 8:10]  = self.__verb_distances(candidate.prot1.positions[-1], vinit, vfinal)
+            block[row, 10:12] = self.__verb_distances(candidate.prot2.positions[-1], vinit, vfinal)
+        return block
+
+    def __prot_counts(self, symbol, init_coord, final_coord):
+        '''
+        Number of tokens in tokens[init_coord:final_coord] whose word is symbol
+        '''
+        positions = self.word_idxes.get(symbol, [])
+        return bisect_left(positions, final_coord) - bisect_left(positions, init_coord)
+
+    def compute(self):
+        '''
+        Computes the features of all the candidates in the sentence. Fills their attributes
+        feat_cols, feat_vals, feat_current_col and features_sparse, and returns a sparse
+        matrix with one row per candidate.
+        '''
+        candidates = self.sentence.candidates
+        ncands = len(candidates)
+        if ncands == 0:
+            return sparse.coo_matrix((0, SentenceFeatures.NUM_FEATURES), dtype=np.int64)
+        # Slices used by InteractionCandidate: tokens[b0:b1] for token distance and verbs,
+        # tokens[b0 - 1:b1 + 1] for POS tags, protein counts and keywords.
+        inner = [ self.__slice_bounds(cand.between_idxes[0], cand.between_idxes[1]) for cand in candidates ]
+        outer = [ self.__slice_bounds(cand.between_idxes[0] - 1, cand.between_idxes[1] + 1) for cand in candidates ]
+        whole = [ (0, self.numtokens) ] * ncands
+        inner_counts = self.__range_counts(inner)
+        outer_counts = self.__range_counts(outer)
+        whole_counts = self.__range_counts(whole)
+
+        features = np.zeros((ncands, SentenceFeatures.NUM_FEATURES), dtype=np.int64)
+        features[:, 0] = [ final - init for init, final in inner ]
+        features[:, 1] = self.numtokens
+        features[:, 2:14]  = self.__verb_block(inner_counts, candidates, inner)
+        features[:, 14:26] = self.__verb_block(whole_counts, candidates, whole)
+        pos_cols = slice(SentenceFeatures.POS_COL, SentenceFeatures.VERB_COL)
+        features[:, 26:69]  = outer_counts[:, pos_cols]
+        features[:, 69:112] = whole_counts[:, pos_cols]
+        # An empty slice of POS tags is joined as "", and counted as one "" tag
+        empty_col = 26 + SentenceFeatures.POS_TAGS.index("")
+        for row, (init, final) in enumerate(outer):
+            if init == final:
+                features[row, empty_col] += 1
+        for row, (candidate, (init, final)) in enumerate(zip(candidates, outer)):
+            features[row, 112] = self.__prot_counts(candidate.prot1.symbol, init, final)
+            features[row, 113] = self.__prot_counts(candidate.prot2.symbol, init, final)
+            features[row, 114] = self.__prot_counts(candidate.prot1.symbol, 0, self.numtokens)
+            features[row, 115] = self.__prot_counts(candidate.prot2.symbol, 0, self.numtokens)
+        features[:, 116:178] = outer_counts[:, SentenceFeatures.KEYWORD_COL:SentenceFeatures.NUM_COUNTS]
+
+        stored = features != 0
+        stored[:, SentenceFeatures.ALWAYS_STORED] = True
+        rows, cols = np.nonzero(stored)
+        vals = features[rows, cols]
+        row_starts = np.searchsorted(rows, np.arange(ncands + 1))
+        for row, candidate in enumerate(candidates):
+            start, end = row_starts[row], row_starts[row + 1]
+            candidate.feat_cols = cols[start:end].tolist()
+            candidate.feat_vals = vals[start:end].tolist()
+            candidate.feat_current_col = SentenceFeatures.NUM_FEATURES
+            candidate.features_sparse = sparse.coo_matrix(
+                (candidate.feat_vals, ([0] * len(candidate.feat_vals), candidate.feat_cols)),
+                shape=(1, SentenceFeatures.NUM_FEATURES)
+            )
+        return sparse.coo_matrix((vals, (rows, cols)), shape=(ncands, SentenceFeatures.NUM_FEATURES))
+
+
 # EXCEPTIONS
 # ----------------------------------------------
 class TextNotAvailable(Exception):
@@ -0,0 +1,235 @@
+'''
+Rate-limited concurrent requests to the NCBI web services (E-utilities and
+the PMC ID converter).
+
+NCBI allows 3 requests per second per IP address, or 10 requests per second
+with an API key. A Fetcher keeps several requests in flight with a pool of
+threads (each one with its own keep-alive connection), spaces them with a
+token bucket to stay under the limit and retries with exponential backoff the
+requests that fail with 429 (too many requests), 5xx or connection errors.
+'''
+
+from multiprocessing.pool import ThreadPool
+from collections import deque
+import random
+import threading
+import time
+import requests
+from ppaxe import instrument
+
+
+# NCBI limits (requests per second)
+RATE_WITHOUT_KEY = 3
+RATE_WITH_KEY    = 10
+# Status codes of the requests that are retried
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+# CLASSES
+# ----------------------------------------------
+class TokenBucket(object):
+    '''
+    Token bucket rate limiter, shared by threads. Tokens are added at rate
+    tokens per second up to capacity, and each request takes one.
+
+    Attributes
+    ----------
+    rate : float, no default
+        Tokens added per second.
+
+    capacity : float, no default
+        Maximum number of tokens, i.e. maximum burst of requests.
+
+    tokens : float, no default
+        Tokens currently available.
+    '''
+    def __init__(self, rate, capacity=1):
+        '''
+        Parameters
+        ----------
+        rate : float, required, no default
+            Tokens added per second.
+
+        capacity : float, optional, default = 1
+            Maximum number of tokens. With 1, requests are evenly spaced and
+            there are never more than rate requests in any one-second window.
+        '''
+        self.rate     = float(rate)
+        self.capacity = float(capacity)
+        self.tokens   = float(capacity)
+        self.updated  = time.time()
+        self.lock     = threading.Lock()
+
+    def acquire(self):
+        '''
+        Takes a token, waiting until there is one available. Returns the seconds waited.
+        '''
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class Fetcher(object):
+    '''
+    Concurrent, rate-limited HTTP GET requests with retries.
+
+    Attributes
+    ----------
+    api_key : str, no default
+        NCBI API key added to the parameters of every request (None if not used).
+
+    bucket : TokenBucket, no default
+        Rate limiter shared by all the requests.
+
+    workers : int, no default
+        Maximum number of requests in flight.
+
+    retries : int, no default
+        Maximum number of retries of each request.
+
+    backoff : float, no default
+        Seconds to wait before the first retry. Doubles with every retry.
+
+    timeout : float, no default
+        Seconds to wait for the server to respond.
+
+    sent : int, no default
+        Number of requests made (including retries).
+
+    retried : int, no default
+        Number of retried requests.
+
+    lock : threading.Lock, no default
+        Lock of the counters (sent and retried), updated by several threads.
+    '''
+    def __init__(self, api_key=None, rate=None, workers=3, retries=5, backoff=1.0, timeout=120):
+        '''
+        Parameters
+        ----------
+        api_key : str, optional, default = None
+            NCBI API key.
+
+        rate : float, optional, default = None
+            Maximum requests per second. By default, the NCBI limit with or without API key.
+
+        workers : int, optional, default = 3
+            Maximum number of requests in flight.
+
+        retries : int, optional, default = 5
+            Maximum number of retries of each request.
+
+        backoff : float, optional, default = 1.0
+            Seconds to wait before the first retry.
+
+        timeout : float, optional, default = 120
+            Seconds to wait for the server to respond.
+        '''
+        if rate is None:
+            rate = RATE_WITH_KEY if api_key else RATE_WITHOUT_KEY
+        self.api_key  = api_key
+        self.bucket   = TokenBucket(rate)
+        self.workers  = max(1, workers)
+        self.retries  = retries
+        self.backoff  = backoff
+        self.timeout  = timeout
+        self.sent     = 0
+        self.retried  = 0
+        self.lock     = threading.Lock()
+        self.local    = threading.local()
+        self.pool     = None
+
+    def session(self):
+        '''
+        Returns the requests.Session of the current thread, to reuse its connections
+        '''
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+        return session
+
+    def delay(self, attempt, response=None):
+        '''
+        Returns the seconds to wait before retrying: the Retry-After header of
+        the response if any, or exponential backoff with jitter.
+        '''
+        if response is not None:
+            try:
+                return float(response.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                pass
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def get(self, url, params=None):
+        '''
+        Makes a GET request, waiting for the rate limiter and retrying on 429/5xx
+        responses or connection errors. Returns the requests.models.Response (the
+        last one if all the retries fail) or raises the last connection error.
+        '''
+        params = dict(params or {})
+        if self.api_key:
+            params['api_key'] = self.api_key
+        attempt = 0
+        while True:
+            instrument.record("ncbi.rate_limit_wait", self.bucket.acquire())
+            with self.lock:
+                self.sent += 1
+            try:
+                with instrument.timer("ncbi.request"):
+                    response = self.session().get(url, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                if attempt >= self.retries:
+                    raise
+                response = None
+            if response is not None:
+                instrument.observe("ncbi.response_bytes", len(response.content))
+            if response is not None and (response.status_code not in RETRY_STATUS or attempt >= self.retries):
+                return response
+            with self.lock:
+                self.retried += 1
+            instrument.count("ncbi.retries")
+            time.sleep(self.delay(attempt, response))
+            attempt += 1
+
+    def imap(self, queries):
+        '''
+        Makes the GET requests of queries, an iterable of (url, params) tuples, with up
+        to workers requests in flight. Yields the responses in the order of queries.
+        '''
+        if self.workers == 1:
+            for url, params in queries:
+                yield self.get(url, params)
+            return
+        if self.pool is None:
+            self.pool = ThreadPool(self.workers)
+        inflight = deque()
+        for url, params in queries:
+            inflight.append(self.pool.apply_async(self.get, (url, params)))
+            if len(inflight) >= self.workers:
+                yield inflight.popleft().get()
+        while inflight:
+            yield inflight.popleft().get()
+
+    def map(self, queries):
+        '''
+        Returns the list of responses of queries (see imap).
+        '''
+        return list(self.imap(queries))
+
+    def close(self):
+        '''
+        Stops the threads
+        '''
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
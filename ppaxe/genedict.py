@@ -0,0 +1,245 @@
+'''
+Compiled HGNC gene dictionary.
+
+The text dictionary (one gene per line: approved symbol followed by its aliases,
+tab separated) is compiled once into a read-only binary index: a sorted table of
+upper-case aliases and a table of approved symbols, both stored as offsets into
+string blobs. GeneIndex opens the index with mmap, so loading it is instantaneous,
+lookups are binary searches on the mapped file and all the processes using the
+same index share its pages.
+
+The index is not shipped with the package: it is compiled next to the text dictionary
+the first time it is used, or in the user cache directory (see user_index_path) if the
+package directory is not writable. It can also be built beforehand with:
+    python -m ppaxe.genedict [HGNC_gene_dictionary.txt] [HGNC_gene_dictionary.idx]
+'''
+
+from bisect import bisect_right
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+
+MAGIC = b'PPXGIDX1'
+# Magic, number of aliases, number of symbols, start of alias blob, start of symbol blob
+HEADER  = struct.Struct('<8sIIII')
+INTEGER = struct.Struct('<I')
+PAIR    = struct.Struct('<II')
+# One of every SAMPLE_STEP aliases is kept in memory to narrow down the binary searches
+SAMPLE_STEP = 64
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def read_dictionary(filename):
+    '''
+    Reads the HGNC text dictionary and returns a dict with upper-case
+    aliases as keys and approved symbols as values.
+    '''
+    genedict = dict()
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            cols = line.split("\t")
+            for alias in cols[1:]:
+                genedict[alias.upper()] = cols[0]
+    return genedict
+
+def to_bytes(string):
+    '''
+    Returns string encoded as utf-8 (unless it already is a byte string)
+    '''
+    if isinstance(string, bytes):
+        return string
+    return string.encode('utf-8')
+
+def compile_dictionary(source, destination):
+    '''
+    Compiles the HGNC text dictionary source into the binary index destination.
+    The index is written to a temporary file and renamed, so processes reading
+    destination never see a partial file. Returns the number of aliases.
+    '''
+    genedict = read_dictionary(source)
+    aliases  = sorted((to_bytes(alias), to_bytes(symbol)) for alias, symbol in genedict.items())
+    symbols  = sorted(set(symbol for alias, symbol in aliases))
+    symbol_ids = dict((symbol, idx) for idx, symbol in enumerate(symbols))
+
+    alias_offsets  = [0]
+    for alias, symbol in aliases:
+        alias_offsets.append(alias_offsets[-1] + len(alias))
+    symbol_offsets = [0]
+    for symbol in symbols:
+        symbol_offsets.append(symbol_offsets[-1] + len(symbol))
+
+    # Offset tables follow the header: alias offsets, alias symbol ids, symbol offsets
+    alias_blob  = HEADER.size + INTEGER.size * (len(alias_offsets) + len(aliases) + len(symbol_offsets))
+    symbol_blob = alias_blob + alias_offsets[-1]
+
+    tmpfile = "%s.%s.tmp" % (destination, os.getpid())
+    try:
+        with open(tmpfile, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, len(aliases), len(symbols), alias_blob, symbol_blob))
+            fh.write(struct.pack('<%sI' % len(alias_offsets), *alias_offsets))
+            fh.write(struct.pack('<%sI' % len(aliases), *[ symbol_ids[symbol] for alias, symbol in aliases ]))
+            fh.write(struct.pack('<%sI' % len(symbol_offsets), *symbol_offsets))
+            fh.write(b''.join(alias for alias, symbol in aliases))
+            fh.write(b''.join(symbols))
+        if os.path.exists(destination) and sys.platform.startswith('win'):
+            os.remove(destination)
+        os.rename(tmpfile, destination)
+    except Exception:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+        raise
+    return len(aliases)
+
+def is_current(index, source):
+    '''
+    Returns True if the binary index exists and is not older than the text dictionary source
+    '''
+    if not os.path.exists(index):
+        return False
+    if not os.path.exists(source):
+        return True
+    return os.path.getmtime(index) >= os.path.getmtime(source)
+
+def user_index_path(source):
+    '''
+    Returns the path of the index of the text dictionary source in the user
+    cache directory ($XDG_CACHE_HOME/ppaxe or ~/.cache/ppaxe), used when the
+    index can't be written next to source.
+    '''
+    cachedir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    # Dictionaries with the same name in different directories get different indexes
+    digest = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cachedir, 'ppaxe', "%s-%s.idx" % (name, digest))
+
+
+# CLASSES
+# ----------------------------------------------
+class GeneIndex(object):
+    '''
+    Read-only dictionary of upper-case aliases to approved symbols, backed by a
+    memory-mapped binary index created with compile_dictionary().
+
+    Attributes
+    ----------
+    path : str, no default
+        Path of the binary index.
+
+    naliases : int, no default
+        Number of aliases in the index.
+
+    nsymbols : int, no default
+        Number of approved symbols in the index.
+    '''
+    def __init__(self, path):
+        '''
+        Parameters
+        ----------
+        path : str, required, no default
+            Path of the binary index.
+        '''
+        self.path = path
+        self.__fh = open(path, 'rb')
+        try:
+            self.__mm = mmap.mmap(self.__fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.__fh.close()
+            raise
+        if len(self.__mm) < HEADER.size:
+            self.close()
+            raise ValueError("%s is not a gene index" % path)
+        magic, self.naliases, self.nsymbols, self.__alias_blob, self.__symbol_blob = HEADER.unpack_from(self.__mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("%s is not a gene index" % path)
+        self.__alias_offsets  = HEADER.size
+        self.__alias_symbols  = self.__alias_offsets + INTEGER.size * (self.naliases + 1)
+        self.__symbol_offsets = self.__alias_symbols + INTEGER.size * self.naliases
+        self.__sample = [ self.__alias(idx) for idx in range(0, self.naliases, SAMPLE_STEP) ]
+
+    def __alias(self, idx):
+        '''
+        Returns the alias in position idx of the sorted alias table (as bytes)
+        '''
+        start, end = PAIR.unpack_from(self.__mm, self.__alias_offsets + INTEGER.size * idx)
+        return self.__mm[self.__alias_blob + start:self.__alias_blob + end]
+
+    def __symbol(self, idx):
+        '''
+        Returns the approved symbol with id idx
+        '''
+        start, end = PAIR.unpack_from(self.__mm, self.__symbol_offsets + INTEGER.size * idx)
+        return self.__mm[self.__symbol_blob + start:self.__symbol_blob + end].decode('utf-8')
+
+    def __find(self, alias):
+        '''
+        Returns the position of alias in the sorted alias table or -1 if it is not in the index
+        '''
+        key = to_bytes(alias)
+        block = bisect_right(self.__sample, key) - 1
+        if block < 0:
+            return -1
+        lo = block * SAMPLE_STEP
+        hi = min(lo + SAMPLE_STEP, self.naliases)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__alias(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.naliases and self.__alias(lo) == key:
+            return lo
+        return -1
+
+    def get(self, alias, default=None):
+        '''
+        Returns the approved symbol of the upper-case alias, or default if it is not in the index
+        '''
+        idx = self.__find(alias)
+        if idx == -1:
+            return default
+        return self.__symbol(INTEGER.unpack_from(self.__mm, self.__alias_symbols + INTEGER.size * idx)[0])
+
+    def __getitem__(self, alias):
+        symbol = self.get(alias)
+        if symbol is None:
+            raise KeyError(alias)
+        return symbol
+
+    def __contains__(self, alias):
+        return self.__find(alias) != -1
+
+    def __len__(self):
+        return self.naliases
+
+    def __reduce__(self):
+        # Other processes map the same file instead of copying the index
+        return (GeneIndex, (self.path,))
+
+    def close(self):
+        '''
+        Unmaps the index and closes the file
+        '''
+        self.__mm.close()
+        self.__fh.close()
+
+
+def main():
+    '''
+    Compiles the HGNC text dictionary into a binary index. Defaults to the
+    dictionary in the package data directory.
+    '''
+    datadir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    source = sys.argv[1] if len(sys.argv) > 1 else os.path.join(datadir, 'HGNC_gene_dictionary.txt')
+    destination = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + '.idx'
+    naliases = compile_dictionary(source, destination)
+    sys.stderr.write("Compiled %s aliases into %s\n" % (naliases, destination))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+'''
+Lightweight instrumentation of the stages of ppaxe.
+
+Records, per stage, the number of calls, the total wall time and a histogram of
+latencies, plus counters and histograms of other values (such as the size of
+the StanfordCoreNLP requests). Disabled by default: timer() then returns a shared
+object that does nothing, so instrumented code only pays a function call and a
+global lookup.
+
+Usage:
+    instrument.enable()
+    with instrument.timer("compute_features"):
+        ...
+    instrument.observe("corenlp.request_chars", len(text))
+
+    @instrument.timed("extract_sentences")
+    def extract_sentences(self):
+        ...
+    instrument.write_profile("profile.json")
+'''
+
+import threading
+import json
+import math
+import time
+
+
+ENABLED = False
+# Histograms have buckets of values between BASE**i and BASE**(i+1) (about 9% wide)
+BASE     = 2 ** 0.125
+LOG_BASE = math.log(BASE)
+LOCK     = threading.Lock()
+TIMERS   = dict()
+VALUES   = dict()
+COUNTERS = dict()
+STARTED  = time.time()
+
+
+# CLASSES
+# ----------------------------------------------
+class Histogram(object):
+    '''
+    Histogram with logarithmic buckets, to get percentiles in constant memory.
+
+    Attributes
+    ----------
+    count : int, no default
+        Number of values added.
+
+    total : float, no default
+        Sum of the values added.
+
+    minimum : float, no default
+        Smallest value added (None if empty).
+
+    maximum : float, no default
+        Largest value added (None if empty).
+
+    buckets : dict, no default
+        Number of values in each bucket, by bucket index.
+    '''
+    def __init__(self):
+        self.count   = 0
+        self.total   = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.buckets = dict()
+
+    def add(self, value):
+        '''
+        Adds value to the histogram
+        '''
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        idx = int(math.floor(math.log(value) / LOG_BASE)) if value > 0 else None
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+
+    def merge(self, other):
+        '''
+        Adds the values of other (Histogram) to the histogram
+        '''
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        if self.minimum is None or other.minimum < self.minimum:
+            self.minimum = other.minimum
+        if self.maximum is None or other.maximum > self.maximum:
+            self.maximum = other.maximum
+        for idx, count in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + count
+
+    def percentile(self, fraction):
+        '''
+        Returns the approximate value below which there are fraction of the values
+        '''
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        # Non-positive values (bucket None) go first
+        for idx in sorted(self.buckets, key=lambda x: float("-inf") if x is None else x):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                if idx is None:
+                    return min(self.minimum, 0.0)
+                value = BASE ** (idx + 0.5)
+                return min(max(value, self.minimum), self.maximum)
+        return self.maximum
+
+    def to_dict(self):
+        '''
+        Returns the summary of the histogram as a dict: count, total, mean, min, p50, p95, p99, max
+        '''
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean':  self.total / self.count if self.count else None,
+            'min':   self.minimum,
+            'p50':   self.percentile(0.50),
+            'p95':   self.percentile(0.95),
+            'p99':   self.percentile(0.99),
+            'max':   self.maximum
+        }
+
+
+class Timer(object):
+    '''
+    Context manager that adds its wall time to the histogram of a stage
+    '''
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, time.time() - self.start)
+        return False
+
+
+class NullTimer(object):
+    '''
+    Context manager that does nothing, used when instrumentation is disabled
+    '''
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_TIMER = NullTimer()
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def enable():
+    '''
+    Starts recording (and clears what was recorded before)
+    '''
+    global ENABLED
+    reset()
+    ENABLED = True
+
+def disable():
+    '''
+    Stops recording
+    '''
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    '''
+    Clears all the recorded timers, values and counters
+    '''
+    global STARTED
+    with LOCK:
+        TIMERS.clear()
+        VALUES.clear()
+        COUNTERS.clear()
+        STARTED = time.time()
+
+def timer(name):
+    '''
+    Returns a context manager that records its wall time in stage name
+    '''
+    if not ENABLED:
+        return NULL_TIMER
+    return Timer(name)
+
+def timed(name):
+    '''
+    Decorator that records the wall time of each call of the function in stage name
+    '''
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.time() - start)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__  = function.__doc__
+        return wrapper
+    return decorator
+
+def record(name, seconds):
+    '''
+    Records a call of seconds to stage name
+    '''
+    if not ENABLED:
+        return
+    with LOCK:
+        if name not in TIMERS:
+            TIMERS[name] = Histogram()
+        TIMERS[name].add(seconds)
+
+def observe(name, value):
+    '''
+    Adds value to the histogram name (e.g. size of a request)
+    '''
+    if not ENABLED:
+        return
+    with LOCK:
+        if name not in VALUES:
+            VALUES[name] = Histogram()
+        VALUES[name].add(value)
+
+def count(name, value=1):
+    '''
+    Increases the counter name by value
+    '''
+    if not ENABLED:
+        return
+    with LOCK:
+        COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+def take():
+    '''
+    Returns everything recorded so far (to be merged in another process with merge())
+    and clears it. Returns None if instrumentation is disabled.
+    '''
+    if not ENABLED:
+        return None
+    with LOCK:
+        snapshot = (dict(TIMERS), dict(VALUES), dict(COUNTERS))
+        TIMERS.clear()
+        VALUES.clear()
+        COUNTERS.clear()
+    return snapshot
+
+def merge(snapshot):
+    '''
+    Adds a snapshot returned by take() to the recorded timers, values and counters
+    '''
+    if snapshot is None:
+        return
+    timers, values, counters = snapshot
+    with LOCK:
+        for registry, histograms in ((TIMERS, timers), (VALUES, values)):
+            for name, histogram in histograms.items():
+                if name not in registry:
+                    registry[name] = Histogram()
+                registry[name].merge(histogram)
+        for name, value in counters.items():
+            COUNTERS[name] = COUNTERS.get(name, 0) + value
+
+def profile():
+    '''
+    Returns a dict with the wall time since enable() and the summary of every
+    stage, value and counter
+    '''
+    with LOCK:
+        return {
+            'wall_time': time.time() - STARTED,
+            'stages':    dict((name, histogram.to_dict()) for name, histogram in TIMERS.items()),
+            'values':    dict((name, histogram.to_dict()) for name, histogram in VALUES.items()),
+            'counters':  dict(COUNTERS)
+        }
+
+def write_profile(filename):
+    '''
+    Writes the profile (see profile()) to filename as JSON
+    '''
+    with open(filename, "w") as fh:
+        json.dump(profile(), fh, indent=2, sort_keys=True)
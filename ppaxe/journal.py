@@ -0,0 +1,226 @@
+'''
+Run journal, to resume interrupted analyses.
+
+The journal is a SQLite database (in WAL mode) that records the stage reached
+by each article (fetched, annotated, predicted), the compact result of every
+predicted article and the size of the output file when it was recorded. Results
+are committed in groups, in the same transaction as the output size, so after a
+crash the output can be truncated to the last committed article and the run
+resumed from there without losing or duplicating interactions.
+'''
+
+from ppaxe import core
+import sqlite3
+import json
+import time
+import threading
+import os
+
+
+STAGES = ("fetched", "annotated", "predicted", "notfound")
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def result_to_json(result):
+    '''
+    Returns the core.ArticleResult result as a JSON string
+    '''
+    return json.dumps(list(result[:-1]) + [ list(interaction) for interaction in result.interactions ])
+
+def result_from_json(string):
+    '''
+    Returns the core.ArticleResult stored in the JSON string
+    '''
+    fields = json.loads(string)
+    interactions = [ core.Interaction(*interaction) for interaction in fields[len(core.ArticleResult._fields) - 1:] ]
+    return core.ArticleResult(*(fields[:len(core.ArticleResult._fields) - 1] + [interactions]))
+
+
+# CLASSES
+# ----------------------------------------------
+class JournalError(Exception):
+    '''
+    Exception raised when a journal can't be used to resume a run
+    '''
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+
+class RunJournal(object):
+    '''
+    Journal of an analysis, stored in a SQLite database.
+
+    Attributes
+    ----------
+    path : str, no default
+        Path of the SQLite database file.
+
+    commit_every : float, no default
+        Seconds between commits of the predicted articles. At most this much
+        work is lost if the run crashes.
+
+    seq : int, no default
+        Number of articles predicted (in this and previous runs).
+    '''
+    def __init__(self, path, commit_every=1.0):
+        '''
+        Parameters
+        ----------
+        path : str, required, no default
+            Path of the SQLite database file. Will be created if it does not exist.
+
+        commit_every : float, optional, default = 1.0
+            Seconds between commits of the predicted articles.
+        '''
+        self.path  = path
+        self.commit_every = commit_every
+        self.lock  = threading.Lock()
+        self.conn  = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles (pmid TEXT PRIMARY KEY, pmcid TEXT, stage TEXT, seq INTEGER, result TEXT, updated REAL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM articles").fetchone()[0]
+        self.committed = time.time()
+        self.output = None
+
+    def start(self, settings, resume=False):
+        '''
+        Starts a run with settings (dict of strings that must not change between
+        a run and its resumption, such as the database). If resume is False, the
+        previous contents of the journal are removed. Raises JournalError if resume
+        is True and the journal was written with other settings.
+        '''
+        with self.lock:
+            if resume:
+                stored = dict(self.conn.execute("SELECT key, value FROM run WHERE key != 'offset'").fetchall())
+                for key, value in settings.items():
+                    if key in stored and stored[key] != str(value):
+                        raise JournalError("%s was run with %s=%s, not %s" % (self.path, key, stored[key], value))
+            else:
+                self.conn.execute("DELETE FROM articles")
+                self.conn.execute("DELETE FROM run")
+                self.seq = 0
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO run (key, value) VALUES (?, ?)",
+                [ (key, str(value)) for key, value in settings.items() ]
+            )
+            self.conn.commit()
+
+    def mark(self, article, stage):
+        '''
+        Records that article (core.Article) reached stage ("fetched" or "annotated").
+        Marks are committed with the next predicted articles.
+        '''
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO articles (pmid, pmcid, stage, updated) VALUES (?, ?, ?, ?)",
+                (article.pmid, article.pmcid, stage, time.time())
+            )
+            self.conn.execute(
+                "UPDATE articles SET stage = ?, updated = ? WHERE pmid = ? AND stage != 'predicted'",
+                (stage, time.time(), article.pmid)
+            )
+
+    def mark_notfound(self, identifiers):
+        '''
+        Records the identifiers not found in the database, so they are not requested again
+        '''
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO articles (pmid, stage, updated) VALUES (?, 'notfound', ?)",
+                [ (identifier, time.time()) for identifier in identifiers ]
+            )
+            self.conn.commit()
+
+    def complete(self, result, output=None):
+        '''
+        Records the core.ArticleResult of a predicted article. If output (file handle)
+        is given, the interactions of the article must already be written to it.
+        '''
+        with self.lock:
+            self.seq += 1
+            self.conn.execute(
+                "INSERT OR REPLACE INTO articles (pmid, pmcid, stage, seq, result, updated) VALUES (?, ?, 'predicted', ?, ?, ?)",
+                (result.pmid, result.pmcid, self.seq, result_to_json(result), time.time())
+            )
+            self.output = output
+            if time.time() - self.committed >= self.commit_every:
+                self.__commit()
+
+    def __commit(self):
+        '''
+        Syncs the output to disk and commits the journal, with the output size
+        '''
+        if self.output is not None and not self.output.closed:
+            self.output.flush()
+            os.fsync(self.output.fileno())
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run (key, value) VALUES ('offset', ?)", (str(self.output.tell()),)
+            )
+        self.conn.commit()
+        self.committed = time.time()
+
+    def commit(self):
+        '''
+        Commits the articles recorded so far
+        '''
+        with self.lock:
+            self.__commit()
+
+    def completed(self):
+        '''
+        Returns the set of identifiers (PubMed and PMC) of the articles predicted
+        or not found in previous runs.
+        '''
+        with self.lock:
+            rows = self.conn.execute("SELECT pmid, pmcid FROM articles WHERE stage IN ('predicted', 'notfound')").fetchall()
+        identifiers = set()
+        for pmid, pmcid in rows:
+            identifiers.add(pmid)
+            if pmcid:
+                identifiers.add(pmcid)
+        return identifiers
+
+    def results(self):
+        '''
+        Yields the core.ArticleResult of the predicted articles, in the order they were predicted
+        '''
+        with self.lock:
+            rows = self.conn.execute("SELECT result FROM articles WHERE stage = 'predicted' ORDER BY seq").fetchall()
+        for row in rows:
+            yield result_from_json(row[0])
+
+    def offset(self):
+        '''
+        Returns the size of the output file at the last commit (None if unknown)
+        '''
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM run WHERE key = 'offset'").fetchone()
+        if row is None:
+            return None
+        return int(row[0])
+
+    def counts(self):
+        '''
+        Returns a dict with the number of articles in each stage
+        '''
+        with self.lock:
+            rows = self.conn.execute("SELECT stage, COUNT(*) FROM articles GROUP BY stage").fetchall()
+        counts = dict((stage, 0) for stage in STAGES)
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        '''
+        Commits and closes the database connection
+        '''
+        with self.lock:
+            self.__commit()
+            self.conn.close()
@@ -0,0 +1,149 @@
+'''
+Force-directed graph layout computed with NumPy, so that the report can embed
+the node positions (cytoscape "preset" layout) instead of running the layout in
+the browser.
+
+The layout is Fruchterman-Reingold: connected nodes attract each other, all
+nodes repel each other and a weak gravity keeps the components together. For
+small graphs the repulsion is computed between all pairs of nodes. For large
+graphs nodes are put in a grid and each node is repelled by the center of mass
+of every cell (grid approximation), which takes time proportional to the number
+of nodes times the number of cells instead of the square of the number of nodes.
+'''
+
+import numpy as np
+
+
+# Graphs with more nodes than this use the grid approximation
+EXACT_MAX_NODES = 1000
+# Rows (and columns) of the grid
+GRID_SIZE = 24
+# Number of nodes processed at once in the repulsion (limits the memory used)
+BLOCK_SIZE = 2048
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def repulsion(pos, centers, mass, k):
+    '''
+    Returns the repulsive displacement of each node in pos by bodies at centers with
+    mass, computed with matrix products: sum over bodies of mass * k^2 * delta / |delta|^2
+    '''
+    disp = np.zeros_like(pos)
+    sqcenters = np.einsum('ij,ij->i', centers, centers)
+    for start in range(0, len(pos), BLOCK_SIZE):
+        block = pos[start:start + BLOCK_SIZE]
+        dist2 = np.einsum('ij,ij->i', block, block)[:, None] + sqcenters[None, :] - 2 * np.dot(block, centers.T)
+        # Bodies at the position of the node (the node itself) don't repel it
+        weights = np.where(dist2 > 1e-6, mass[None, :] * (k * k) / np.maximum(dist2, 1e-6), 0)
+        disp[start:start + BLOCK_SIZE] = block * weights.sum(axis=1)[:, None] - np.dot(weights, centers)
+    return disp
+
+def exact_repulsion(pos, k):
+    '''
+    Returns the repulsive displacement of each node from all the other nodes
+    '''
+    return repulsion(pos, pos, np.ones(len(pos)), k)
+
+def grid_repulsion(pos, k, grid_size=GRID_SIZE):
+    '''
+    Returns the approximate repulsive displacement of each node: each cell of a
+    grid_size x grid_size grid repels it as a single body of all its nodes, at
+    their center of mass. The node's own cell repels it with the center of mass
+    of the other nodes of the cell.
+    '''
+    low = pos.min(axis=0)
+    span = np.maximum(pos.max(axis=0) - low, 1e-9)
+    cells = np.minimum((pos - low) / span * grid_size, grid_size - 1).astype(int)
+    cell = cells[:, 0] * grid_size + cells[:, 1]
+    ncells = grid_size * grid_size
+    mass = np.bincount(cell, minlength=ncells).astype(float)
+    sums = np.stack([np.bincount(cell, weights=pos[:, dim], minlength=ncells) for dim in range(2)], axis=1)
+    occupied = np.nonzero(mass)[0]
+    mass = mass[occupied]
+    sums = sums[occupied]
+    centers = sums / mass[:, None]
+    index = np.full(ncells, -1)
+    index[occupied] = np.arange(len(occupied))
+    own = index[cell]
+    disp = repulsion(pos, centers, mass, k)
+    # Replace the repulsion of the own cell by that of its other nodes
+    delta = pos - centers[own]
+    dist2 = np.maximum(np.einsum('ij,ij->i', delta, delta), 1e-6)
+    disp -= delta * (mass[own] * k * k / dist2)[:, None]
+    others = mass[own] - 1
+    hasothers = others > 0
+    delta = pos[hasothers] - (sums[own][hasothers] - pos[hasothers]) / others[hasothers, None]
+    dist2 = np.maximum(np.einsum('ij,ij->i', delta, delta), 1e-6)
+    disp[hasothers] += delta * (others[hasothers] * k * k / dist2)[:, None]
+    return disp
+
+def force_layout(nnodes, edges, iterations=50, weights=None, seed=1, exact=None):
+    '''
+    Returns the positions (numpy array of shape (nnodes, 2)) of a force-directed
+    layout of a graph. Deterministic for a given seed.
+
+    Parameters
+    ----------
+    nnodes : int, required, no default
+        Number of nodes.
+
+    edges : list, required, no default
+        List of (source, target) pairs of node indices.
+
+    iterations : int, optional, default = 50
+        Number of iterations.
+
+    weights : list, optional, default = None
+        Weight of each edge (strength of the attraction). All 1 by default.
+
+    seed : int, optional, default = 1
+        Seed of the initial random positions.
+
+    exact : bool, optional, default = None
+        Compute the repulsion between all pairs of nodes (True) or with the grid
+        approximation (False). By default, exact if there are at most
+        EXACT_MAX_NODES nodes.
+    '''
+    if nnodes == 0:
+        return np.zeros((0, 2))
+    if exact is None:
+        exact = nnodes <= EXACT_MAX_NODES
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    source, target = edges[:, 0], edges[:, 1]
+    weights = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=float)
+    # Area of 1 per node: k is the ideal distance between nodes
+    side = np.sqrt(nnodes)
+    k = 1.0
+    pos = np.random.RandomState(seed).uniform(0, side, (nnodes, 2))
+    temperature = side / 10.0
+    cooling = temperature / (iterations + 1)
+    for iteration in range(iterations):
+        disp = exact_repulsion(pos, k) if exact else grid_repulsion(pos, k)
+        delta = pos[source] - pos[target]
+        dist = np.sqrt(np.einsum('ij,ij->i', delta, delta)) + 1e-9
+        pull = delta * (weights * dist / k)[:, None]
+        for dim in range(2):
+            disp[:, dim] -= np.bincount(source, weights=pull[:, dim], minlength=nnodes)
+            disp[:, dim] += np.bincount(target, weights=pull[:, dim], minlength=nnodes)
+        # Gravity towards the center keeps disconnected components close
+        disp -= (pos - pos.mean(axis=0)) * (0.1 * k)
+        length = np.sqrt(np.einsum('ij,ij->i', disp, disp)) + 1e-9
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    return pos
+
+def scale_positions(pos, edges, spacing=60.0):
+    '''
+    Returns the positions centered at 0 and scaled so that the median length of
+    the edges is spacing (pixels, for cytoscape)
+    '''
+    if not len(pos):
+        return pos
+    pos = pos - pos.mean(axis=0)
+    edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+    lengths = np.sqrt(((pos[edges[:, 0]] - pos[edges[:, 1]]) ** 2).sum(axis=1))
+    lengths = lengths[lengths > 0]
+    # Without edges, the ideal distance between nodes in force_layout() is 1
+    median = np.median(lengths) if len(lengths) else 1.0
+    return pos * (spacing / median)
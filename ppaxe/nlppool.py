@@ -0,0 +1,351 @@
+'''
+Several StanfordCoreNLP servers used as one.
+
+BalancedNLP spreads the annotation requests over several servers: each request
+goes to the healthy server with the fewest requests in flight. Servers that fail
+max_failures requests in a row (connection errors, timeouts or non-json
+responses) are ejected for eject_seconds, and the request is retried in another
+server. A background thread checks the servers every check_interval seconds and
+brings back the ejected ones that answer.
+
+CoreNLPLauncher starts N local StanfordCoreNLP servers (JVMs) on free ports with
+data/server.properties, for BalancedNLP to use.
+
+Usage:
+    core.NLP = nlppool.BalancedNLP(["http://localhost:9000", "http://localhost:9001"])
+
+    launcher = nlppool.CoreNLPLauncher("stanford-corenlp-full-2017-06-09", servers=4)
+    urls = launcher.start()
+    ...
+    launcher.stop()
+'''
+
+from ppaxe import instrument
+import subprocess
+import threading
+import logging
+import socket
+import time
+import os
+import requests
+
+
+PROPERTIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "server.properties")
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def split_urls(urls):
+    '''
+    Returns the list of server addresses in urls (comma-separated string or list)
+    '''
+    if isinstance(urls, (list, tuple)):
+        return list(urls)
+    return [ url.strip() for url in urls.split(",") if url.strip() ]
+
+def free_port(host="127.0.0.1"):
+    '''
+    Returns a TCP port that is free at the moment
+    '''
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+# CLASSES
+# ----------------------------------------------
+class Endpoint(object):
+    '''
+    One StanfordCoreNLP server of a BalancedNLP.
+
+    Attributes
+    ----------
+    url : str, no default
+        Address of the server.
+
+    outstanding : int, no default
+        Requests in flight.
+
+    failures : int, no default
+        Consecutive failed requests.
+
+    ejected_until : float, no default
+        Time until which the server is not used (0 if healthy).
+
+    requests : int, no default
+        Requests sent.
+
+    errors : int, no default
+        Requests failed.
+
+    ejections : int, no default
+        Times the server has been ejected.
+    '''
+    def __init__(self, url):
+        self.url           = url.rstrip("/")
+        self.outstanding   = 0
+        self.failures      = 0
+        self.ejected_until = 0.0
+        self.requests      = 0
+        self.errors        = 0
+        self.ejections     = 0
+
+    def healthy(self, now):
+        return self.ejected_until <= now
+
+    def __repr__(self):
+        return "<Endpoint %s: %s requests, %s errors, %s in flight>" % (self.url, self.requests, self.errors, self.outstanding)
+
+
+class BalancedNLP(object):
+    '''
+    Client of several StanfordCoreNLP servers with the annotate() method of
+    pycorenlp.StanfordCoreNLP (it can be used as core.NLP). Thread-safe.
+
+    Attributes
+    ----------
+    endpoints : list, no default
+        List of Endpoint objects.
+
+    max_failures : int, no default
+        Consecutive failures after which a server is ejected.
+
+    eject_seconds : float, no default
+        Minimum time an ejected server is not used.
+
+    timeout : float, no default
+        Seconds to wait for each annotation (None to wait forever).
+
+    check_interval : float, no default
+        Seconds between health checks of the servers (0 to disable them).
+    '''
+    def __init__(self, urls, max_failures=3, eject_seconds=30, timeout=None, check_interval=5):
+        '''
+        Parameters
+        ----------
+        urls : list or str, required, no default
+            Addresses of the servers (list or comma-separated string).
+        '''
+        self.endpoints      = [ Endpoint(url) for url in split_urls(urls) ]
+        if not self.endpoints:
+            raise ValueError("No StanfordCoreNLP servers given")
+        self.max_failures   = max_failures
+        self.eject_seconds  = eject_seconds
+        self.timeout        = timeout
+        self.check_interval = check_interval
+        self.lock           = threading.Lock()
+        self.local          = threading.local()
+        self.checker        = None
+        self.closed         = threading.Event()
+
+    def session(self):
+        '''
+        Returns the requests.Session of this thread (keep-alive connections)
+        '''
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def acquire(self, exclude=()):
+        '''
+        Picks the healthy server with the fewest requests in flight (if all are
+        ejected, the one that will be back first) and counts the new request
+        '''
+        with self.lock:
+            if self.checker is None and self.check_interval:
+                self.checker = threading.Thread(target=self.check_loop)
+                self.checker.daemon = True
+                self.checker.start()
+            now = time.time()
+            candidates = [ endpoint for endpoint in self.endpoints if endpoint not in exclude ] or self.endpoints
+            healthy = [ endpoint for endpoint in candidates if endpoint.healthy(now) ]
+            if healthy:
+                endpoint = min(healthy, key=lambda endpoint: (endpoint.outstanding, endpoint.requests))
+            else:
+                endpoint = min(candidates, key=lambda endpoint: endpoint.ejected_until)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, ok):
+        '''
+        Counts the end of a request to endpoint, ejecting it after max_failures failures in a row
+        '''
+        with self.lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.failures = 0
+                return
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.failures >= self.max_failures and endpoint.healthy(time.time()):
+                endpoint.ejected_until = time.time() + self.eject_seconds
+                endpoint.ejections += 1
+                instrument.count("corenlp.ejections")
+                logging.warning("StanfordCoreNLP server %s ejected after %s failures.", endpoint.url, endpoint.failures)
+
+    def annotate(self, text, properties=None):
+        '''
+        Annotates text and returns the response of the server (json string). If
+        the request fails, it is retried once in another server. If it fails again,
+        the last exception is raised or the last response returned.
+        '''
+        params = {'properties': str(properties or {})}
+        data = text.encode('utf-8')
+        tried = list()
+        attempts = min(2, len(self.endpoints))
+        for attempt in range(attempts):
+            endpoint = self.acquire(exclude=tried)
+            tried.append(endpoint)
+            try:
+                response = self.session().post(endpoint.url, params=params, data=data, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                self.release(endpoint, False)
+                if attempt == attempts - 1:
+                    raise
+                instrument.count("corenlp.retries")
+                continue
+            output = response.text
+            # CoreNLP answers errors with plain text
+            ok = response.status_code == 200 and output.lstrip()[:1] == "{"
+            self.release(endpoint, ok)
+            if ok or attempt == attempts - 1:
+                return output
+            instrument.count("corenlp.retries")
+
+    def check(self):
+        '''
+        Pings the ejected servers whose ejection time has passed, and brings back those that answer
+        '''
+        now = time.time()
+        for endpoint in self.endpoints:
+            if endpoint.ejected_until == 0 or endpoint.ejected_until > now:
+                continue
+            try:
+                alive = requests.get(endpoint.url, timeout=5).status_code < 500
+            except requests.exceptions.RequestException:
+                alive = False
+            with self.lock:
+                if alive:
+                    endpoint.failures = 0
+                    endpoint.ejected_until = 0.0
+                    logging.info("StanfordCoreNLP server %s is back.", endpoint.url)
+                else:
+                    endpoint.ejected_until = time.time() + self.eject_seconds
+
+    def check_loop(self):
+        while not self.closed.wait(self.check_interval):
+            self.check()
+
+    def stats(self):
+        '''
+        Returns a list of (url, requests, errors, ejections) of each server
+        '''
+        with self.lock:
+            return [ (endpoint.url, endpoint.requests, endpoint.errors, endpoint.ejections) for endpoint in self.endpoints ]
+
+    def close(self):
+        '''
+        Stops the health checks
+        '''
+        self.closed.set()
+
+
+class CoreNLPLauncher(object):
+    '''
+    Starts local StanfordCoreNLP servers (one JVM each) on free ports.
+
+    Attributes
+    ----------
+    corenlp_dir : str, no default
+        Directory of StanfordCoreNLP (with the jars). The servers run in it, so
+        that the relative path of the NER model in server.properties works as in
+        the installation instructions.
+
+    servers : int, no default
+        Number of servers.
+
+    memory : str, no default
+        Maximum heap of each JVM (java -mx).
+
+    properties : str, no default
+        Server properties file (default: data/server.properties).
+
+    threads : int, no default
+        Threads of each server (None for the CoreNLP default).
+
+    processes : list, no default
+        subprocess.Popen of the running servers.
+
+    urls : list, no default
+        Addresses of the running servers.
+    '''
+    def __init__(self, corenlp_dir, servers=1, memory="4g", properties=PROPERTIES, threads=None, java="java"):
+        self.corenlp_dir = corenlp_dir
+        self.servers     = servers
+        self.memory      = memory
+        self.properties  = os.path.abspath(properties)
+        self.threads     = threads
+        self.java        = java
+        self.processes   = list()
+        self.urls        = list()
+
+    def command(self, port):
+        '''
+        Returns the command line of a server listening at port
+        '''
+        command = [
+            self.java, "-mx%s" % self.memory, "-cp", os.path.join(os.path.abspath(self.corenlp_dir), "*"),
+            "edu.stanford.nlp.pipeline.StanfordCoreNLPServer",
+            "-port", str(port), "-serverProperties", self.properties
+        ]
+        if self.threads:
+            command.extend(["-threads", str(self.threads)])
+        return command
+
+    def start(self, timeout=300):
+        '''
+        Starts the servers and waits until all of them answer (or timeout seconds,
+        then raises RuntimeError and stops them). Returns their addresses.
+        '''
+        with open(os.devnull, "w") as devnull:
+            for i in range(self.servers):
+                port = free_port()
+                self.processes.append(subprocess.Popen(self.command(port), cwd=self.corenlp_dir, stdout=devnull, stderr=devnull))
+                self.urls.append("http://127.0.0.1:%s" % port)
+        deadline = time.time() + timeout
+        waiting = list(zip(self.processes, self.urls))
+        while waiting:
+            process, url = waiting[0]
+            if process.poll() is not None:
+                self.stop()
+                raise RuntimeError("StanfordCoreNLP server at %s exited with code %s" % (url, process.returncode))
+            try:
+                requests.get(url, timeout=5)
+                waiting.pop(0)
+                continue
+            except requests.exceptions.RequestException:
+                pass
+            if time.time() > deadline:
+                self.stop()
+                raise RuntimeError("StanfordCoreNLP server at %s did not start in %s seconds" % (url, timeout))
+            time.sleep(0.5)
+        return list(self.urls)
+
+    def stop(self):
+        '''
+        Stops the servers
+        '''
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            try:
+                process.wait()
+            except OSError:
+                pass
+        self.processes = list()
+        self.urls = list()
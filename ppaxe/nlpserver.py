@@ -0,0 +1,262 @@
+'''
+Stand-in StanfordCoreNLP server, to test and benchmark ppaxe without the JVM and
+the protein tagger.
+
+Speaks the annotation protocol used by pycorenlp.StanfordCoreNLP.annotate(): the
+text is POSTed to /?properties=... and the json annotation is returned (GET
+requests, which pycorenlp sends before each annotation, are answered too).
+Annotations are replayed from an AnnotationStore (see ppaxe.replay) by the hash of
+the text and properties and, if not recorded, made by replay.tokenize(). Latency,
+the number of concurrent annotations and the rate of errors are configurable.
+
+Usage:
+    python -m ppaxe.nlpserver --port 9000 --store corenlp.jsonl --latency 0.05 --per-char 0.00002 --threads 4 --error-rate 0.01
+
+    from ppaxe import nlpserver
+    server = nlpserver.start(port=0, latency=0.01, threads=2)
+    core.NLP_URL = server.url
+    ...
+    server.shutdown()
+'''
+
+from ppaxe import replay
+import argparse
+import threading
+import logging
+import random
+import json
+import time
+import ast
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def parse_properties(value):
+    '''
+    Returns the properties (dict) of a request. pycorenlp sends str() of a python
+    dict, other clients send json.
+    '''
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+def start(host="127.0.0.1", port=0, **kwargs):
+    '''
+    Starts a NLPServer in a background thread and returns it (see NLPServer for
+    the keyword arguments). Port 0 uses any free port (see NLPServer.url).
+    '''
+    server = NLPServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+# CLASSES
+# ----------------------------------------------
+class NLPHandler(BaseHTTPRequestHandler):
+    '''
+    Handles the requests to NLPServer
+    '''
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path in ("/ping", "/live", "/ready"):
+            self.reply(200, "pong\n" if path == "/ping" else "ok\n", "text/plain")
+        elif path == "/stats":
+            self.reply(200, json.dumps(self.server.get_stats()), "application/json")
+        else:
+            self.server.count('pings')
+            self.reply(200, "StanfordCoreNLP stand-in (ppaxe)\n", "text/plain")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        text = self.rfile.read(length).decode('utf-8')
+        try:
+            properties = parse_properties(parse_qs(url.query).get('properties', [''])[0])
+        except (ValueError, SyntaxError):
+            self.reply(400, "Could not parse the properties\n", "text/plain")
+            return
+        status, body = self.server.annotate(text, properties)
+        self.reply(status, body, "application/json" if status == 200 else "text/plain")
+
+    def reply(self, status, body, content_type):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("nlpserver: " + format, *args)
+
+
+class NLPServer(ThreadingMixIn, HTTPServer):
+    '''
+    Stand-in StanfordCoreNLP server (threaded HTTP server).
+
+    Attributes
+    ----------
+    nlp : replay.ReplayNLP, no default
+        Annotates the texts (recorded responses or tokenize()).
+
+    latency : float, no default
+        Seconds spent in each annotation.
+
+    per_char : float, no default
+        Extra seconds per character of the text.
+
+    jitter : float, no default
+        Latency is multiplied by a random factor between 1 - jitter and 1 + jitter.
+
+    threads : int, no default
+        Maximum number of annotations at the same time (others wait, like in
+        CoreNLP). None for no limit.
+
+    error_rate : float, no default
+        Fraction of annotations that fail with error_status.
+
+    error_status : int, no default
+        HTTP status of the injected errors (500, as CoreNLP when annotation fails).
+
+    stats : dict, no default
+        Number of pings, requests, errors, characters and the maximum number of
+        annotations running at the same time.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, store=None, fallback=True, latency=0.0, per_char=0.0, jitter=0.0,
+                 threads=None, error_rate=0.0, error_status=500, seed=None):
+        '''
+        Parameters
+        ----------
+        address : tuple, required, no default
+            (host, port) to listen at.
+
+        store : replay.AnnotationStore or str, optional, default = None
+            Recorded responses, or path of the json lines file with them.
+
+        fallback : bool, optional, default = True
+            Annotate texts that were not recorded with replay.tokenize(). If
+            False, they get an error.
+
+        seed : int, optional, default = None
+            Seed of the random latency and errors.
+        '''
+        HTTPServer.__init__(self, address, NLPHandler)
+        if store is None or isinstance(store, replay.AnnotationStore):
+            self.nlp = replay.ReplayNLP(store, fallback)
+        else:
+            self.nlp = replay.ReplayNLP(replay.AnnotationStore(store), fallback)
+        self.latency      = latency
+        self.per_char     = per_char
+        self.jitter       = jitter
+        self.threads      = threads
+        self.error_rate   = error_rate
+        self.error_status = error_status
+        self.random       = random.Random(seed)
+        self.slots        = threading.BoundedSemaphore(threads) if threads else None
+        self.lock         = threading.Lock()
+        self.running      = 0
+        self.stats        = {'pings': 0, 'requests': 0, 'errors': 0, 'chars': 0, 'max_running': 0}
+
+    @property
+    def url(self):
+        '''
+        Address of the server, to be used as core.NLP_URL
+        '''
+        return "http://%s:%s" % self.server_address[:2]
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+    def get_stats(self):
+        '''
+        Returns a copy of stats, with the recorded and tokenized annotations
+        '''
+        with self.lock:
+            stats = dict(self.stats)
+        stats['recorded']  = self.nlp.hits
+        stats['tokenized'] = self.nlp.misses
+        return stats
+
+    def annotate(self, text, properties):
+        '''
+        Returns (HTTP status, body) of an annotation request, after waiting for a
+        free slot and the latency
+        '''
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['chars'] += len(text)
+            delay = (self.latency + self.per_char * len(text)) * (1 + self.jitter * (2 * self.random.random() - 1))
+            failed = self.random.random() < self.error_rate
+        if self.slots is not None:
+            self.slots.acquire()
+        try:
+            with self.lock:
+                self.running += 1
+                self.stats['max_running'] = max(self.stats['max_running'], self.running)
+            if delay > 0:
+                time.sleep(delay)
+            if failed:
+                self.count('errors')
+                return self.error_status, "Injected error\n"
+            try:
+                return 200, self.nlp.annotate(text, properties)
+            except KeyError as err:
+                self.count('errors')
+                return 500, "%s\n" % err
+        finally:
+            with self.lock:
+                self.running -= 1
+            if self.slots is not None:
+                self.slots.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--store', help='JSON lines file with recorded CoreNLP responses (see ppaxe.replay)')
+    parser.add_argument('--no-fallback', action="store_true", help='Texts that were not recorded get an error')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per annotation')
+    parser.add_argument('--per-char', type=float, default=0.0, help='Extra seconds per character')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random variation of the latency (fraction)')
+    parser.add_argument('--threads', type=int, help='Maximum number of concurrent annotations')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of annotations that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of the failed annotations')
+    parser.add_argument('--seed', type=int, help='Seed of the random latency and errors')
+    options = parser.parse_args()
+    server = NLPServer((options.host, options.port), store=options.store, fallback=not options.no_fallback,
+                       latency=options.latency, per_char=options.per_char, jitter=options.jitter,
+                       threads=options.threads, error_rate=options.error_rate,
+                       error_status=options.error_status, seed=options.seed)
+    print("Serving at %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.get_stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+'''
+Pipeline of concurrent stages connected by bounded queues.
+
+Each stage runs in its own thread, takes the items of the previous stage from a
+queue, processes them in order and puts the results in the queue of the next
+stage. Bounded queues give backpressure: a fast stage waits when the next one
+falls behind, so the number of items in memory stays constant. Errors in any
+stage are raised to the consumer of the pipeline.
+'''
+
+import sys
+import threading
+
+try:
+    # For python 2.7
+    import Queue as queue
+except ImportError:
+    # For python 3
+    import queue
+
+
+class Pipeline(object):
+    '''
+    Pipeline of stages applied to the items of a source iterable. Iterating the
+    pipeline starts the threads and yields the results of the last stage, in the
+    order of the source.
+
+    Attributes
+    ----------
+    source : iterable, no default
+        Items to process.
+
+    stages : list, no default
+        List of (name, function) tuples. Each function takes an item and returns
+        the item for the next stage (or None to drop it).
+
+    maxsize : int, no default
+        Maximum number of items waiting between two stages.
+
+    counts : dict, no default
+        Number of items that went out of each stage, by stage name.
+    '''
+    def __init__(self, source, maxsize=4):
+        '''
+        Parameters
+        ----------
+        source : iterable, required, no default
+            Items to process.
+
+        maxsize : int, optional, default = 4
+            Maximum number of items waiting between two stages.
+        '''
+        self.source  = source
+        self.stages  = list()
+        self.maxsize = max(1, maxsize)
+        self.counts  = dict()
+        self.stop    = threading.Event()
+
+    def add_stage(self, name, function):
+        '''
+        Adds a stage at the end of the pipeline. Returns the pipeline.
+        '''
+        self.stages.append((name, function))
+        self.counts[name] = 0
+        return self
+
+    def __put(self, outqueue, item):
+        '''
+        Puts item in outqueue, giving up if the pipeline is stopped. Returns False if stopped.
+        '''
+        while not self.stop.is_set():
+            try:
+                outqueue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __get(self, inqueue):
+        '''
+        Gets an item from inqueue, giving up if the pipeline is stopped (returns DONE).
+        '''
+        while not self.stop.is_set():
+            try:
+                return inqueue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return DONE
+
+    def __run_source(self, outqueue):
+        try:
+            for item in self.source:
+                if not self.__put(outqueue, item):
+                    return
+        except Exception:
+            self.__put(outqueue, Failure(sys.exc_info()))
+            return
+        self.__put(outqueue, DONE)
+
+    def __run_stage(self, name, function, inqueue, outqueue):
+        while True:
+            item = self.__get(inqueue)
+            if item is DONE or isinstance(item, Failure):
+                self.__put(outqueue, item)
+                return
+            try:
+                result = function(item)
+            except Exception:
+                self.__put(outqueue, Failure(sys.exc_info()))
+                return
+            if result is None:
+                continue
+            self.counts[name] += 1
+            if not self.__put(outqueue, result):
+                return
+
+    def __iter__(self):
+        queues  = [ queue.Queue(self.maxsize) for i in range(len(self.stages) + 1) ]
+        threads = [ threading.Thread(target=self.__run_source, args=(queues[0],)) ]
+        for idx, (name, function) in enumerate(self.stages):
+            threads.append(threading.Thread(target=self.__run_stage, args=(name, function, queues[idx], queues[idx + 1])))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is DONE:
+                    break
+                if isinstance(item, Failure):
+                    item.reraise()
+                yield item
+        finally:
+            # Stop the threads if the consumer stops early or a stage failed
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+
+class Failure(object):
+    '''
+    Exception raised in a stage, passed down the pipeline to the consumer.
+    '''
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+    def reraise(self):
+        '''
+        Raises the exception in the thread of the caller
+        '''
+        raise self.exc_info[1]
+
+
+# Marks the end of the items
+DONE = object()
@@ -0,0 +1,201 @@
+'''
+Recorded StanfordCoreNLP annotations, to analyze texts without a CoreNLP server.
+
+An AnnotationStore keeps CoreNLP json responses keyed by the hash of the text and
+the request properties, in a json lines file. RecordingNLP saves the responses of
+a real server in a store and ReplayNLP answers from it, falling back (optionally)
+to tokenize(): a trivial deterministic tokenizer that returns responses with the
+same structure, tagging gene-like words as proteins. Both have the annotate()
+method of pycorenlp.StanfordCoreNLP, so they can be used as core.NLP.
+'''
+
+import hashlib
+import json
+import re
+import threading
+import os
+
+
+TOKEN_RE    = re.compile(r"\w+(?:[-/.']\w+)*|[^\w\s]")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+# Upper-case symbols with digits (MAPK13, IL-6) or all capitals (ALB, TP53)
+PROTEIN_RE  = re.compile(r"^(?:[A-Z][A-Za-z-]*[0-9][A-Za-z0-9-]*|[A-Z]{2,}[0-9]*)$")
+VERBS = set([
+    "interact", "bind", "activate", "inhibit", "phosphorylate", "regulate", "associate",
+    "induce", "suppress", "promote", "mediate", "modulate", "recruit", "stimulate", "block"
+])
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def text_key(text, properties=None):
+    '''
+    Returns the key of a request: sha1 of the properties and the text
+    '''
+    header = json.dumps(properties or {}, sort_keys=True)
+    return hashlib.sha1((header + "\n" + text).encode('utf-8')).hexdigest()
+
+def tag_word(word):
+    '''
+    Returns the (lemma, pos, ner) of a word for tokenize()
+    '''
+    lower = word.lower()
+    if PROTEIN_RE.match(word):
+        return word, "NN", "P"
+    if not word[0].isalnum():
+        return word, word, "O"
+    if word[0].isdigit():
+        return word, "CD", "O"
+    for suffix, pos in (("s", "VBZ"), ("es", "VBZ"), ("ed", "VBD"), ("d", "VBD"), ("ing", "VBG"), ("", "VB")):
+        if lower.endswith(suffix) and lower[:len(lower) - len(suffix)] in VERBS:
+            return lower[:len(lower) - len(suffix)], pos, "O"
+    if lower in ("the", "a", "an"):
+        return lower, "DT", "O"
+    if lower in ("of", "in", "with", "by", "to", "for", "on", "from"):
+        return lower, "IN", "O"
+    return lower, "NN", "O"
+
+def tokenize(text, properties=None):
+    '''
+    Returns a CoreNLP-like json response (dict) for text: sentences split at line
+    breaks (if ssplit.newlineIsSentenceBreak is "always") and after ". ", tokens
+    with character offsets, lemma, pos and ner. Deterministic, and only meant for
+    testing and benchmarking.
+    '''
+    properties = properties or {}
+    if properties.get('ssplit.newlineIsSentenceBreak') == 'always':
+        lines = text.split("\n")
+    else:
+        lines = [text]
+    sentences = list()
+    offset = 0
+    for line in lines:
+        start = 0
+        for chunk in SENTENCE_RE.split(line):
+            begin = line.index(chunk, start) if chunk else start
+            start = begin + len(chunk)
+            tokens = list()
+            for match in TOKEN_RE.finditer(chunk):
+                word = match.group(0)
+                lemma, pos, ner = tag_word(word)
+                tokens.append({
+                    'index': len(tokens) + 1,
+                    'word': word,
+                    'originalText': word,
+                    'lemma': lemma,
+                    'pos': pos,
+                    'ner': ner,
+                    'characterOffsetBegin': offset + begin + match.start(),
+                    'characterOffsetEnd': offset + begin + match.end()
+                })
+            if tokens:
+                sentences.append({'index': len(sentences), 'tokens': tokens})
+        offset += len(line) + 1
+    return {'sentences': sentences}
+
+
+# CLASSES
+# ----------------------------------------------
+class AnnotationStore(object):
+    '''
+    CoreNLP responses keyed by text_key(), stored in a json lines file
+    (one {"key": ..., "response": ...} object per line).
+
+    Attributes
+    ----------
+    path : str, no default
+        Path of the json lines file (None to keep the responses only in memory).
+
+    responses : dict, no default
+        Responses (json strings) by key.
+    '''
+    def __init__(self, path=None):
+        '''
+        Parameters
+        ----------
+        path : str, optional, default = None
+            Path of the json lines file. Read if it exists, and new responses are appended to it.
+        '''
+        self.path = path
+        self.responses = dict()
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as fh:
+                for line in fh:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.responses[record['key']] = record['response']
+
+    def get(self, text, properties=None):
+        '''
+        Returns the recorded response (json string) or None
+        '''
+        return self.responses.get(text_key(text, properties))
+
+    def add(self, text, properties, response):
+        '''
+        Records the response (json string) to text with properties
+        '''
+        key = text_key(text, properties)
+        with self.lock:
+            if key in self.responses:
+                return
+            self.responses[key] = response
+            if self.path is not None:
+                with open(self.path, "a") as fh:
+                    fh.write(json.dumps({'key': key, 'response': response}) + "\n")
+
+    def __len__(self):
+        return len(self.responses)
+
+
+class RecordingNLP(object):
+    '''
+    Wraps a StanfordCoreNLP client and records its responses in an AnnotationStore
+    '''
+    def __init__(self, nlp, store):
+        self.nlp = nlp
+        self.store = store
+
+    def annotate(self, text, properties=None):
+        response = self.nlp.annotate(text, properties=properties)
+        if not isinstance(response, str):
+            response = json.dumps(response)
+        self.store.add(text, properties, response)
+        return response
+
+
+class ReplayNLP(object):
+    '''
+    Answers annotation requests with the responses of an AnnotationStore and,
+    for texts that were not recorded, with tokenize() (if fallback is True).
+
+    Attributes
+    ----------
+    store : AnnotationStore, no default
+        Recorded responses.
+
+    fallback : bool, no default
+        Use tokenize() for texts that were not recorded. If False, they raise KeyError.
+
+    hits : int, no default
+        Number of requests answered with recorded responses.
+
+    misses : int, no default
+        Number of requests not recorded.
+    '''
+    def __init__(self, store=None, fallback=True):
+        self.store    = store if store is not None else AnnotationStore()
+        self.fallback = fallback
+        self.hits     = 0
+        self.misses   = 0
+
+    def annotate(self, text, properties=None):
+        response = self.store.get(text, properties)
+        if response is not None:
+            self.hits += 1
+            return response
+        self.misses += 1
+        if not self.fallback:
+            raise KeyError("No recorded annotation for %s" % text_key(text, properties))
+        return json.dumps(tokenize(text, properties))
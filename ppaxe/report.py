@@ -1,13 +1,56 @@
 '''
 Classes for report Summary
 '''
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import numpy as np
+import itertools
+import heapq
 import base64
+import json
+import os
+from ppaxe import instrument
+from ppaxe import layout
 
 from io import BytesIO
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+# Maximum number of edges drawn in the graph of the report (None for all of them).
+# Bigger graphs make the cytoscape layout freeze the browser.
+GRAPH_MAX_EDGES = 2000
+# How the interaction and protein tables are written in the report: "html" rows,
+# or their data as json arrays rendered by DataTables, "json" inline in the report
+# or "chunks" in sidecar script files of TABLE_CHUNK_ROWS rows (see write_table()).
+TABLE_MODES = ("html", "json", "chunks")
+TABLE_CHUNK_ROWS = 10000
+INTERACTION_COLUMNS = [
+    "Confidence", "Protein (A)","Protein (B)",
+    "Off.symbol (A)", "Off.symbol (B)",
+    "PMid", "Year", "Sentence"
+]
+PROTEIN_COLUMNS = ["Protein","Total count","Int. count", "Left count", "Right count"]
+DATATABLES_CSS = "https://cdn.datatables.net/1.10.16/css/jquery.dataTables.min.css"
+DATATABLES_JS  = "https://cdn.datatables.net/1.10.16/js/jquery.dataTables.min.js"
+SCROLLER_CSS   = "https://cdn.datatables.net/scroller/1.4.3/css/scroller.dataTables.min.css"
+SCROLLER_JS    = "https://cdn.datatables.net/scroller/1.4.3/js/dataTables.scroller.min.js"
+# Bytes of the plots encoded in base64 at a time (multiple of 3, see write_base64())
+BASE64_CHUNK = 3 * 16384
+# Receives the rows of the json tables, and renders the links of their cells
+TABLE_SCRIPT = '''<script>
+var PPAXE_TABLES = {};
+function ppaxeRows(table, rows) {
+    var data = PPAXE_TABLES[table] = PPAXE_TABLES[table] || [];
+    for (var i = 0; i < rows.length; i++) { data.push(rows[i]); }
+}
+function uniprotLink(symbol, type) {
+    return type === 'display' ? '<a href="http://www.uniprot.org/uniprot/?query=' + symbol + '&sort=score" target="_blank">' + symbol + '</a>' : symbol;
+}
+function pubmedLink(pmid, type) {
+    return type === 'display' ? '<a href="https://www.ncbi.nlm.nih.gov/pubmed/?term=' + pmid + '" target="_blank">' + pmid + '</a>' : pmid;
+}
+</script>'''
 
 
 # FUNCTIONS
@@ -24,6 +67,218 @@ def make_html_row(items, header=False):
         row_str = ['<tr>', '\n'.join([ "<td>" + str(x) + "</td>" for x in items]), '</tr>']
         return "\n".join(row_str)
 
+def article_results(articles):
+    '''
+    Returns the compact results (core.ArticleResult) of a list of Article objects
+    (already predicted). Items that already are results are kept as they are.
+    '''
+    return [ article.summarize() if hasattr(article, 'summarize') else article for article in articles ]
+
+def uniprot_link(symbol):
+    '''
+    Returns an html link to the UniProt search of symbol
+    '''
+    return '<a href="http://www.uniprot.org/uniprot/?query=%s&sort=score" target="_blank">%s</a>' % (symbol, symbol)
+
+def pubmed_link(pmid):
+    '''
+    Returns an html link to the PubMed page of pmid
+    '''
+    return '<a href="https://www.ncbi.nlm.nih.gov/pubmed/?term=%s" target="_blank">%s</a>' % (pmid, pmid)
+
+def html_table_lines(table_id, colnames, rows):
+    '''
+    Yields the lines of an html table (header and rows of cells)
+    '''
+    yield '<table id="%s">' % table_id
+    yield "<thead>"
+    yield make_html_row(colnames, header=True)
+    yield "</thead>"
+    yield "<tbody>"
+    for row in rows:
+        yield make_html_row(row)
+    yield "</tbody>"
+    yield "</table>"
+
+def write_json_rows(outf, rows):
+    '''
+    Writes rows (iterable of lists) to outf as a json array, one row at a time
+    '''
+    outf.write("[")
+    separator = ""
+    for row in rows:
+        outf.write(separator + json.dumps(row, separators=(",", ":")).replace("</", "<\\/"))
+        separator = ",\n"
+    outf.write("]")
+
+def write_table(outf, outfile, table_id, colnames, rows, mode="html", html_cells=None):
+    '''
+    Writes a table of the report to outf, streaming the rows.
+
+    Parameters
+    ----------
+    outf : file, required, no default
+        File handle of the html report.
+
+    outfile : str, required, no default
+        Filename of the html report. In "chunks" mode, the data is written in
+        outfile without ".html" + "_files"/table_id-N.js.
+
+    table_id : str, required, no default
+        Id of the table element.
+
+    colnames : list, required, no default
+        Names of the columns.
+
+    rows : iterable, required, no default
+        Rows of the table (lists of values).
+
+    mode : str, optional, default = "html"
+        "html" to write the rows as html, "json" to write them as a json array in
+        a script, or "chunks" to write them in script files of TABLE_CHUNK_ROWS rows
+        (see TABLE_MODES). json tables are filled by DataTables (see datatable_script()).
+
+    html_cells : function, optional, default = None
+        Returns the html cells of a row in "html" mode (default: the values).
+    '''
+    if mode == "html":
+        if html_cells is not None:
+            rows = ( html_cells(row) for row in rows )
+        for line in html_table_lines(table_id, colnames, rows):
+            outf.write(line + "\n")
+        return
+    if mode not in TABLE_MODES:
+        raise ValueError("Unknown table mode %s. Only %s." % (mode, ", ".join(TABLE_MODES)))
+    outf.write('<table id="%s" class="display" width="100%%">\n<thead>\n%s\n</thead>\n</table>\n' % (table_id, make_html_row(colnames, header=True)))
+    if mode == "json":
+        outf.write('<script>ppaxeRows("%s", ' % table_id)
+        write_json_rows(outf, rows)
+        outf.write(');</script>\n')
+        return
+    directory = os.path.splitext(outfile)[0] + "_files"
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    rows = iter(rows)
+    chunk = 0
+    while True:
+        rows_chunk = list(itertools.islice(rows, TABLE_CHUNK_ROWS))
+        if not rows_chunk and chunk > 0:
+            break
+        filename = "%s-%s.js" % (table_id, chunk)
+        with open(os.path.join(directory, filename), "w") as chunkf:
+            chunkf.write('ppaxeRows("%s", ' % table_id)
+            write_json_rows(chunkf, rows_chunk)
+            chunkf.write(');\n')
+        outf.write('<script src="%s/%s"></script>\n' % (os.path.basename(directory), filename))
+        chunk += 1
+        if len(rows_chunk) < TABLE_CHUNK_ROWS:
+            break
+
+def datatable_script(table_id, order, mode="html", columndefs=""):
+    '''
+    Returns the javascript that makes a DataTable of table_id sorted by column order
+    (descending). Tables written as json (see write_table()) are rendered as they are
+    scrolled, with the links of columndefs (javascript array of DataTables column definitions).
+    '''
+    if mode == "html":
+        return "$('#%s').DataTable({ \"order\": [[ %s, \"desc\" ]] });" % (table_id, order)
+    return ("$('#%s').DataTable({ data: PPAXE_TABLES['%s'] || [], deferRender: true, scrollY: 600, scroller: true, "
+            "\"order\": [[ %s, \"desc\" ]], columnDefs: %s });") % (table_id, table_id, order, columndefs or "[]")
+
+def pair_degrees(pairs):
+    '''
+    Returns the number of pairs (edges) of each symbol
+    '''
+    degree = dict()
+    for pair in pairs:
+        for symbol in set(pair):
+            degree[symbol] = degree.get(symbol, 0) + 1
+    return degree
+
+def write_lines(outf, lines):
+    '''
+    Writes lines (iterable of strings) to outf, one at a time, each followed by a newline
+    '''
+    for line in lines:
+        outf.write(line + "\n")
+
+def write_base64(outf, fileobj, chunk_size=BASE64_CHUNK):
+    '''
+    Writes the contents of fileobj (binary file or BytesIO) to outf encoded in base64,
+    chunk_size bytes at a time. chunk_size must be a multiple of 3, so that the
+    encoded chunks join without padding.
+    '''
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        outf.write(base64.b64encode(chunk).decode('ascii'))
+
+def write_elements_json(outf, nodes, edges, positions=None):
+    '''
+    Writes the json of the cytoscape elements of a graph to outf, one element at a
+    time, safe to embed in a <script> element. nodes and edges are iterables of
+    dicts with the data of the elements (see GraphSummary.iter_nodes()). positions
+    is an optional array with the (x, y) of each node (see graph_positions()).
+    '''
+    dumps = lambda element: json.dumps(element, separators=(",", ":")).replace("</", "<\\/")
+    if positions is not None:
+        nodes = ( ({'data': node}, (x, y)) for node, (x, y) in zip(nodes, positions.tolist()) )
+    else:
+        nodes = ( ({'data': node}, None) for node in nodes )
+    outf.write('{"nodes":[')
+    separator = ""
+    for element, position in nodes:
+        if position is not None:
+            element['position'] = {'x': round(position[0], 1), 'y': round(position[1], 1)}
+        outf.write(separator + dumps(element))
+        separator = ","
+    outf.write('],"edges":[')
+    separator = ""
+    for edge in edges:
+        outf.write(separator + dumps({'data': edge}))
+        separator = ","
+    outf.write(']}')
+
+def elements_to_json(nodes, edges, positions=None):
+    '''
+    Returns the json of the cytoscape elements of a graph (see GraphSummary.graph()),
+    safe to embed in a <script> element. positions is an optional array with the
+    (x, y) of each node (see graph_positions()).
+    '''
+    outf = StringIO()
+    write_elements_json(outf, nodes, edges, positions)
+    return outf.getvalue()
+
+def pair_positions(symbols, pairs):
+    '''
+    Returns the positions (array of (x, y) in pixels) of the nodes (symbols) of a
+    graph with edges between pairs of symbols, with a force-directed layout (see
+    ppaxe.layout)
+    '''
+    index = dict((symbol, idx) for idx, symbol in enumerate(symbols))
+    pairs = [ (index[source], index[target]) for source, target in pairs ]
+    positions = layout.force_layout(len(index), pairs)
+    return layout.scale_positions(positions, pairs)
+
+def graph_positions(nodes, edges):
+    '''
+    Returns the positions (array of (x, y) in pixels) of the nodes of a graph
+    (see GraphSummary.graph()) with a force-directed layout (see ppaxe.layout)
+    '''
+    return pair_positions([ node['id'] for node in nodes ], [ (edge['source'], edge['target']) for edge in edges ])
+
+def get_pyplot():
+    '''
+    Returns matplotlib.pyplot using the Agg backend. Imported the first time
+    a plot is made, because importing it is slow.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
 def year_extender(years):
     '''
     Fills the missing years in a list of years
@@ -41,37 +296,86 @@ def year_extender(years):
 # ----------------------------------------------
 class ReportSummary(object):
     '''
-    Class for the report summary of the analysis.
+    Class for the report summary of the analysis. Articles are summarized in a
+    single pass as they are added, so they don't need to be kept in memory.
 
     Attributes
     ----------
-    articles : list or PMQuery, no default
-        List of Article objects or PMQuery with Article objects in attribute "articles".
-
     protsummary : ProteinSummary, no default
         ProteinSummary object of the analysis.
 
     graphsummary : GraphSummary, no default
         GraphSummary object of the analysis.
+
+    journals : dict, no default
+        Number of proteins ('prots') and interactions ('ints') found in each journal.
+
+    years : dict, no default
+        Number of interactions found in the articles of each year.
+
+    totalarticles : int, no default
+        Number of articles added.
+
+    totalsentences : int, no default
+        Number of sentences of the articles added.
+
+    graph_filters : dict, no default
+        Filters of the graph in the report (keyword arguments of GraphSummary.graph()).
+        By default, only the GRAPH_MAX_EDGES strongest edges are drawn.
+
+    graph_layout : str, no default
+        Layout of the graph in the report: "force" to compute the positions of the
+        nodes when writing the report (see ppaxe.layout), or "cose" to let cytoscape
+        compute them in the browser (slow for big graphs).
+
+    tables : str, no default
+        How the tables are written in the report: "html", "json" or "chunks"
+        (see write_table()).
     '''
-    def __init__(self, articles):
+    def __init__(self, articles=None):
         '''
         Summary of the analysis to create an html or pdf report.
 
         Parameters
         ----------
-        articles : list or PMQuery, required, no default
-            List of Article objects or PMQuery with Article objects in attribute "articles".
+        articles : iterable or PMQuery, optional, default = None
+            Article objects (already predicted), PMQuery with Article objects in attribute
+            "articles" or ArticleResult objects (see Article.summarize()). Can be a
+            generator. More articles can be added later with add().
         '''
         try: # Check if articles is a PMQuery
-            self.articles = articles.articles
+            articles = articles.articles
         except AttributeError: # Not a PMQuery
-            self.articles = articles
-        self.protsummary  = ProteinSummary(self.articles)
-        self.graphsummary = GraphSummary(self.articles)
-        self.totalarticles = len(self.articles)
-        self.totalsentences = sum([ len(art.sentences) for art in self.articles ])
+            pass
+        self.protsummary  = ProteinSummary()
+        self.graphsummary = GraphSummary()
+        self.journals = dict()
+        self.years    = dict()
+        self.totalarticles  = 0
+        self.totalsentences = 0
         self.plots = dict()
+        self.graph_filters = {'max_edges': GRAPH_MAX_EDGES}
+        self.graph_layout  = "force"
+        self.tables        = "html"
+        for article in articles or []:
+            self.add(article)
+
+    def add(self, article):
+        '''
+        Adds an Article (already predicted) or ArticleResult to the summary: updates
+        the protein table, the interactions and the counts by journal and year.
+        '''
+        if hasattr(article, 'summarize'):
+            article = article.summarize()
+        self.totalarticles  += 1
+        self.totalsentences += article.sentences
+        self.protsummary.add(article)
+        self.graphsummary.add(article)
+        if article.journal not in self.journals:
+            self.journals[article.journal] = {'ints': 0, 'prots': 0}
+        self.journals[article.journal]['prots'] += len(article.proteins)
+        self.journals[article.journal]['ints']  += len(article.interactions)
+        self.years[article.year] = self.years.get(article.year, 0) + len(article.interactions)
 
     def make_report(self, outfile="report"):
         '''
@@ -82,50 +386,36 @@ class ReportSummary(object):
         outfile : str, optional, default = "report"
             Filename of the output file. Will append ".html" or ".pdf".
         '''
-        self.protsummary.makesummary()
-        self.graphsummary.makesummary()
-        self.plots['j_int_plot'], self.plots['j_prot_plot'], self.plots['a_year_plot'] = self.journal_plots()
-        self.write_html(outfile)
+        with instrument.timer("report.protein_summary"):
+            self.protsummary.makesummary()
+        with instrument.timer("report.graph_summary"):
+            self.graphsummary.makesummary()
+        with instrument.timer("report.plots"):
+            self.plots['j_int_plot'], self.plots['j_prot_plot'], self.plots['a_year_plot'] = self.journal_plots()
+        with instrument.timer("report.html"):
+            self.write_html(outfile)
         # self.write_markdown(outfile)
         # self.create_pdf(outfile)
 
     def journal_plots(self):
         '''
-        Counts the number of proteins and interactions found in each journal.
-        Returns the base65 binary of the journal plots
+        Plots the number of proteins and interactions found in each journal and
+        the interactions per year. Returns the png images (BytesIO) of the plots.
         '''
-        journals = dict()
-        years = dict()
-        for article in self.articles:
-            # Initialize
-            if article.journal not in journals:
-                journals[article.journal] = dict()
-                journals[article.journal]['ints'] = 0
-                journals[article.journal]['prots'] = 0
-            if article.year not in years:
-                years[article.year] = 0
-            # Count proteins
-            for sentence in article.sentences:
-                for proteins in sentence.proteins:
-                    journals[article.journal]['prots'] += 1
-                # Count interactions
-                for candidate in sentence.candidates:
-                    if candidate.label is True:
-                        journals[article.journal]['ints'] += 1
-                        # Count years of interactions in articles
-                        years[article.year] += 1
         # Remove journals without ints or prots
-        journals_ints  = {k: v for k, v in journals.items() if v['ints'] > 0}
-        journals_prots = {k: v for k, v in journals.items() if v['prots'] > 0}
+        journals_ints  = {k: v for k, v in self.journals.items() if v['ints'] > 0}
+        journals_prots = {k: v for k, v in self.journals.items() if v['prots'] > 0}
         figure_ints =  self.__make_journal_plots(journals_ints,  mode="ints")
         figure_prots = self.__make_journal_plots(journals_prots, mode="prots")
-        figure_years = self.__make_year_plot(years)
+        figure_years = self.__make_year_plot(self.years)
         sio_ints  = BytesIO()
         sio_prots = BytesIO()
         sio_years = BytesIO()
-        figure_ints.savefig(sio_ints, format="png")
-        figure_prots.savefig(sio_prots, format="png")
-        figure_years.savefig(sio_years, format="png")
+        plt = get_pyplot()
+        for figure, sio in ((figure_ints, sio_ints), (figure_prots, sio_prots), (figure_years, sio_years)):
+            figure.savefig(sio, format="png")
+            # pyplot keeps the figures until they are closed
+            plt.close(figure)
         return sio_ints, sio_prots, sio_years
 
     def __make_year_plot(self, years):
@@ -144,6 +434,7 @@ class ReportSummary(object):
             else:
                 count.append(0)
         # Make the plot
+        plt = get_pyplot()
         fig, axis = plt.subplots()
         axis.bar(ind, count, width, color="#777acd")
         axis.set_xticks(ind)
@@ -169,6 +460,7 @@ class ReportSummary(object):
         for lab in labels:
             count.append(journals[lab][mode])
         # Make the plot
+        plt = get_pyplot()
         fig, axis = plt.subplots()
         if mode == "ints":
             leglabel = "Interactions"
@@ -207,7 +499,10 @@ class ReportSummary(object):
 
     def write_html(self, outfile):
         '''
-        Writes a markdown with the report to outfile.
+        Writes the html report to outfile. Each section is written to the file as
+        it is made: the rows of the tables (see write_table() and the tables attribute)
+        and the elements of the graph are streamed, and the plots are encoded in
+        base64 in chunks, so the report is never held in memory.
 
         Parameters
         ----------
@@ -215,71 +510,115 @@ class ReportSummary(object):
             Output filename of the html report. Will append ".html" to it.
         '''
         outfile = outfile + ".html"
-        stylesheet     = "https://cdn.rawgit.com/scastlara/ppaxe/master/ppaxe/data/style.css"
-        cytotemplate   = "https://cdn.rawgit.com/scastlara/ppaxe/51b2e788/ppaxe/data/cytoscape_template.js"
-        datatables_css = "https://cdn.datatables.net/1.10.16/css/jquery.dataTables.min.css"
-        datatables_js  = "https://cdn.datatables.net/1.10.16/js/jquery.dataTables.min.js"
+        pairs = self.graphsummary.select_pairs(**self.graph_filters)
         with open(outfile, "w") as outf:
-            html_str = [
-                '<html>',
-                '<head>',
-                '<meta charset="UTF-8">',
-                '<link rel="stylesheet" type="text/css" href="%s">' % stylesheet,
-                '<link rel="stylesheet" type="text/css" href="%s">' % datatables_css,
-                '<link rel="stylesheet" href="https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-beta/css/bootstrap.min.css" integrity="sha384-/Y6pD6FV/Vv2HJnA6t+vslU6fwYXjCFtcEpHbNJ0lyAFsXTsjBbfaDjzALeQsN6M" crossorigin="anonymous">',
-                '</head>',
-                '<body>',
-                    '<div id="content">',
-                        '<h1>PP-axe Report</h1>',
-                        '<h2>Summary</h1>',
-                        self.summary_table(),
-                        '<hr>',
-                        '<h2>Interactions</h2>',
-                        '<div class="reptable">',
-                            self.graphsummary.table_to_html(),
-                        '</div>',
-                        '<hr>',
-                        '<h2>Graph</h2>',
-                        '<div id="cyt"></div>\n',
-                        '<hr>',
-                        '<h2>Proteins</h2>',
-                        '<div class="reptable">',
-                            self.protsummary.table_to_html(),
-                        '</div>',
-                        '<hr>',
-                        '<h2>Plots</h2>',
-                        '<div class="plots">',
-                        '<img id="j_prot_plot" src="data:image/png;base64,%s"/>' % base64.b64encode(self.plots['j_prot_plot'].getvalue()).strip().decode('utf-8'),
-                        '<img id="j_int_plot" src="data:image/png;base64,%s"/>' % base64.b64encode(self.plots['j_int_plot'].getvalue()).strip().decode('utf-8'),
-                        '<img id="a_year_plot" src="data:image/png;base64,%s"/>' % base64.b64encode(self.plots['a_year_plot'].getvalue()).strip().decode('utf-8'),
-                        '</div>',
-                    '</div>',
-                    '<script src="https://code.jquery.com/jquery-2.2.4.min.js"></script>\n',
-                    '<script src="https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.11.0/umd/popper.min.js" integrity="sha384-b/U6ypiBEHpOf/4+1nzFpr53nxSS+GLCkfwBdFNTxtclqqenISfwAzpKaMNFNmj4" crossorigin="anonymous"></script>',
-                    '<script src="https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-beta/js/bootstrap.min.js" integrity="sha384-h0AbiXch4ZDo7tp9hKZ4TsHbi047NrKGLO3SEJAg45jXxnGIfYzk4Si90RDIqNm1" crossorigin="anonymous"></script>',
-                    '<script src="%s"></script>\n' % cytotemplate,
-                    '<script src="%s"></script>\n' % datatables_js,
-                    '''
-                    <script>
-                        graphelements = %s;
-                        cy.load(graphelements);
-                        cy.layout( { name: 'cose' } );
-                    </script>
-                    <script>
-                    $(document).ready(function(){
-                        $('#inttable').DataTable({
-                            "order": [[ 0, "desc" ]]
-                        });
-                        $('#prottable').DataTable({
-                            "order": [[ 1, "desc" ]]
-                        });
-                    });
-                    </script>
-                    ''' % self.graphsummary.graph_to_json(),
+            self.__write_head(outf)
+            write_lines(outf, [
+                '<h2>Interactions</h2>',
+                '<div class="reptable">'
+            ])
+            with instrument.timer("report.tables"):
+                write_table(outf, outfile, "inttable", INTERACTION_COLUMNS, self.graphsummary.iter_rows(), self.tables, GraphSummary.html_cells)
+            write_lines(outf, [
+                '</div>',
+                '<hr>',
+                '<h2>Graph</h2>'
+            ])
+            if len(pairs) < len(self.graphsummary.edges):
+                write_lines(outf, ['<p>Showing the %s strongest of %s unique interactions.</p>' % (len(pairs), len(self.graphsummary.edges))])
+            write_lines(outf, [
+                '<div id="cyt"></div>',
+                '<hr>',
+                '<h2>Proteins</h2>',
+                '<div class="reptable">'
+            ])
+            with instrument.timer("report.tables"):
+                write_table(outf, outfile, "prottable", PROTEIN_COLUMNS, self.protsummary.iter_rows(), self.tables, ProteinSummary.html_cells)
+            write_lines(outf, [
+                '</div>',
+                '<hr>',
+                '<h2>Plots</h2>',
+                '<div class="plots">'
+            ])
+            for plot in ("j_prot_plot", "j_int_plot", "a_year_plot"):
+                outf.write('<img id="%s" src="data:image/png;base64,' % plot)
+                write_base64(outf, self.plots[plot])
+                outf.write('"/>\n')
+            write_lines(outf, [
+                '</div>',
+                '</div>'
+            ])
+            self.__write_scripts(outf, pairs)
+            write_lines(outf, [
                 '</body>',
                 '<html>'
-            ]
-            outf.write("\n".join(html_str))
+            ])
+
+    def __write_head(self, outf):
+        '''
+        Writes the head of the html report and the summary table
+        '''
+        stylesheet = "https://cdn.rawgit.com/scastlara/ppaxe/master/ppaxe/data/style.css"
+        datatables = self.tables != "html"
+        write_lines(outf, [
+            '<html>',
+            '<head>',
+            '<meta charset="UTF-8">',
+            '<link rel="stylesheet" type="text/css" href="%s">' % stylesheet,
+            '<link rel="stylesheet" type="text/css" href="%s">' % DATATABLES_CSS,
+            '<link rel="stylesheet" type="text/css" href="%s">' % SCROLLER_CSS if datatables else '',
+            '<link rel="stylesheet" href="https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-beta/css/bootstrap.min.css" integrity="sha384-/Y6pD6FV/Vv2HJnA6t+vslU6fwYXjCFtcEpHbNJ0lyAFsXTsjBbfaDjzALeQsN6M" crossorigin="anonymous">',
+            TABLE_SCRIPT if datatables else '',
+            '</head>',
+            '<body>',
+            '<div id="content">',
+            '<h1>PP-axe Report</h1>',
+            '<h2>Summary</h1>',
+            self.summary_table(),
+            '<hr>'
+        ])
+
+    def __write_scripts(self, outf, pairs):
+        '''
+        Writes the scripts of the html report: the elements of the graph with the
+        edges in pairs (see GraphSummary.select_pairs()), streamed, and the
+        initialization of the tables
+        '''
+        cytotemplate = "https://cdn.rawgit.com/scastlara/ppaxe/51b2e788/ppaxe/data/cytoscape_template.js"
+        datatables = self.tables != "html"
+        write_lines(outf, [
+            '<script src="https://code.jquery.com/jquery-2.2.4.min.js"></script>',
+            '<script src="https://cdnjs.cloudflare.com/ajax/libs/popper.js/1.11.0/umd/popper.min.js" integrity="sha384-b/U6ypiBEHpOf/4+1nzFpr53nxSS+GLCkfwBdFNTxtclqqenISfwAzpKaMNFNmj4" crossorigin="anonymous"></script>',
+            '<script src="https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0-beta/js/bootstrap.min.js" integrity="sha384-h0AbiXch4ZDo7tp9hKZ4TsHbi047NrKGLO3SEJAg45jXxnGIfYzk4Si90RDIqNm1" crossorigin="anonymous"></script>',
+            '<script src="%s"></script>' % cytotemplate,
+            '<script src="%s"></script>' % DATATABLES_JS,
+            '<script src="%s"></script>' % SCROLLER_JS if datatables else '',
+            '<script>'
+        ])
+        if self.graph_layout == "force":
+            with instrument.timer("report.layout"):
+                positions = pair_positions(sorted(pair_degrees(pairs)), pairs)
+            graphlayout = "{ name: 'preset', fit: true }"
+        else:
+            positions = None
+            graphlayout = "{ name: 'cose' }"
+        # Edges are sorted by evidence
+        maxevidence = self.graphsummary.edges[pairs[0]][0] if pairs else 1
+        outf.write('graphelements = ')
+        write_elements_json(outf, self.graphsummary.iter_nodes(pairs), self.graphsummary.iter_edges(pairs), positions)
+        write_lines(outf, [
+            ';',
+            'cy.load(graphelements);',
+            "cy.style().selector('edge').css({ 'width': 'mapData(evidence, 1, %s, 2, 8)' }).update();" % max(maxevidence, 2),
+            'cy.layout( %s );' % graphlayout,
+            '</script>',
+            '<script>',
+            '$(document).ready(function(){',
+            datatable_script("inttable", 0, self.tables, "[{ targets: [3, 4], render: uniprotLink }, { targets: 5, render: pubmedLink }]"),
+            datatable_script("prottable", 1, self.tables, "[{ targets: 0, render: uniprotLink }]"),
+            '});',
+            '</script>'
+        ])
 
     def create_pdf(self, outfile):
         '''
@@ -302,7 +641,7 @@ class ProteinSummary(object):
     Attributes
     ----------
     articles : list, no default
-        List of Article objects with Article objects in attribute "articles".
+        List of ArticleResult objects not summarized yet (see makesummary()).
 
     prot_table : dict, no default.
         Dictionary of dictionary with information about protein counts in articles.
@@ -312,62 +651,109 @@ class ProteinSummary(object):
                 'int_count'
                     'left'  : Ocurrencies of protein on left hand side of interaction.
                     'right' : Ocurrencies of protein on right hand side of interaction.
+
+    tables : str, no default
+        How the table is written in the html report: "html", "json" or "chunks"
+        (see write_table()).
     '''
-    def __init__(self, articles):
-        self.articles = articles
+    def __init__(self, articles=None):
+        self.articles = article_results(articles or [])
         self.prot_table = dict()
         self.totalprots = 0
+        self.totalarticles  = 0
+        self.totalsentences = 0
+        self.tables = "html"
 
     def makesummary(self):
         '''
-        Makes the summary of the proteins found using the NER
+        Makes the summary of the proteins found using the NER (adds the articles
+        given to the constructor, only once)
         '''
         for article in self.articles:
-            for sentence in article.sentences:
-                for prot in sentence.proteins:
-                    symbol = prot.disambiguate()
-                    if symbol not in self.prot_table:
-                        self.totalprots += 1
-                        self.prot_table[symbol] = dict()
-                        self.prot_table[symbol]['totalcount'] = 0
-                        self.prot_table[symbol]['art_count']  = dict()
-                        self.prot_table[symbol]['int_count']  = dict()
-                        self.prot_table[symbol]['int_count']['left']  = 0
-                        self.prot_table[symbol]['int_count']['right'] = 0
-                    self.prot_table[symbol]['totalcount'] += 1
-                    if article.pmid not in self.prot_table[symbol]['art_count']:
-                        self.prot_table[symbol]['art_count'][article.pmid] = 0
-                    self.prot_table[symbol]['art_count'][article.pmid] += 1
-                for candidate in sentence.candidates:
-                    prot1 = candidate.prot1.disambiguate()
-                    prot2 = candidate.prot2.disambiguate()
-                    if candidate.label is True:
-                        self.prot_table[prot1]['int_count']['left'] += 1
-                        self.prot_table[prot2]['int_count']['right'] += 1
+            self.add(article)
+        self.articles = list()
 
-    def table_to_html(self, sorted_by="totalcount", reverse=True):
+    def add(self, article):
         '''
-        Returns an html string with the desired protein/gene count table.
+        Adds the proteins and interactions of article (ArticleResult) to the summary.
+        Allows to make the summary as the articles are analyzed, without keeping them.
+        '''
+        self.totalarticles  += 1
+        self.totalsentences += article.sentences
+        for symbol in article.proteins:
+            if symbol not in self.prot_table:
+                self.totalprots += 1
+                self.prot_table[symbol] = dict()
+                self.prot_table[symbol]['totalcount'] = 0
+                self.prot_table[symbol]['art_count']  = dict()
+                self.prot_table[symbol]['int_count']  = dict()
+                self.prot_table[symbol]['int_count']['left']  = 0
+                self.prot_table[symbol]['int_count']['right'] = 0
+            self.prot_table[symbol]['totalcount'] += 1
+            if article.pmid not in self.prot_table[symbol]['art_count']:
+                self.prot_table[symbol]['art_count'][article.pmid] = 0
+            self.prot_table[symbol]['art_count'][article.pmid] += 1
+        for interaction in article.interactions:
+            self.prot_table[interaction.symbol1]['int_count']['left'] += 1
+            self.prot_table[interaction.symbol2]['int_count']['right'] += 1
+
+    @instrument.timed("report.html")
+    def write_html(self, outfile):
+        '''
+        Writes an html report with only the protein table (for symbol analyses) to outfile.
 
         Parameters
         ----------
-        sorted_by : str, optional, default = "totalcount"
-            Sort table by total number of ocurrences of protein in sentences (sorted_by="totalcount"),
-            by total number of ocurrences in interactions (sorted_by="int_count"), by ocurrences in
-            left hand side of interaction (sorted_by="left") or righ hand side (sorted_by="right").
-
-        reverse : bool, optional, default = True
-            Sort proteins in reverse order (from bigger to smaller) according to the sorted_by rule if True.
-            Reverse (smaller to bigger) if False.
+        outfile : str, required, no default
+            Output filename of the html report. Will append ".html" to it.
         '''
-        # HEADER
-        colnames = ["Protein","Total count","Int. count", "Left count", "Right count"]
-        table_str = ['<table id="prottable">']
-        table_str.append("<thead>")
-        table_str.append(make_html_row(colnames, header=True))
-        table_str.append("</thead>")
+        outfile = outfile + ".html"
+        stylesheet = "https://cdn.rawgit.com/scastlara/ppaxe/master/ppaxe/data/style.css"
+        datatables = self.tables != "html"
+        with open(outfile, "w") as outf:
+            write_lines(outf, [
+                '<html>',
+                '<head>',
+                '<meta charset="UTF-8">',
+                '<link rel="stylesheet" type="text/css" href="%s">' % stylesheet,
+                '<link rel="stylesheet" type="text/css" href="%s">' % DATATABLES_CSS,
+                '<link rel="stylesheet" type="text/css" href="%s">' % SCROLLER_CSS if datatables else '',
+                TABLE_SCRIPT if datatables else '',
+                '</head>',
+                '<body>',
+                '<div id="content">',
+                '<h1>PP-axe Symbol Report</h1>',
+                '<h2>Summary</h2>',
+                '<table class="summarytable">',
+                make_html_row(["Articles Analyzed", self.totalarticles]),
+                make_html_row(["Total Sentences", self.totalsentences]),
+                make_html_row(["Proteins found", self.totalprots]),
+                '</table>',
+                '<hr>',
+                '<h2>Proteins</h2>',
+                '<div class="reptable">'
+            ])
+            write_table(outf, outfile, "prottable", PROTEIN_COLUMNS, self.iter_rows(), self.tables, self.html_cells)
+            write_lines(outf, [
+                '</div>',
+                '</div>',
+                '<script src="https://code.jquery.com/jquery-2.2.4.min.js"></script>',
+                '<script src="%s"></script>' % DATATABLES_JS,
+                '<script src="%s"></script>' % SCROLLER_JS if datatables else '',
+                '<script>',
+                '$(document).ready(function(){',
+                datatable_script("prottable", 1, self.tables, "[{ targets: 0, render: uniprotLink }]"),
+                '});',
+                '</script>',
+                '</body>',
+                '<html>'
+            ])
 
-        # Sorted by
+    def iter_rows(self, sorted_by="totalcount", reverse=True):
+        '''
+        Yields the rows of the protein table: symbol, total count, interaction
+        count, left count and right count (see table_to_html() for the sorting)
+        '''
         if sorted_by == "totalcount":
             sort_lambda = lambda x: (x[1]['totalcount'], x[1]['int_count']['right'] + x[1]['int_count']['left'])
         elif sorted_by == "int_count":
@@ -378,20 +764,39 @@ class ProteinSummary(object):
             sort_lambda = lambda x: x[1]['int_count']['right']
         else:
             raise KeyError("Can't sort by %s. Only 'totalcount', 'int_count', 'left' or 'right'.")
+        for symbol, counts in sorted(self.prot_table.items(), reverse=reverse, key=sort_lambda):
+            yield [
+                symbol,
+                counts['totalcount'],
+                counts['int_count']['right'] + counts['int_count']['left'],
+                counts['int_count']['left'],
+                counts['int_count']['right']
+            ]
 
-        table_str.append("<tbody>")
-        for protein in sorted(self.prot_table.items(), reverse=reverse, key=sort_lambda):
-            table_str.append(make_html_row([
-                '<a href="http://www.uniprot.org/uniprot/?query=%s&sort=score" target="_blank">%s</a>' % (protein[0], protein[0]),
-                protein[1]['totalcount'],
-                str(protein[1]['int_count']['right'] + protein[1]['int_count']['left']) ,
-                protein[1]['int_count']['left'],
-                protein[1]['int_count']['right']
-            ]))
-        table_str.append("</tbody>")
-        table_str.append("</table>")
-        html = "\n".join(table_str)
-        return html
+    @staticmethod
+    def html_cells(row):
+        '''
+        Returns the html cells of a row of the protein table
+        '''
+        return [ uniprot_link(row[0]), row[1], str(row[2]), row[3], row[4] ]
+
+    def table_to_html(self, sorted_by="totalcount", reverse=True):
+        '''
+        Returns an html string with the desired protein/gene count table.
+
+        Parameters
+        ----------
+        sorted_by : str, optional, default = "totalcount"
+            Sort table by total number of ocurrences of protein in sentences (sorted_by="totalcount"),
+            by total number of ocurrences in interactions (sorted_by="int_count"), by ocurrences in
+            left hand side of interaction (sorted_by="left") or righ hand side (sorted_by="right").
+
+        reverse : bool, optional, default = True
+            Sort proteins in reverse order (from bigger to smaller) according to the sorted_by rule if True.
+            Reverse (smaller to bigger) if False.
+        '''
+        rows = [ self.html_cells(row) for row in self.iter_rows(sorted_by, reverse) ]
+        return "\n".join(html_table_lines("prottable", PROTEIN_COLUMNS, rows))
 
 class GraphSummary(object):
     '''
@@ -400,10 +805,10 @@ class GraphSummary(object):
     Attributes
     ----------
     articles : list, no default
-        List of Article objects with Article objects in attribute "articles".
+        List of ArticleResult objects not summarized yet (see makesummary()).
 
     interactions : list, no default
-        List of lists with interactions in articles.
+        List of lists with interactions in articles (sorted by votes after makesummary()).
         elements:
             [
                 [
@@ -427,94 +832,186 @@ class GraphSummary(object):
 
     uniqinteractions_count : int, no default
         Number of unique interactions in articles.
+
+    edges : dict, no default
+        Interactions merged by unordered pair of official symbols:
+            (symbol A, symbol B) : [evidence (number of interactions), max votes, sum of votes]
+
+    nodes : dict, no default
+        Number of interactions of each official symbol.
     '''
-    def __init__(self, articles):
+    def __init__(self, articles=None):
         '''
         Parameters
         ----------
-        articles : list, required, no default
-            List of Article objects.
+        articles : list, optional, default = None
+            List of Article objects or ArticleResult objects.
         '''
-        self.articles = articles
+        self.articles = article_results(articles or [])
         self.interactions = list()
         self.numinteractions = 0
         self.uniqinteractions = set()
         self.uniqinteractions_count = 0
+        self.edges = dict()
+        self.nodes = dict()
 
     def makesummary(self):
         '''
-        Makes the summary of the interactions retrieved.
+        Makes the summary of the interactions retrieved: adds the articles given
+        to the constructor (only once) and sorts the interactions by votes.
         '''
         for article in self.articles:
-            for sentence in article.sentences:
-                for candidate in sentence.candidates:
-                    if candidate.label is True:
-                        self.numinteractions += 1
-                        self.uniqinteractions.add(
-                            tuple(sorted([candidate.prot1.disambiguate(), candidate.prot2.disambiguate()]))
-                        )
-                        self.interactions.append(
-                            [
-                                candidate.votes,
-                                candidate.prot1.symbol,
-                                candidate.prot1.disambiguate(),
-                                candidate.prot2.symbol,
-                                candidate.prot2.disambiguate(),
-                                candidate.to_html(),
-                                article.pmid,
-                                article.year
-                            ]
-                        )
+            self.add(article)
+        self.articles = list()
+        self.interactions.sort(key=lambda x: x[0], reverse=True)
+
+    def add(self, article):
+        '''
+        Adds the interactions of article (ArticleResult) to the summary.
+        '''
+        for interaction in article.interactions:
+            self.numinteractions += 1
+            pair = tuple(sorted([interaction.symbol1, interaction.symbol2]))
+            self.uniqinteractions.add(pair)
+            if pair not in self.edges:
+                self.edges[pair] = [0, interaction.votes, 0.0]
+            edge = self.edges[pair]
+            edge[0] += 1
+            edge[1] = max(edge[1], interaction.votes)
+            edge[2] += interaction.votes
+            for symbol in set(pair):
+                self.nodes[symbol] = self.nodes.get(symbol, 0) + 1
+            self.interactions.append(
+                [
+                    interaction.votes,
+                    interaction.prot1,
+                    interaction.symbol1,
+                    interaction.prot2,
+                    interaction.symbol2,
+                    interaction.candidate_html,
+                    article.pmid,
+                    article.year
+                ]
+            )
         self.uniqinteractions_count = len(self.uniqinteractions)
-        self.interactions     = sorted(self.interactions, key=lambda x: x[0], reverse=True)
 
-    def table_to_html(self):
+    def iter_rows(self):
         '''
-        Returns a string in html with the interactions sorted by votes/confidence
+        Yields the rows of the interaction table (sorted by votes after makesummary()):
+        confidence, proteins A and B, official symbols A and B, PMid, year and sentence (html)
         '''
-        colnames = [
-            "Confidence", "Protein (A)","Protein (B)",
-            "Off.symbol (A)", "Off.symbol (B)",
-            "PMid", "Year", "Sentence"
-        ]
-        table_str = ['<table id="inttable">']
-        table_str.append("<thead>")
-        table_str.append(make_html_row(colnames, header=True))
-        table_str.append("</thead>")
-
-        table_str.append("<tbody>")
         for interaction in self.interactions:
-            table_str.append(make_html_row([
+            yield [
                 interaction[0],
                 interaction[1],
                 interaction[3],
-                '<a href="http://www.uniprot.org/uniprot/?query=%s&sort=score" target="_blank">%s</a>' % (interaction[2], interaction[2]),
-                '<a href="http://www.uniprot.org/uniprot/?query=%s&sort=score" target="_blank">%s</a>' % (interaction[4], interaction[4]),
-                '<a href="https://www.ncbi.nlm.nih.gov/pubmed/?term=%s" target="_blank">%s</a>' % (interaction[6], interaction[6]),
+                interaction[2],
+                interaction[4],
+                interaction[6],
                 interaction[7],
                 interaction[5]
-            ]))
-        table_str.append("</tbody>")
-        table_str.append("</table>")
-        return "\n".join(table_str)
+            ]
 
-    def graph_to_json(self):
+    @staticmethod
+    def html_cells(row):
         '''
-        Returns a json string with the graph prepared for cytoscape
+        Returns the html cells of a row of the interaction table
         '''
-        json_nodes = list(["nodes: ["])
-        json_ints  = list(["edges: ["])
-        total_json = list()
-        for interaction in self.interactions:
-            json_nodes.append("{ data: { id: '%s', name: '%s', colorNODE: '#4b849d' } }," % (interaction[2], interaction[2]))
-            json_nodes.append("{ data: { id: '%s', name: '%s', colorNODE: '#4b849d' } }," % (interaction[4], interaction[4]))
-            json_ints.append("{ data: { id: '%s-%s', source: '%s', target: '%s', confidence:'%s', colorEDGE: '#cdbb44' }}," % ( interaction[2], interaction[4], interaction[2], interaction[4], interaction[0]))
-        json_nodes.append("], ")
-        json_ints.append("]\n")
-        total_json = "{\n" + "\n".join(json_nodes) + "\n".join(json_ints) + "\n}"
+        return row[:3] + [ uniprot_link(row[3]), uniprot_link(row[4]), pubmed_link(row[5]) ] + row[6:]
 
-        return total_json
+    def table_to_html(self):
+        '''
+        Returns a string in html with the interactions sorted by votes/confidence
+        '''
+        rows = [ self.html_cells(row) for row in self.iter_rows() ]
+        return "\n".join(html_table_lines("inttable", INTERACTION_COLUMNS, rows))
+
+    def select_pairs(self, min_confidence=0, top_k=None, min_degree=0, max_edges=None):
+        '''
+        Returns the pairs of symbols (edges) of the graph of the interactions that
+        pass the filters, strongest first.
+
+        Parameters
+        ----------
+        min_confidence : float, optional, default = 0
+            Remove edges with a maximum confidence below min_confidence.
+
+        top_k : int, optional, default = None
+            Keep only the top_k strongest edges of each node (an edge is kept if it
+            is among the strongest of any of its nodes).
+
+        min_degree : int, optional, default = 0
+            Remove the nodes with fewer than min_degree edges left (and their edges).
+
+        max_edges : int, optional, default = None
+            Keep at most max_edges edges, the strongest ones.
+
+        Edges are ranked by evidence, then maximum confidence, then mean confidence.
+        Filters are applied in the order of the parameters.
+        '''
+        rank = lambda pair: (-self.edges[pair][0], -self.edges[pair][1], -self.edges[pair][2] / self.edges[pair][0], pair)
+        pairs = [ pair for pair, edge in self.edges.items() if edge[1] >= min_confidence ]
+        if top_k is not None:
+            by_node = dict()
+            for pair in pairs:
+                for symbol in set(pair):
+                    by_node.setdefault(symbol, list()).append(pair)
+            kept = set()
+            for node_pairs in by_node.values():
+                kept.update(sorted(node_pairs, key=rank)[:top_k])
+            pairs = list(kept)
+        if min_degree:
+            degree = pair_degrees(pairs)
+            pairs = [ pair for pair in pairs if all(degree[symbol] >= min_degree for symbol in pair) ]
+        if max_edges is not None:
+            # Only the kept edges are ranked at once
+            return heapq.nsmallest(max_edges, pairs, key=rank)
+        pairs.sort(key=rank)
+        return pairs
+
+    def iter_nodes(self, pairs):
+        '''
+        Yields the data of the cytoscape nodes of the graph with the edges in pairs
+        (see select_pairs()), sorted by symbol
+        '''
+        degree = pair_degrees(pairs)
+        for symbol in sorted(degree):
+            yield {'id': symbol, 'name': symbol, 'evidence': self.nodes[symbol], 'degree': degree[symbol], 'colorNODE': '#4b849d'}
+
+    def iter_edges(self, pairs):
+        '''
+        Yields the data of the cytoscape edges of pairs (see select_pairs())
+        '''
+        for pair in pairs:
+            evidence, maxvotes, totalvotes = self.edges[pair]
+            yield {
+                'id': "%s-%s" % pair,
+                'source': pair[0],
+                'target': pair[1],
+                'confidence': round(maxvotes, 3),
+                'mean_confidence': round(totalvotes / evidence, 3),
+                'evidence': evidence,
+                'colorEDGE': '#cdbb44'
+            }
+
+    def graph(self, **filters):
+        '''
+        Returns the graph of the interactions, with a node per official symbol and
+        an edge per unordered pair of symbols, as (nodes, edges): lists of dicts with
+        the data of the cytoscape elements. Edges are weighted by the number of
+        interactions (evidence) and the maximum and mean confidence. See
+        select_pairs() for the filters.
+        '''
+        pairs = self.select_pairs(**filters)
+        return list(self.iter_nodes(pairs)), list(self.iter_edges(pairs))
 
+    def graph_to_json(self, **filters):
+        '''
+        Returns a json string with the graph prepared for cytoscape (see select_pairs()
+        for the filters)
+        '''
+        pairs = self.select_pairs(**filters)
+        return elements_to_json(self.iter_nodes(pairs), self.iter_edges(pairs))
 
 class IncorrectPlotName(Exception):
     '''
@@ -0,0 +1,293 @@
+'''
+Compact storage of StanfordCoreNLP tokens.
+
+Instead of keeping the list of dictionaries returned by StanfordCoreNLP for every
+sentence, tokens are stored column-wise in arrays: words and lemmas are interned in
+shared vocabularies and saved as integer ids, and POS/NER tags as small integer codes.
+The original text and the whitespace around the tokens are kept as plain strings, out
+of the vocabularies. Token objects give a read-only dictionary-like view of each token.
+
+Vocabularies are replaced by new ones when they reach MAX_STRINGS strings (or MAX_TAGS
+tags): each TokenStore keeps the vocabularies it was created with, so a full
+vocabulary is freed with the last TokenStore that uses it.
+'''
+
+from array import array
+import threading
+
+
+# CLASSES
+# ----------------------------------------------
+class Vocabulary(object):
+    '''
+    Two-way mapping between strings and integer ids. Shared by the
+    TokenStore objects created while it is the current one (see vocabularies()).
+
+    Attributes
+    ----------
+    ids : dict, no default
+        Dictionary with strings as keys and ids as values.
+
+    strings : list, no default
+        List of strings, indexed by id.
+    '''
+    __slots__ = ('ids', 'strings', 'lock')
+
+    def __init__(self):
+        self.ids     = dict()
+        self.strings = list()
+        self.lock    = threading.Lock()
+
+    def get_id(self, string):
+        '''
+        Returns the id of string, adding it to the vocabulary if needed.
+        '''
+        idx = self.ids.get(string)
+        if idx is None:
+            with self.lock:
+                idx = self.ids.get(string)
+                if idx is None:
+                    idx = len(self.strings)
+                    self.strings.append(string)
+                    self.ids[string] = idx
+        return idx
+
+    def __getitem__(self, idx):
+        return self.strings[idx]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def new_tags():
+    '''
+    Returns an empty Vocabulary of tags
+    '''
+    tags = Vocabulary()
+    tags.get_id(None) # Code 0 is reserved for missing tags
+    return tags
+
+# Current vocabularies of words and lemmas (STRINGS) and tags (POS, NER)
+STRINGS = Vocabulary()
+TAGS    = new_tags()
+VOCABULARY_LOCK = threading.Lock()
+# Size of the vocabularies that makes new TokenStores start new ones.
+# Tag codes are stored as unsigned shorts.
+MAX_STRINGS = 2**19
+MAX_TAGS    = 2**16 - 1
+
+# Token keys stored as string ids, as tag codes, as integers and as plain strings.
+# Missing values are stored as -1 (0 for tags, that start at 1, and None for plain strings).
+STRING_KEYS  = ('word', 'lemma')
+TAG_KEYS     = ('pos', 'ner')
+INTEGER_KEYS = ('characterOffsetBegin', 'characterOffsetEnd')
+RAW_KEYS     = ('originalText', 'before', 'after')
+KEY_ORDER    = ('index', 'word', 'originalText', 'lemma', 'characterOffsetBegin',
+                'characterOffsetEnd', 'pos', 'ner', 'before', 'after')
+(STRING_KEY, TAG_KEY, INTEGER_KEY, RAW_KEY) = range(4)
+KEY_KINDS = dict(
+    [(key, STRING_KEY) for key in STRING_KEYS] +
+    [(key, TAG_KEY) for key in TAG_KEYS] +
+    [(key, INTEGER_KEY) for key in INTEGER_KEYS] +
+    [(key, RAW_KEY) for key in RAW_KEYS]
+)
+
+class TokenStore(object):
+    '''
+    Column-wise storage of the tokens of a sentence. Behaves like a read-only
+    list of Token objects.
+
+    Attributes
+    ----------
+    columns : dict, no default
+        Dictionary of arrays with the token values, with the token keys as keys.
+
+    extras : dict, no default
+        Values of other token keys, by token position. None if there are no other keys.
+
+    strings : Vocabulary, no default
+        Vocabulary of the string ids.
+
+    tags : Vocabulary, no default
+        Vocabulary of the tag codes.
+    '''
+    __slots__ = ('columns', 'extras', 'strings', 'tags')
+
+    def __init__(self, tokens=None):
+        '''
+        Parameters
+        ----------
+        tokens : list, optional, default = None
+            List of token dictionaries as returned by StanfordCoreNLP.
+        '''
+        self.columns = dict()
+        self.extras  = None
+        self.strings, self.tags = vocabularies()
+        if not tokens:
+            tokens = list()
+        for key in STRING_KEYS:
+            self.columns[key] = array('i', [self.strings.get_id(token[key]) if key in token else -1 for token in tokens])
+        for key in TAG_KEYS:
+            self.columns[key] = array('H', [self.tags.get_id(token.get(key)) for token in tokens])
+        for key in INTEGER_KEYS:
+            self.columns[key] = array('i', [token.get(key, -1) for token in tokens])
+        for key in RAW_KEYS:
+            self.columns[key] = tuple(token.get(key) for token in tokens)
+        # The original text is usually the word: share the string of the vocabulary
+        words = [ self.get(position, 'word') for position in range(len(tokens)) ]
+        self.columns['originalText'] = tuple(
+            word if original == word else original for word, original in zip(words, self.columns['originalText'])
+        )
+        for position, token in enumerate(tokens):
+            if any(key not in KEY_ORDER for key in token):
+                if self.extras is None:
+                    self.extras = dict()
+                self.extras[position] = dict((key, value) for key, value in token.items() if key not in KEY_ORDER)
+
+    def get(self, position, key, default=None):
+        '''
+        Returns the value of key for the token in position (0-Indexed).
+        '''
+        kind = KEY_KINDS.get(key)
+        if kind == STRING_KEY:
+            value = self.columns[key][position]
+            return self.strings.strings[value] if value != -1 else default
+        if kind == TAG_KEY:
+            value = self.columns[key][position]
+            return self.tags.strings[value] if value else default
+        if kind == INTEGER_KEY:
+            value = self.columns[key][position]
+            return value if value != -1 else default
+        if kind == RAW_KEY:
+            value = self.columns[key][position]
+            return value if value is not None else default
+        if key == 'index':
+            return position + 1
+        if self.extras is not None and position in self.extras:
+            return self.extras[position].get(key, default)
+        return default
+
+    def keys(self, position):
+        '''
+        Returns the keys of the token in position (0-Indexed).
+        '''
+        keys = [ key for key in KEY_ORDER if key == 'index' or self.get(position, key) is not None ]
+        if self.extras is not None and position in self.extras:
+            keys.extend(self.extras[position].keys())
+        return keys
+
+    def to_list(self):
+        '''
+        Returns the tokens as a list of dictionaries, as returned by StanfordCoreNLP.
+        '''
+        return [ token.to_dict() for token in self ]
+
+    def __len__(self):
+        return len(self.columns['word'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ Token(self, position) for position in range(len(self))[index] ]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("token index out of range")
+        return Token(self, index)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield Token(self, position)
+
+    def __eq__(self, other):
+        if isinstance(other, TokenStore):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __reduce__(self):
+        # Ids are only valid inside this process
+        return (TokenStore, (self.to_list(),))
+
+    def __repr__(self):
+        return "TokenStore(%s)" % self.to_list()
+
+
+class Token(object):
+    '''
+    Read-only dictionary-like view of a token in a TokenStore.
+
+    Attributes
+    ----------
+    store : TokenStore, no default
+        TokenStore with the token.
+
+    position : int, no default
+        Position of the token in the TokenStore (0-Indexed).
+    '''
+    __slots__ = ('store', 'position')
+
+    def __init__(self, store, position):
+        self.store    = store
+        self.position = position
+
+    def __getitem__(self, key):
+        value = self.store.get(self.position, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return self.store.get(self.position, key, default)
+
+    def keys(self):
+        return self.store.keys(self.position)
+
+    def values(self):
+        return [ self[key] for key in self.keys() ]
+
+    def items(self):
+        return [ (key, self[key]) for key in self.keys() ]
+
+    def to_dict(self):
+        '''
+        Returns the token as a plain dictionary
+        '''
+        return dict(self.items())
+
+    def __contains__(self, key):
+        return self.store.get(self.position, key) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, Token):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def vocabularies():
+    '''
+    Returns the current vocabularies of strings and tags, replacing them with
+    empty ones if they are full.
+    '''
+    global STRINGS, TAGS
+    if len(STRINGS) >= MAX_STRINGS or len(TAGS) >= MAX_TAGS:
+        with VOCABULARY_LOCK:
+            if len(STRINGS) >= MAX_STRINGS or len(TAGS) >= MAX_TAGS:
+                STRINGS = Vocabulary()
+                TAGS    = new_tags()
+    return STRINGS, TAGS
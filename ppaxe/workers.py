@@ -0,0 +1,158 @@
+'''
+Process pool to analyze articles in parallel.
+
+Feature extraction and prediction are CPU-bound, so a single ppaxe process only
+uses one core. ArticlePool spreads the articles over a pool of processes: each
+worker loads the classifier and the gene dictionary once, analyzes whole articles
+and sends back their compact core.ArticleResult (not the Article with all its
+sentences, tokens and candidates). Results are returned in the order of the articles.
+'''
+
+from ppaxe import core
+from ppaxe import instrument
+from collections import deque
+import multiprocessing
+import multiprocessing.util
+
+
+# Settings of the worker process (set by init_worker)
+SETTINGS = dict()
+
+
+# FUNCTIONS
+# ----------------------------------------------
+def init_worker(settings):
+    '''
+    Initializes a worker process: connects to StanfordCoreNLP and loads the
+    classifier and the gene dictionary.
+
+    Parameters
+    ----------
+    settings : dict, required, no default
+        Dictionary with keys:
+            "nlp_url"   : Address of the StanfordCoreNLP server.
+            "source"    : Analyze the "fulltext" or the "abstract" of the articles.
+            "max_chars" : Maximum number of characters per annotation request.
+            "threads"   : Maximum number of concurrent annotation requests.
+            "cache"     : SQLite file of the annotation cache (None to disable).
+            "cache_max_size" : Maximum size (in bytes) of the annotation cache.
+            "mode"      : "ppi" to predict interactions or "symbols" to find only the proteins.
+            "profile"   : Record the time of each stage (see ppaxe.instrument).
+    '''
+    SETTINGS.update(settings)
+    if settings.get('profile'):
+        instrument.enable()
+    # Forked workers must not share the connections of the parent process
+    core.NLP = None
+    core.NLP_URL = settings['nlp_url']
+    core.ANNOTATION_CACHE = None
+    if settings.get('cache'):
+        from ppaxe import cache
+        core.ANNOTATION_CACHE = cache.AnnotationCache(settings['cache'], max_size=settings['cache_max_size'])
+        # Writes the access times of the last hits when the worker exits
+        multiprocessing.util.Finalize(core.ANNOTATION_CACHE, core.ANNOTATION_CACHE.close, exitpriority=10)
+    if settings.get('mode') == "symbols":
+        # The classifier is not needed to find the proteins
+        core.get_gene_dictionary()
+        core.get_nlp()
+    else:
+        core.warmup()
+
+def analyze_article(article):
+    '''
+    Extracts the sentences of article, annotates them and predicts the interactions
+    (or only finds the proteins in "symbols" mode). Returns the core.ArticleResult of the
+    article and what was recorded by ppaxe.instrument while analyzing it (None if disabled).
+    '''
+    with instrument.timer("analyze_article"):
+        result = analyze(article)
+    return result, instrument.take()
+
+def analyze(article):
+    '''
+    Analyzes article and returns its core.ArticleResult (see analyze_article)
+    '''
+    article.extract_sentences(source=SETTINGS.get('source', "fulltext"))
+    sentences = article.annotate_sentences(
+        max_chars=SETTINGS.get('max_chars', core.BATCH_MAX_CHARS),
+        threads=SETTINGS.get('threads', 1)
+    )
+    if SETTINGS.get('mode') == "symbols":
+        for sentence in sentences:
+            sentence.get_proteins()
+        return article.summarize()
+    for sentence in sentences:
+        sentence.get_candidates()
+        sentence.compute_features()
+    core.predict_candidates([ candidate for sentence in sentences for candidate in sentence.candidates ])
+    return article.summarize()
+
+
+# CLASSES
+# ----------------------------------------------
+class ArticlePool(object):
+    '''
+    Pool of worker processes that analyze articles.
+
+    Attributes
+    ----------
+    workers : int, no default
+        Number of worker processes.
+
+    inflight : int, no default
+        Maximum number of articles sent to the workers and not yet returned.
+    '''
+    def __init__(self, workers, settings, inflight=None):
+        '''
+        Parameters
+        ----------
+        workers : int, required, no default
+            Number of worker processes.
+
+        settings : dict, required, no default
+            Settings of the workers (see init_worker).
+
+        inflight : int, optional, default = None
+            Maximum number of articles sent to the workers and not yet returned.
+            By default, twice the number of workers.
+        '''
+        self.workers  = workers
+        self.inflight = inflight or 2 * workers
+        self.pool     = multiprocessing.Pool(workers, initializer=init_worker, initargs=(settings,))
+
+    def imap(self, articles):
+        '''
+        Analyzes the articles (iterable of Article objects) and yields their
+        ArticleResult in the same order. Articles are read from the iterable only
+        when there is room for them in the pool.
+        The timings recorded in the workers are merged into ppaxe.instrument.
+        '''
+        pending = deque()
+        for article in articles:
+            pending.append(self.pool.apply_async(analyze_article, (article,)))
+            if len(pending) >= self.inflight:
+                yield self.__collect(pending.popleft())
+        while pending:
+            yield self.__collect(pending.popleft())
+
+    def __collect(self, async_result):
+        '''
+        Waits for the result of an article and merges its timings
+        '''
+        result, profile = async_result.get()
+        instrument.merge(profile)
+        return result
+
+    def close(self):
+        '''
+        Stops the worker processes
+        '''
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        '''
+        Kills the worker processes
+        '''
+        self.pool.terminate()
+        self.pool.join()
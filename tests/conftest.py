@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+'''
+Stand-ins for the installed resources of ppaxe (gene dictionary and Random
+Forest), shared by the tests and the benchmarks
+'''
+from ppaxe import core
+import numpy
+import os
+
+
+class ConstantPredictor(object):
+    '''
+    Stand-in for the Random Forest: every candidate gets the same votes
+    '''
+    def __init__(self, votes=0.9):
+        self.votes = votes
+
+    def predict_proba(self, features):
+        return numpy.array([[1 - self.votes, self.votes]] * features.shape[0])
+
+
+def use_resources(tmpdir, dictionary=None, predictor=None):
+    '''
+    Makes core use the gene dictionary and the predictor given instead of the
+    installed ones. Returns the previous settings (see restore_resources()).
+
+    Parameters
+    ----------
+    tmpdir : str, required, no default
+        Directory where the dictionary and its index are written.
+
+    dictionary : str, optional, default = None
+        Text of the gene dictionary (official symbol and synonyms separated by
+        tabs, one gene per line). If None, the dictionary is not replaced.
+
+    predictor : object, optional, default = None
+        Object with a predict_proba() method, like ConstantPredictor. If None,
+        the predictor is not replaced.
+    '''
+    saved = (core.Protein.GENEDICT, core.Protein.GENEDICTFILE, core.Protein.GENEINDEXFILE, core.InteractionCandidate.predictor)
+    if dictionary is not None:
+        source = os.path.join(tmpdir, "genes.txt")
+        with open(source, "w") as fh:
+            fh.write(dictionary)
+        core.Protein.GENEDICT = None
+        core.Protein.GENEDICTFILE = source
+        core.Protein.GENEINDEXFILE = os.path.join(tmpdir, "genes.idx")
+        core.Protein.SYMBOL_CACHE.clear()
+    if predictor is not None:
+        core.InteractionCandidate.predictor = predictor
+    return saved
+
+def restore_resources(saved):
+    '''
+    Restores the settings returned by use_resources()
+    '''
+    genedict = core.Protein.GENEDICT
+    # The plain dict used when the index can't be compiled has nothing to close
+    if genedict is not None and genedict is not saved[0] and hasattr(genedict, 'close'):
+        genedict.close()
+    core.Protein.GENEDICT, core.Protein.GENEDICTFILE, core.Protein.GENEINDEXFILE, core.InteractionCandidate.predictor = saved
+    core.Protein.SYMBOL_CACHE.clear()
@@ -3,6 +3,7 @@
 Tests for the main classes of ppaxe
 '''
 from ppaxe import core
+from ppaxe import nlpserver
 from pycorenlp import StanfordCoreNLP
 import json
 
@@ -317,3 +318,135 @@ def test_multiple_get_candidates():
     sentence.get_candidates()
     fcandidates = len(sentence.candidates)
     assert(ocandidates == fcandidates)
+
+def test_annotate_sentences():
+    '''
+    Tests if batched annotation gives the same tokens as annotating sentence by sentence
+    '''
+    article_text = """
+        MAPK seems to interact with chloroacetate esterase.
+        However, MAPK is a better target for peroxydase.
+        The thing is, Schmidtea mediterranea is a good model organism because reasons.
+        However, cryoglobulin is better.
+    """
+    article = core.Article(pmid="1234", fulltext=article_text)
+    article.extract_sentences()
+    for sentence in article.sentences:
+        sentence.annotate()
+    single_tokens = [ sentence.tokens for sentence in article.sentences ]
+    batch_article = core.Article(pmid="1234", fulltext=article_text)
+    batch_article.extract_sentences()
+    annotated = batch_article.annotate_sentences(max_chars=100)
+    assert(len(annotated) == len(batch_article.sentences))
+    assert([ sentence.tokens for sentence in batch_article.sentences ] == single_tokens)
+
+def test_make_batches():
+    '''
+    Tests if sentences are grouped according to the character budget
+    '''
+    sentences = [ core.Sentence(originaltext="A" * 40) for i in range(5) ]
+    batches = list(core.make_batches(sentences, max_chars=100))
+    assert([ len(batch) for batch in batches ] == [2, 2, 1])
+
+def test_concurrent_annotation():
+    '''
+    Tests if concurrent annotation keeps the sentence order, skips failing sentences and
+    keeps several requests in flight against a slow server
+    '''
+    # With this seed, 2 of the 8 annotations fail
+    server = nlpserver.start(latency=0.2, error_rate=0.25, seed=1)
+    nlp = core.NLP
+    core.NLP = StanfordCoreNLP(server.url)
+    try:
+        texts = [ "sentence number %s" % i for i in range(8) ]
+        sentences = [ core.Sentence(originaltext=text) for text in texts ]
+        annotated = core.annotate_sentences(sentences, max_chars=0, threads=8)
+        stats = server.get_stats()
+    finally:
+        core.NLP = nlp
+        server.shutdown()
+        server.server_close()
+    annotated_texts = [ sentence.originaltext for sentence in annotated ]
+    assert(stats['errors'] == 2 and len(annotated) == len(texts) - stats['errors'])
+    assert(annotated_texts == [ text for text in texts if text in annotated_texts ])
+    assert([ sentence.tokens[-1]['word'] for sentence in annotated ] == [ text.split()[-1] for text in annotated_texts ])
+    assert(stats['max_running'] > 1)
+
+def test_thread_pools():
+    '''
+    Tests if asking for a different number of threads replaces the pool instead of
+    keeping both, and if the pools can be closed
+    '''
+    import threading
+    core.close_thread_pools()
+    before = threading.active_count()
+    core.get_thread_pool(2)
+    pool = core.get_thread_pool(3)
+    assert(list(core.THREAD_POOLS) == [3] and core.get_thread_pool(3) is pool)
+    core.close_thread_pools()
+    assert(not core.THREAD_POOLS and threading.active_count() == before)
+
+def test_sentence_features():
+    '''
+    Tests if the features computed for the whole sentence are the same as the
+    features computed for each candidate
+    '''
+    words = ["MAPK13", "seems", "to", "be", "directly", "correlated", "with", "MAPK12", ",", "which",
+             "would", "mean", "that", "MAPK13", "binds", "the", "chloroacetate", "esterase", "."]
+    pos   = ["NN", "VBZ", "TO", "VB", "RB", "VBN", "IN", "NN", ",", "WDT",
+             "MD", "VB", "IN", "NN", "VBZ", "DT", "NN", "NN", "."]
+    lemmas = ["MAPK13", "seem", "to", "be", "directly", "correlate", "with", "MAPK12", ",", "which",
+              "would", "mean", "that", "MAPK13", "bind", "the", "chloroacetate", "esterase", "."]
+    prots = set([0, 7, 13, 16, 17])
+    tokens = [ {'index': i + 1, 'word': words[i], 'lemma': lemmas[i], 'pos': pos[i], 'ner': "P" if i in prots else "O"}
+               for i in range(len(words)) ]
+    sentence = core.Sentence(originaltext=" ".join(words))
+    sentence.tokens = tokens
+    sentence.get_candidates()
+    for candidate in sentence.candidates:
+        candidate.compute_features()
+    reference = [ (candidate.feat_cols, candidate.feat_vals) for candidate in sentence.candidates ]
+    sentence = core.Sentence(originaltext=" ".join(words))
+    sentence.tokens = tokens
+    sentence.get_candidates()
+    matrix = sentence.compute_features()
+    assert([ (candidate.feat_cols, candidate.feat_vals) for candidate in sentence.candidates ] == reference)
+    assert(matrix.shape == (len(reference), 178))
+
+def test_predict_candidates():
+    '''
+    Tests if batched prediction gives the same votes as predicting each candidate
+    '''
+    text = "MAPK13 seems to interact with MAPK12, which binds ALB and is activated by cryoglobulin."
+    article = core.Article(pmid="1234", fulltext=text)
+    article.extract_sentences()
+    candidates = list()
+    for sentence in article.sentences:
+        sentence.annotate()
+        sentence.get_candidates()
+        candidates.extend(sentence.candidates)
+    for candidate in candidates:
+        candidate.predict()
+    reference = [ (candidate.votes, candidate.label) for candidate in candidates ]
+    for candidate in candidates:
+        candidate.votes = None
+        candidate.label = None
+    core.predict_candidates(candidates)
+    assert([ (candidate.votes, candidate.label) for candidate in candidates ] == reference)
+
+def test_lazy_loading():
+    '''
+    Tests that importing ppaxe does not load the classifier, the gene dictionary,
+    the StanfordCoreNLP client or matplotlib
+    '''
+    import subprocess
+    import sys
+    code = "; ".join([
+        "import sys",
+        "from ppaxe import core, report",
+        "assert core.InteractionCandidate.predictor is None",
+        "assert core.Protein.GENEDICT is None",
+        "assert core.NLP is None",
+        "assert 'matplotlib.pyplot' not in sys.modules"
+    ])
+    assert(subprocess.call([sys.executable, "-c", code]) == 0)
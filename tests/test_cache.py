@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the ppaxe caches
+'''
+from ppaxe import cache
+import os
+import tempfile
+import shutil
+import time
+
+def make_cache(max_size=1024**2):
+    '''
+    Returns an AnnotationCache in a new temporary directory
+    '''
+    tmpdir = tempfile.mkdtemp()
+    return cache.AnnotationCache(os.path.join(tmpdir, "annotations.db"), max_size=max_size), tmpdir
+
+def test_annotation_cache_get_set():
+    '''
+    Tests if annotations are stored and retrieved with hit/miss counters
+    '''
+    annotations, tmpdir = make_cache()
+    tokens = [{'index': 1, 'word': 'MAPK', 'lemma': 'MAPK', 'pos': 'NN', 'ner': 'P'}]
+    assert(annotations.get("MAPK") is None)
+    annotations.set("MAPK", tokens)
+    assert(annotations.get("MAPK") == tokens)
+    assert(annotations.hits == 1 and annotations.misses == 1)
+    annotations.close()
+    shutil.rmtree(tmpdir)
+
+def test_annotation_cache_persistent():
+    '''
+    Tests if annotations are kept between runs
+    '''
+    annotations, tmpdir = make_cache()
+    annotations.set("MAPK binds ALB.", [{'word': 'MAPK'}])
+    annotations.close()
+    annotations = cache.AnnotationCache(os.path.join(tmpdir, "annotations.db"))
+    assert(annotations.get("MAPK binds ALB.") == [{'word': 'MAPK'}])
+    annotations.close()
+    shutil.rmtree(tmpdir)
+
+def test_annotation_cache_config():
+    '''
+    Tests if a different server configuration does not reuse annotations
+    '''
+    annotations, tmpdir = make_cache()
+    annotations.set("MAPK", [{'word': 'MAPK'}])
+    annotations.close()
+    properties = os.path.join(tmpdir, "other.properties")
+    with open(properties, "w") as fh:
+        fh.write("annotators = tokenize,ssplit,pos,lemma,ner\nner.model = other-model.ser.gz\n")
+    annotations = cache.AnnotationCache(os.path.join(tmpdir, "annotations.db"), properties=properties)
+    assert(annotations.get("MAPK") is None)
+    annotations.close()
+    shutil.rmtree(tmpdir)
+
+def test_annotation_cache_eviction():
+    '''
+    Tests if least recently used annotations are evicted when the cache is full
+    '''
+    annotations, tmpdir = make_cache(max_size=2000)
+    for i in range(100):
+        annotations.set("sentence %s" % i, [{'word': 'word%s' % i}])
+        annotations.get("sentence 0")
+    assert(annotations.size <= 2000)
+    assert(len(annotations) < 100)
+    assert(annotations.get("sentence 0") is not None)
+    assert(annotations.get("sentence 98") is not None)
+    assert(annotations.get("sentence 1") is None)
+    annotations.close()
+    shutil.rmtree(tmpdir)
+
+def test_annotation_cache_shared():
+    '''
+    Tests if two caches on the same file (as with --workers) see each other's
+    annotations and evict against the size of the whole file
+    '''
+    first, tmpdir = make_cache(max_size=2000)
+    second = cache.AnnotationCache(os.path.join(tmpdir, "annotations.db"), max_size=2000)
+    first.set("MAPK binds ALB.", [{'word': 'MAPK'}])
+    assert(second.get("MAPK binds ALB.") == [{'word': 'MAPK'}])
+    for i in range(50):
+        first.set("first %s" % i, [{'word': 'first%s' % i}])
+        second.set("second %s" % i, [{'word': 'second%s' % i}])
+    stored = first.conn.execute("SELECT COALESCE(SUM(size), 0) FROM annotations").fetchone()[0]
+    assert(first.size == second.size == stored)
+    assert(stored <= 2000)
+    assert(len(first) == len(second) < 101)
+    assert(second.get("first 49") is not None)
+    assert(first.get("second 0") is None)
+    first.close()
+    second.close()
+    shutil.rmtree(tmpdir)
+
+def test_article_cache_ttl():
+    '''
+    Tests if expired articles are not used, unless offline
+    '''
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "articles.db")
+    articles = cache.ArticleCache(path, ttl=0.1)
+    articles.set("PUBMED", "1234", b"<PubmedArticle>1234</PubmedArticle>")
+    assert(articles.get("PUBMED", "1234") == b"<PubmedArticle>1234</PubmedArticle>")
+    assert(articles.get("PMC", "1234") is None)
+    time.sleep(0.2)
+    assert(articles.get("PUBMED", "1234") is None)
+    assert(articles.hits == 1 and articles.misses == 2 and articles.expired == 1)
+    articles.close()
+    articles = cache.ArticleCache(path, ttl=0.1, offline=True)
+    assert(articles.get("PUBMED", "1234") == b"<PubmedArticle>1234</PubmedArticle>")
+    articles.close()
+    shutil.rmtree(tmpdir)
+
+def test_article_cache_eviction():
+    '''
+    Tests if least recently used articles are evicted when the cache is full
+    '''
+    tmpdir = tempfile.mkdtemp()
+    articles = cache.ArticleCache(os.path.join(tmpdir, "articles.db"), max_size=2000)
+    for i in range(100):
+        articles.set("PUBMED", str(i), ("<PubmedArticle>%s</PubmedArticle>" % i).encode('utf-8'))
+        articles.get("PUBMED", "0")
+    assert(articles.size <= 2000)
+    assert(len(articles) < 100)
+    assert(articles.get("PUBMED", "0") is not None)
+    assert(articles.get("PUBMED", "1") is None)
+    articles.close()
+    shutil.rmtree(tmpdir)
+
+def test_article_cache_idconv():
+    '''
+    Tests if id conversions are kept apart from the articles, their lookups and size
+    '''
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "articles.db")
+    articles = cache.ArticleCache(path, ttl=0.1)
+    articles.set_pmcids([("1234", "5678"), ("1235", "")])
+    assert(articles.get_pmcid("1234") == "5678")
+    assert(articles.get_pmcid("1235") == "")
+    assert(articles.get_pmcid("1236") is None)
+    assert(articles.get("idconv", "1234") is None)
+    assert(articles.hits == 0 and articles.misses == 1)
+    assert(articles.size == 0 and len(articles) == 0)
+    time.sleep(0.2)
+    assert(articles.get_pmcid("1234") is None)
+    articles.offline = True
+    assert(articles.get_pmcid("1234") == "5678")
+    articles.close()
+    shutil.rmtree(tmpdir)
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the rate-limited NCBI requests, against a local stand-in server
+'''
+from ppaxe import fetch
+from ppaxe import core
+from ppaxe import cache
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+PUBMED_ARTICLE = '''<PubmedArticle><MedlineCitation><PMID>%s</PMID><Article>
+<Journal><Title>Journal of tests</Title><JournalIssue><PubDate><Year>2017</Year></PubDate></JournalIssue></Journal>
+<Abstract><AbstractText>MAPK interacts with ALB in article %s.</AbstractText></Abstract>
+</Article></MedlineCitation></PubmedArticle>'''
+
+def start_ncbi_server(rate, failures=0, latency=0.05):
+    '''
+    Starts a local stand-in of the NCBI services. Answers 429 to the requests over
+    "rate" per second (as NCBI does) and 503 to the first "failures" requests.
+    Serves /idconv (json) and /efetch (PubMed or PMC xml). Returns the server, with a
+    list of rejected requests in server.rejected and the requested paths in server.paths.
+    '''
+    lock = threading.Lock()
+    times = list()
+    paths = list()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            with lock:
+                now = time.time()
+                recent = [ t for t in times if t > now - 1 ]
+                times.append(now)
+                paths.append(url.path)
+                if len(times) <= failures:
+                    status = 503
+                elif len(recent) > rate: # one request of tolerance for network jitter
+                    status = 429
+                    server.rejected.append(now)
+                else:
+                    status = 200
+            time.sleep(latency)
+            ids = params.get('ids', params.get('id', [""]))[0].split(",")
+            if status != 200:
+                body = "Error"
+            elif url.path == "/idconv":
+                body = json.dumps({'records': [
+                    {'pmid': pmid, 'status': 'error'} if pmid.startswith("0") else {'pmid': pmid, 'pmcid': "PMC%s" % pmid}
+                    for pmid in ids
+                ]})
+            elif url.path == "/efetch" and params.get('db') == ["pmc"]:
+                body = "<pmc-articleset>%s</pmc-articleset>" % "".join(PMC_ARTICLE % (pmcid, pmcid) for pmcid in ids)
+            elif url.path == "/efetch":
+                body = "<PubmedArticleSet>%s</PubmedArticleSet>" % "".join(PUBMED_ARTICLE % (pmid, pmid) for pmid in ids)
+            else:
+                body = json.dumps({'query': params.get('q', [""])[0], 'api_key': params.get('api_key', [None])[0]})
+            self.send_response(status)
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server.rejected = list()
+    server.paths = paths
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def test_token_bucket():
+    '''
+    Tests if the token bucket spaces the requests
+    '''
+    bucket = fetch.TokenBucket(rate=20)
+    start = time.time()
+    for i in range(11):
+        bucket.acquire()
+    assert(time.time() - start >= 0.45)
+
+def test_default_rates():
+    '''
+    Tests the NCBI limits with and without API key
+    '''
+    assert(fetch.Fetcher().bucket.rate == fetch.RATE_WITHOUT_KEY)
+    assert(fetch.Fetcher(api_key="KEY").bucket.rate == fetch.RATE_WITH_KEY)
+
+def test_fetcher_rate_limit():
+    '''
+    Tests if concurrent requests stay under the server limit and keep their order
+    '''
+    server = start_ncbi_server(rate=20)
+    url = 'http://127.0.0.1:%s/echo' % server.server_address[1]
+    fetcher = fetch.Fetcher(api_key="KEY", rate=20, workers=4, backoff=0.01)
+    responses = fetcher.map([ (url, {'q': str(i)}) for i in range(30) ])
+    fetcher.close()
+    server.shutdown()
+    assert(not server.rejected)
+    assert([ json.loads(req.content.decode('utf-8'))['query'] for req in responses ] == [ str(i) for i in range(30) ])
+    assert(json.loads(responses[0].content.decode('utf-8'))['api_key'] == "KEY")
+    assert(fetcher.retried == 0)
+
+def test_fetcher_retries():
+    '''
+    Tests if requests failing with 503 are retried
+    '''
+    server = start_ncbi_server(rate=100, failures=2)
+    url = 'http://127.0.0.1:%s/echo' % server.server_address[1]
+    fetcher = fetch.Fetcher(rate=50, workers=2, backoff=0.05)
+    responses = fetcher.map([ (url, {'q': str(i)}) for i in range(10) ])
+    fetcher.close()
+    server.shutdown()
+    assert(all(req.status_code == 200 for req in responses))
+    assert(fetcher.retried == 2)
+
+def test_pubmed_query_local_server():
+    '''
+    Tests pmid_2_pmc and PMQuery.get_articles against the local server
+    '''
+    server = start_ncbi_server(rate=50)
+    base = 'http://127.0.0.1:%s' % server.server_address[1]
+    saved = (core.FETCHER, core.IDCONV_URL, core.EFETCH_URL)
+    core.FETCHER = fetch.Fetcher(rate=50, workers=4, backoff=0.01)
+    core.IDCONV_URL = base + "/idconv"
+    core.EFETCH_URL = base + "/efetch"
+    try:
+        pmids = [ str(1000 + i) for i in range(450) ] + ["0123"]
+        batches = list(core.pmid_2_pmc(pmids + pmids[:10]))
+        assert([ len(batch) for batch in batches ] == [200, 200, 50])
+        assert([ pmcid for batch in batches for pmcid in batch ] == pmids[:-1])
+        query = core.PMQuery(ids=pmids, database="PUBMED")
+        query.get_articles()
+        assert([ article.pmid for article in query ] == pmids)
+        assert(query.articles[0].abstract == "MAPK interacts with ALB in article 1000.")
+        assert(not query.notfound)
+    finally:
+        core.FETCHER.close()
+        core.FETCHER, core.IDCONV_URL, core.EFETCH_URL = saved
+        server.shutdown()
+
+def test_pmc_query_streaming():
+    '''
+    Tests if PMC articles are requested while the identifiers are still being converted
+    '''
+    server = start_ncbi_server(rate=100, latency=0.01)
+    base = 'http://127.0.0.1:%s' % server.server_address[1]
+    saved = (core.FETCHER, core.IDCONV_URL, core.EFETCH_URL)
+    core.FETCHER = fetch.Fetcher(rate=100, workers=2, backoff=0.01)
+    core.IDCONV_URL = base + "/idconv"
+    core.EFETCH_URL = base + "/efetch"
+    try:
+        pmids = [ str(1000 + i) for i in range(2000) ]
+        query = core.PMQuery(ids=pmids + pmids[:5], database="PMC")
+        articles = query.iter_articles()
+        first = next(articles)
+        assert(server.paths.count("/idconv") < 10)
+        assert([ first.pmid ] + [ article.pmid for article in articles ] == pmids)
+        assert(server.paths.count("/idconv") == 11)
+    finally:
+        core.FETCHER.close()
+        core.FETCHER, core.IDCONV_URL, core.EFETCH_URL = saved
+        server.shutdown()
+
+PMC_ARTICLE = '''<article xmlns:xlink="http://www.w3.org/1999/xlink"><front><journal-meta>
+<journal-id journal-id-type="nlm-ta">J Test</journal-id></journal-meta><article-meta>
+<article-id pub-id-type="pmid">%s</article-id><article-id pub-id-type="pmc">%s</article-id>
+<pub-date><year>2017</year></pub-date></article-meta></front>
+<body><p>MAPK <xref xlink:href="#b1">binds</xref> ALB.</p></body></article>'''
+
+def parse_articles(database, content):
+    '''
+    Returns the Articles in the efetch XML content, parsed as PMQuery does
+    '''
+    make_article = core.pmc_article if database == "PMC" else core.pubmed_article
+    articles = [ make_article(element) for element in core.iter_article_elements(database, content) ]
+    return [ article for article in articles if article is not None ]
+
+def test_split_join_articles():
+    '''
+    Tests if efetch XML is split in articles by identifier and joined back
+    '''
+    content = "<pmc-articleset>%s%s</pmc-articleset>" % (PMC_ARTICLE % ("11", "PMC21"), PMC_ARTICLE % ("12", "22"))
+    articles = core.split_articles("PMC", content.encode('utf-8'))
+    assert([ identifier for identifier, xml in articles ] == ["21", "22"])
+    original = parse_articles("PMC", content.encode('utf-8'))
+    joined = parse_articles("PMC", core.join_articles("PMC", [ xml for identifier, xml in articles ]))
+    assert([ article.pmid for article in joined ] == ["11", "12"])
+    assert([ article.fulltext for article in joined ] == [ article.fulltext for article in original ])
+
+def test_article_cache_offline():
+    '''
+    Tests if cached articles are not downloaded again and can be used offline
+    '''
+    server = start_ncbi_server(rate=50)
+    base = 'http://127.0.0.1:%s' % server.server_address[1]
+    tmpdir = tempfile.mkdtemp()
+    saved = (core.FETCHER, core.EFETCH_URL, core.ARTICLE_CACHE)
+    core.FETCHER = fetch.Fetcher(rate=50, workers=2, backoff=0.01)
+    core.EFETCH_URL = base + "/efetch"
+    core.ARTICLE_CACHE = cache.ArticleCache(os.path.join(tmpdir, "articles.db"))
+    try:
+        pmids = [ str(1000 + i) for i in range(250) ]
+        query = core.PMQuery(ids=pmids[:200], database="PUBMED")
+        query.get_articles()
+        assert(len(server.paths) == 1)
+        query = core.PMQuery(ids=pmids, database="PUBMED")
+        query.get_articles()
+        assert(len(server.paths) == 2)
+        assert(sorted(article.pmid for article in query) == pmids)
+        server.shutdown()
+        server.server_close()
+        core.ARTICLE_CACHE.offline = True
+        query = core.PMQuery(ids=pmids + ["999"], database="PUBMED")
+        query.get_articles()
+        assert(sorted(article.pmid for article in query) == pmids)
+        assert(query.notfound == set(["999"]))
+        assert(query.articles[0].abstract == "MAPK interacts with ALB in article 1000.")
+    finally:
+        core.FETCHER.close()
+        core.ARTICLE_CACHE.close()
+        core.FETCHER, core.EFETCH_URL, core.ARTICLE_CACHE = saved
+        shutil.rmtree(tmpdir)
+
+def minidom_to_text(node):
+    '''
+    Returns the text directly contained in a minidom node, without the tags
+    '''
+    return " ".join(t.nodeValue for t in node.childNodes if t.nodeType == t.TEXT_NODE)
+
+def minidom_articles(database, content):
+    '''
+    Returns (pmid, pmcid, journal, year, text) of the articles in content, parsed
+    with minidom as PMQuery did before streaming parsing
+    '''
+    from xml.dom import minidom
+    articles = list()
+    document = minidom.parseString(content)
+    if database == "PMC":
+        for article in document.getElementsByTagName('article'):
+            pmid    = article.getElementsByTagName('article-id')[0].firstChild.nodeValue
+            journal = article.getElementsByTagName('journal-id')[0].firstChild.nodeValue
+            year = article.getElementsByTagName('year')[0].firstChild.nodeValue
+            try:
+                pmcid = article.getElementsByTagName('article-id')[1].firstChild.nodeValue
+            except:
+                continue
+            body = article.getElementsByTagName('body')
+            if len(body) == 0:
+                continue
+            text = "\n".join(minidom_to_text(par) for par in body[0].getElementsByTagName('p'))
+            articles.append((pmid, pmcid, journal, year, text))
+    else:
+        for article in document.getElementsByTagName('PubmedArticle'):
+            pmid = minidom_to_text(article.getElementsByTagName('PMID')[0])
+            journal = minidom_to_text(article.getElementsByTagName('Journal')[0].getElementsByTagName('Title')[0])
+            year = article.getElementsByTagName('Year')[0].firstChild.nodeValue
+            text = "\n".join(minidom_to_text(abst) for abst in article.getElementsByTagName('AbstractText'))
+            if not text.strip():
+                continue
+            articles.append((pmid, None, journal, year, text))
+    return articles
+
+def test_streaming_parser_semantics():
+    '''
+    Tests if the streaming parsers give the same articles as minidom
+    '''
+    pmc = ("<pmc-articleset>" +
+        PMC_ARTICLE % ("11", "21") +
+        '<article><front><article-id pub-id-type="pmid">12</article-id><journal-id>J</journal-id>'
+        '<year>2001</year></front><body><p>No PMC id</p></body></article>' +
+        '<article><front><article-id pub-id-type="pmid">13</article-id><article-id pub-id-type="pmc">23</article-id>'
+        '<journal-id>J</journal-id><year>2002</year></front></article>' +
+        '<article><front><article-id>14</article-id><article-id>24</article-id><journal-id>Nested</journal-id>'
+        '<year>2003</year></front><body><sec><p>First <italic>nested</italic> paragraph, <bold>with</bold> tails.</p>'
+        '<list><list-item><p>Item</p></list-item></list></sec><p>Last</p></body>'
+        '<back><ref-list><ref><year>1999</year></ref></ref-list></back></article>' +
+        "</pmc-articleset>").encode('utf-8')
+    articles = parse_articles("PMC", pmc)
+    assert([ (a.pmid, a.pmcid, a.journal, a.year, a.fulltext) for a in articles ] == minidom_articles("PMC", pmc))
+    assert(set(["11", "12", "13", "14"]).difference(a.pmid for a in articles) == set(["12", "13"]))
+    pubmed = ("<PubmedArticleSet>" +
+        PUBMED_ARTICLE % ("31", "31") +
+        '<PubmedArticle><MedlineCitation><PMID Version="1">32</PMID><DateCompleted><Year>2010</Year></DateCompleted>'
+        '<Article><Journal><Title>Mixed <i>content</i> journal</Title><JournalIssue><PubDate><Year>2009</Year>'
+        '</PubDate></JournalIssue></Journal><Abstract><AbstractText Label="A">First &amp; <sup>2</sup> part</AbstractText>'
+        '<AbstractText>Second</AbstractText></Abstract></Article></MedlineCitation></PubmedArticle>' +
+        '<PubmedArticle><MedlineCitation><PMID>33</PMID><Article><Journal><Title>J</Title>'
+        '<JournalIssue><PubDate><Year>2008</Year></PubDate></JournalIssue></Journal></Article>'
+        '</MedlineCitation></PubmedArticle>' +
+        "</PubmedArticleSet>").encode('utf-8')
+    articles = parse_articles("PUBMED", pubmed)
+    assert([ (a.pmid, None, a.journal, a.year, a.abstract) for a in articles ] == minidom_articles("PUBMED", pubmed))
+    assert(set(["31", "32", "33"]).difference(a.pmid for a in articles) == set(["33"]))
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the compiled gene dictionary
+'''
+from ppaxe import genedict
+import os
+import pickle
+import tempfile
+import shutil
+
+DICTIONARY = "ALB\tALB\talbumin\tPRO0883\nMAPK1\tMAPK1\tERK2\tp42-MAPK\nTP53\tTP53\tp53\tLFS1\n"
+
+def make_index():
+    '''
+    Compiles DICTIONARY in a new temporary directory and returns the GeneIndex
+    '''
+    tmpdir = tempfile.mkdtemp()
+    source = os.path.join(tmpdir, "genes.txt")
+    with open(source, "w") as fh:
+        fh.write(DICTIONARY)
+    index = os.path.join(tmpdir, "genes.idx")
+    genedict.compile_dictionary(source, index)
+    return genedict.GeneIndex(index), source, tmpdir
+
+def test_gene_index_lookup():
+    '''
+    Tests if the index gives the same symbols as the text dictionary
+    '''
+    index, source, tmpdir = make_index()
+    expected = genedict.read_dictionary(source)
+    assert(len(index) == len(expected))
+    for alias, symbol in expected.items():
+        assert(alias in index)
+        assert(index[alias] == symbol)
+    assert(index.get("P42-MAPK") == "MAPK1")
+    assert("NOTAGENE" not in index)
+    assert(index.get("NOTAGENE", "NOTAGENE") == "NOTAGENE")
+    index.close()
+    shutil.rmtree(tmpdir)
+
+def test_gene_index_pickle():
+    '''
+    Tests if a pickled index maps the same file
+    '''
+    index, source, tmpdir = make_index()
+    copy = pickle.loads(pickle.dumps(index))
+    assert(copy.path == index.path)
+    assert(copy["ALBUMIN"] == "ALB")
+    copy.close()
+    index.close()
+    shutil.rmtree(tmpdir)
+
+def test_gene_index_current():
+    '''
+    Tests if outdated indexes are detected
+    '''
+    index, source, tmpdir = make_index()
+    index.close()
+    assert(genedict.is_current(index.path, source))
+    os.utime(source, (os.path.getmtime(index.path) + 10, os.path.getmtime(index.path) + 10))
+    assert(not genedict.is_current(index.path, source))
+    os.remove(index.path)
+    assert(not genedict.is_current(index.path, source))
+    shutil.rmtree(tmpdir)
+
+def use_dictionary(tmpdir):
+    '''
+    Makes core.Protein use DICTIONARY (compiled in tmpdir). Returns the previous settings.
+    '''
+    from ppaxe import core
+    source = os.path.join(tmpdir, "genes.txt")
+    with open(source, "w") as fh:
+        fh.write(DICTIONARY)
+    saved = (core.Protein.GENEDICT, core.Protein.GENEDICTFILE, core.Protein.GENEINDEXFILE)
+    core.Protein.GENEDICT = None
+    core.Protein.GENEDICTFILE = source
+    core.Protein.GENEINDEXFILE = os.path.join(tmpdir, "genes.idx")
+    return saved
+
+def restore_dictionary(saved):
+    '''
+    Restores the core.Protein settings returned by use_dictionary()
+    '''
+    from ppaxe import core
+    if core.Protein.GENEDICT is not None:
+        core.Protein.GENEDICT.close()
+    core.Protein.GENEDICT, core.Protein.GENEDICTFILE, core.Protein.GENEINDEXFILE = saved
+
+def test_disambiguate_with_index():
+    '''
+    Tests if Protein.disambiguate() compiles and queries the index
+    '''
+    from ppaxe import core
+    tmpdir = tempfile.mkdtemp()
+    saved = use_dictionary(tmpdir)
+    try:
+        prot = core.Protein(symbol="Albumin", positions=[1], sentence="placeholder")
+        assert(prot.disambiguate() == "ALB")
+        assert(isinstance(core.Protein.GENEDICT, genedict.GeneIndex))
+        assert(os.path.exists(core.Protein.GENEINDEXFILE))
+    finally:
+        restore_dictionary(saved)
+    shutil.rmtree(tmpdir)
+
+def test_user_index():
+    '''
+    Tests if the index is compiled in the user cache directory when it can't be
+    written next to the dictionary
+    '''
+    from ppaxe import core
+    tmpdir = tempfile.mkdtemp()
+    saved = use_dictionary(tmpdir)
+    cachehome = os.environ.get('XDG_CACHE_HOME')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(tmpdir, "cache")
+    # A file can't be the directory of the index
+    core.Protein.GENEINDEXFILE = os.path.join(core.Protein.GENEDICTFILE, "genes.idx")
+    try:
+        assert(core.get_gene_dictionary()["P53"] == "TP53")
+        assert(isinstance(core.Protein.GENEDICT, genedict.GeneIndex))
+        assert(core.Protein.GENEDICT.path == genedict.user_index_path(core.Protein.GENEDICTFILE))
+        assert(core.Protein.GENEDICT.path.startswith(os.path.join(tmpdir, "cache", "ppaxe")))
+    finally:
+        if cachehome is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = cachehome
+        restore_dictionary(saved)
+    shutil.rmtree(tmpdir)
+
+def test_symbol_cache():
+    '''
+    Tests the memoized disambiguation and its counters
+    '''
+    from ppaxe import core
+    tmpdir = tempfile.mkdtemp()
+    saved = use_dictionary(tmpdir)
+    core.Protein.SYMBOL_CACHE.clear()
+    try:
+        prot1 = core.Protein(symbol="p53", positions=[1], sentence="placeholder")
+        prot2 = core.Protein(symbol="p53", positions=[4], sentence="placeholder")
+        prot3 = core.Protein(symbol="'NOTAGENE'", positions=[6], sentence="placeholder")
+        assert(prot1.disambiguate() == "TP53")
+        assert(prot1.disambiguate() == "TP53")
+        assert(prot2.disambiguate() == "TP53")
+        assert(prot3.disambiguate() == "NOTAGENE")
+        assert(prot1.disambiguated == "TP53")
+        stats = core.Protein.SYMBOL_CACHE.stats()
+        assert(stats['misses'] == 2 and stats['hits'] == 1 and stats['reused'] == 1)
+        assert(stats['size'] == 2)
+        assert(core.Protein.SYMBOL_CACHE.hit_rate() == 0.5)
+    finally:
+        restore_dictionary(saved)
+        core.Protein.SYMBOL_CACHE.clear()
+    shutil.rmtree(tmpdir)
+
+def test_symbol_cache_bounded():
+    '''
+    Tests if the memo does not grow over max_size and follows dictionary changes
+    '''
+    from ppaxe import core
+    tmpdir = tempfile.mkdtemp()
+    saved = use_dictionary(tmpdir)
+    memo = core.SymbolCache(max_size=2)
+    try:
+        for symbol in ["albumin", "erk2", "lfs1", "p53"]:
+            memo.get(symbol)
+            assert(len(memo.symbols) <= 2)
+        # Least recently used symbols are evicted first
+        memo.get("lfs1")
+        memo.get("albumin")
+        assert(list(memo.symbols) == ["lfs1", "albumin"])
+        assert(memo.hits == 1)
+        index = core.Protein.GENEDICT
+        core.Protein.GENEDICT = {"ALBUMIN": "OTHER"}
+        assert(memo.get("albumin") == "OTHER")
+        core.Protein.GENEDICT = index
+    finally:
+        restore_dictionary(saved)
+    shutil.rmtree(tmpdir)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the instrumentation of the stages
+'''
+from ppaxe import instrument
+import tempfile
+import shutil
+import json
+import os
+
+
+def test_histogram_percentiles():
+    '''
+    Tests if the percentiles of the histogram are within a bucket of the exact ones
+    '''
+    histogram = instrument.Histogram()
+    values = [ (i + 1) / 1000.0 for i in range(1000) ]
+    for value in values:
+        histogram.add(value)
+    for fraction, exact in ((0.50, 0.5), (0.95, 0.95), (0.99, 0.99)):
+        assert(abs(histogram.percentile(fraction) - exact) / exact < 0.1)
+    summary = histogram.to_dict()
+    assert(summary['count'] == 1000 and summary['min'] == 0.001 and summary['max'] == 1.0)
+    histogram.add(0)
+    assert(histogram.percentile(0.0) == 0)
+
+def test_disabled():
+    '''
+    Tests if nothing is recorded when instrumentation is disabled
+    '''
+    instrument.disable()
+    instrument.reset()
+    assert(instrument.timer("stage") is instrument.NULL_TIMER)
+    with instrument.timer("stage"):
+        pass
+    instrument.observe("size", 10)
+    instrument.count("things")
+    profile = instrument.profile()
+    assert(profile['stages'] == {} and profile['values'] == {} and profile['counters'] == {})
+    assert(instrument.take() is None)
+
+def test_profile():
+    '''
+    Tests if timers, values and counters are recorded, merged and written as JSON
+    '''
+    @instrument.timed("double")
+    def double(number):
+        '''Doubles number'''
+        return 2 * number
+
+    tmpdir = tempfile.mkdtemp()
+    instrument.enable()
+    try:
+        assert(double(2) == 4)
+        with instrument.timer("stage"):
+            pass
+        instrument.observe("size", 10)
+        instrument.count("things", 2)
+        # Snapshot taken in another process (e.g. a worker) and merged back
+        snapshot = instrument.take()
+        assert(instrument.profile()['stages'] == {})
+        instrument.merge(snapshot)
+        instrument.merge(snapshot)
+        filename = os.path.join(tmpdir, "profile.json")
+        instrument.write_profile(filename)
+        with open(filename) as fh:
+            profile = json.load(fh)
+    finally:
+        instrument.disable()
+        instrument.reset()
+        shutil.rmtree(tmpdir)
+    assert(double.__doc__ == "Doubles number")
+    assert(profile['stages']['double']['count'] == 2)
+    assert(profile['stages']['stage']['count'] == 2)
+    assert(profile['values']['size']['p99'] == 10)
+    assert(profile['counters']['things'] == 4)
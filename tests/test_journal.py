@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the run journal
+'''
+from ppaxe import core
+from ppaxe import journal
+import subprocess
+import tempfile
+import shutil
+import sys
+import os
+
+
+def make_result(pmid, interactions=1):
+    '''
+    Returns an ArticleResult with the given number of interactions
+    '''
+    return core.ArticleResult(
+        pmid, "PMC%s" % pmid, "Journal", "2018", 10, 2 * interactions, ["MAPK13", "ALB"],
+        [ core.Interaction(0.9, "P38D", "MAPK13", "ALB", "ALB", "<span>c</span>", "<span>s%s</span>" % i) for i in range(interactions) ]
+    )
+
+def test_result_json():
+    '''
+    Tests if results are stored and read back unchanged
+    '''
+    result = make_result("1", interactions=2)
+    assert(journal.result_from_json(journal.result_to_json(result)) == result)
+    empty = make_result("2", interactions=0)
+    assert(journal.result_from_json(journal.result_to_json(empty)) == empty)
+
+def test_journal_resume():
+    '''
+    Tests if a journal keeps the results, identifiers and stages of previous runs
+    '''
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "run.journal")
+    try:
+        runjournal = journal.RunJournal(path)
+        runjournal.start({'database': "PMC"})
+        runjournal.mark(core.Article(pmid="3", pmcid="PMC3"), "fetched")
+        runjournal.mark(core.Article(pmid="3", pmcid="PMC3"), "annotated")
+        for pmid in ("1", "2"):
+            runjournal.complete(make_result(pmid))
+        runjournal.mark_notfound(["4"])
+        runjournal.close()
+
+        runjournal = journal.RunJournal(path)
+        try:
+            runjournal.start({'database': "PUBMED"}, resume=True)
+            assert(False)
+        except journal.JournalError:
+            pass
+        runjournal.start({'database': "PMC"}, resume=True)
+        assert(runjournal.completed() == set(["1", "PMC1", "2", "PMC2", "4"]))
+        assert([ result.pmid for result in runjournal.results() ] == ["1", "2"])
+        assert(runjournal.counts()['annotated'] == 1)
+        runjournal.complete(make_result("3"))
+        assert([ result.pmid for result in runjournal.results() ] == ["1", "2", "3"])
+        runjournal.start({'database': "PMC"})
+        assert(runjournal.completed() == set())
+        runjournal.close()
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_journal_crash():
+    '''
+    Tests if, after a crash, the output offset in the journal matches the
+    committed results, so the output can be truncated and the run resumed
+    '''
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "run.journal")
+    output = os.path.join(tmpdir, "output.tsv")
+    script = "\n".join([
+        "import os, sys",
+        "sys.path.insert(0, %r)" % os.path.dirname(os.path.abspath(__file__)),
+        "from test_journal import make_result",
+        "from ppaxe import journal",
+        "runjournal = journal.RunJournal(%r, commit_every=0)" % path,
+        "runjournal.start({'database': 'PMC'})",
+        "ofh = open(%r, 'w')" % output,
+        "for pmid in range(5):",
+        "    ofh.write('%s\\tinteraction\\n' % pmid)",
+        "    runjournal.complete(make_result(str(pmid)), ofh)",
+        "runjournal.commit_every = 3600",
+        "ofh.write('5\\tinteraction\\n')",
+        "runjournal.complete(make_result('5'), ofh)",
+        "ofh.write('6\\tpartial')",
+        "ofh.flush()",
+        "os._exit(1)",
+    ])
+    try:
+        subprocess.call([sys.executable, "-c", script])
+        runjournal = journal.RunJournal(path)
+        runjournal.start({'database': 'PMC'}, resume=True)
+        assert([ result.pmid for result in runjournal.results() ] == [ str(pmid) for pmid in range(5) ])
+        with open(output) as fh:
+            content = fh.read()
+        assert(content[:runjournal.offset()] == "".join("%s\tinteraction\n" % pmid for pmid in range(5)))
+        runjournal.close()
+    finally:
+        shutil.rmtree(tmpdir)
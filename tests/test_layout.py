@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the force-directed layout of the report graph
+'''
+from ppaxe import layout
+from ppaxe import report
+import numpy as np
+import json
+
+
+def two_clusters():
+    '''
+    Returns the edges of two cliques of 10 nodes joined by a single edge
+    '''
+    edges = list()
+    for first in (0, 10):
+        edges.extend((first + i, first + j) for i in range(10) for j in range(i + 1, 10))
+    edges.append((0, 10))
+    return edges
+
+def test_force_layout():
+    '''
+    Tests if the layout is deterministic and puts connected nodes together,
+    with the exact repulsion and with the grid approximation
+    '''
+    edges = two_clusters()
+    for exact in (True, False):
+        positions = layout.force_layout(20, edges, exact=exact)
+        assert(positions.shape == (20, 2) and np.isfinite(positions).all())
+        assert((positions == layout.force_layout(20, edges, exact=exact)).all())
+        centers = [ positions[:10].mean(axis=0), positions[10:].mean(axis=0) ]
+        spread = max(np.sqrt(((positions[:10] - centers[0]) ** 2).sum(axis=1)).max(),
+                     np.sqrt(((positions[10:] - centers[1]) ** 2).sum(axis=1)).max())
+        assert(np.sqrt(((centers[0] - centers[1]) ** 2).sum()) > spread)
+    assert(layout.force_layout(0, []).shape == (0, 2))
+    scaled = layout.scale_positions(layout.force_layout(2, [(0, 1)]), [(0, 1)], spacing=60)
+    assert(abs(np.sqrt(((scaled[0] - scaled[1]) ** 2).sum()) - 60) < 1e-6)
+
+def test_preset_positions():
+    '''
+    Tests if the graph json has a position for each node
+    '''
+    nodes = [ {'id': name} for name in ("ALB", "MAPK13", "TP53") ]
+    edges = [ {'source': "ALB", 'target': "MAPK13"}, {'source': "ALB", 'target': "TP53"} ]
+    graph = json.loads(report.elements_to_json(nodes, edges, report.graph_positions(nodes, edges)))
+    assert(all(set(node['position']) == set(['x', 'y']) for node in graph['nodes']))
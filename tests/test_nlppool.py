@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the load balancing of several StanfordCoreNLP servers
+'''
+from ppaxe import core
+from ppaxe import nlppool
+from ppaxe import nlpserver
+from multiprocessing.pool import ThreadPool
+import json
+import time
+
+
+def stop(servers):
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_least_outstanding():
+    '''
+    Tests if concurrent requests are spread over the servers
+    '''
+    servers = [ nlpserver.start(latency=0.05) for i in range(2) ]
+    nlp = nlppool.BalancedNLP(",".join(server.url for server in servers), check_interval=0)
+    try:
+        texts = [ "MAPK13 binds ALB number %s." % i for i in range(8) ]
+        responses = ThreadPool(4).map(lambda text: json.loads(nlp.annotate(text, core.BATCH_PROPERTIES)), texts)
+        assert(all(len(response['sentences']) == 1 for response in responses))
+        assert([ server.get_stats()['requests'] for server in servers ] == [4, 4])
+        assert([ server.get_stats()['max_running'] for server in servers ] == [2, 2])
+    finally:
+        stop(servers)
+
+def test_ejection():
+    '''
+    Tests if a failing server is ejected, its requests retried in the other one,
+    and if it is brought back by the health check once it works again
+    '''
+    servers = [ nlpserver.start(error_rate=1.0), nlpserver.start() ]
+    nlp = nlppool.BalancedNLP([ server.url for server in servers ], max_failures=2, eject_seconds=0.1, check_interval=0)
+    try:
+        for i in range(6):
+            response = json.loads(nlp.annotate("ALB binds MAPK13.", core.BATCH_PROPERTIES))
+            assert(response['sentences'][0]['tokens'][0]['word'] == "ALB")
+        assert(servers[0].get_stats()['requests'] == 2)
+        assert(nlp.endpoints[0].ejections == 1)
+        servers[0].error_rate = 0.0
+        time.sleep(0.15)
+        nlp.check()
+        assert(nlp.endpoints[0].ejected_until == 0)
+        nlp.annotate("ALB binds MAPK13.", core.BATCH_PROPERTIES)
+        assert(servers[0].get_stats()['requests'] == 3)
+    finally:
+        stop(servers)
+
+def test_core_endpoints():
+    '''
+    Tests if core uses a BalancedNLP when NLP_URL has several addresses
+    '''
+    saved = (core.NLP, core.NLP_URL)
+    try:
+        core.NLP, core.NLP_URL = (None, "http://127.0.0.1:9001, http://127.0.0.1:9002")
+        nlp = core.get_nlp()
+        assert(isinstance(nlp, nlppool.BalancedNLP))
+        assert([ endpoint.url for endpoint in nlp.endpoints ] == ["http://127.0.0.1:9001", "http://127.0.0.1:9002"])
+    finally:
+        core.NLP, core.NLP_URL = saved
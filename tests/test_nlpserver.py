@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the stand-in StanfordCoreNLP server
+'''
+from ppaxe import core
+from ppaxe import replay
+from ppaxe import nlpserver
+from pycorenlp import StanfordCoreNLP
+import threading
+import requests
+import json
+
+
+def test_annotate_protocol():
+    '''
+    Tests if the server answers pycorenlp like CoreNLP, replaying recorded responses
+    '''
+    store = replay.AnnotationStore()
+    recorded = json.dumps({'sentences': []})
+    store.add("Recorded text.", core.BATCH_PROPERTIES, recorded)
+    server = nlpserver.start(store=store)
+    try:
+        client = StanfordCoreNLP(server.url)
+        assert(client.annotate("Recorded text.", properties=core.BATCH_PROPERTIES) == recorded)
+        response = json.loads(client.annotate("MAPK13 binds ALB.", properties=core.BATCH_PROPERTIES))
+        assert([ token['ner'] for token in response['sentences'][0]['tokens'] ] == ["P", "O", "P", "O"])
+        assert(requests.get(server.url + "/ping").text == "pong\n")
+        stats = server.get_stats()
+        assert((stats['requests'], stats['pings'], stats['recorded'], stats['tokenized']) == (2, 2, 1, 1))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_concurrency_and_errors():
+    '''
+    Tests if the server limits the concurrent annotations, and if injected
+    errors make core skip the sentences
+    '''
+    server = nlpserver.start(latency=0.05, threads=2)
+    try:
+        client = StanfordCoreNLP(server.url)
+        requests_threads = [ threading.Thread(target=client.annotate, args=("Text %s." % i,)) for i in range(6) ]
+        for thread in requests_threads:
+            thread.start()
+        for thread in requests_threads:
+            thread.join()
+        assert(server.get_stats()['max_running'] == 2)
+        server.error_rate = 1.0
+        saved = (core.NLP, core.ANNOTATION_CACHE)
+        core.NLP, core.ANNOTATION_CACHE = (client, None)
+        try:
+            article = core.Article(pmid="1", fulltext="MAPK13 binds ALB. ALB binds MAPK13.")
+            article.extract_sentences()
+            assert(article.annotate_sentences() == [])
+        finally:
+            core.NLP, core.ANNOTATION_CACHE = saved
+        assert(server.get_stats()['errors'] == 3)
+    finally:
+        server.shutdown()
+        server.server_close()
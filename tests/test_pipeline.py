@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the pipeline of concurrent stages
+'''
+from ppaxe import pipeline
+import time
+
+def test_pipeline_order():
+    '''
+    Tests if items go through all the stages in order, and None drops items
+    '''
+    stages = pipeline.Pipeline(range(100), maxsize=2)
+    stages.add_stage("double", lambda item: item * 2)
+    stages.add_stage("odd", lambda item: None if item % 4 == 0 else item)
+    assert(list(stages) == [ item * 2 for item in range(100) if item % 2 ])
+    assert(stages.counts == {'double': 100, 'odd': 50})
+
+def test_pipeline_backpressure():
+    '''
+    Tests if the source is not read ahead more than the queues allow
+    '''
+    produced = list()
+    def source():
+        for item in range(50):
+            produced.append(item)
+            yield item
+    stages = pipeline.Pipeline(source(), maxsize=2)
+    stages.add_stage("identity", lambda item: item)
+    for item in stages:
+        time.sleep(0.01)
+        # Two queues of two items, one item in each thread and the one being consumed
+        assert(len(produced) - item <= 2 * 2 + 3)
+
+def test_pipeline_overlap():
+    '''
+    Tests if the stages run concurrently
+    '''
+    def slow(item):
+        time.sleep(0.05)
+        return item
+    stages = pipeline.Pipeline(range(10))
+    stages.add_stage("first", slow)
+    stages.add_stage("second", slow)
+    start = time.time()
+    assert(list(stages) == list(range(10)))
+    assert(time.time() - start < 0.05 * 20 * 0.8)
+
+def test_pipeline_error():
+    '''
+    Tests if errors in a stage are raised to the consumer and the threads stop
+    '''
+    def fail(item):
+        if item == 5:
+            raise ValueError("stage failed")
+        return item
+    stages = pipeline.Pipeline(range(1000), maxsize=2)
+    stages.add_stage("fail", fail)
+    results = list()
+    try:
+        for item in stages:
+            results.append(item)
+        assert(False)
+    except ValueError as err:
+        assert(str(err) == "stage failed")
+    assert(results == [0, 1, 2, 3, 4])
+    assert(stages.stop.is_set())
+
+def test_pipeline_early_stop():
+    '''
+    Tests if the threads stop when the consumer stops iterating
+    '''
+    stages = pipeline.Pipeline(iter(range(10**6)), maxsize=2)
+    stages.add_stage("identity", lambda item: item)
+    iterator = iter(stages)
+    assert(next(iterator) == 0)
+    iterator.close()
+    assert(stages.stop.is_set())
@@ -88,7 +88,7 @@ def test_too_many_pmids():
     Tests if ppaxe can handle many PMID in pmid_2_pmc
     '''
     identifiers = ["26267445"] * 300
-    pmcids = core.pmid_2_pmc(identifiers)
+    pmcids = [ pmcid for batch in core.pmid_2_pmc(identifiers) for pmcid in batch ]
     assert(len(pmcids) == 1)
 
 def test_too_many_pmids_2():
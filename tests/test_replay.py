@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the recorded StanfordCoreNLP annotations
+'''
+from ppaxe import core
+from ppaxe import replay
+import tempfile
+import shutil
+import json
+import os
+
+
+class FakeNLP(object):
+    '''
+    Stand-in for StanfordCoreNLP that counts the requests
+    '''
+    def __init__(self):
+        self.requests = 0
+
+    def annotate(self, text, properties=None):
+        self.requests += 1
+        return json.dumps(replay.tokenize(text, properties))
+
+
+def test_tokenize():
+    '''
+    Tests if tokenize() splits sentences and returns offsets of the text
+    '''
+    text = "MAPK13 binds ALB. IL-6 was measured.\nNothing here"
+    response = replay.tokenize(text, core.BATCH_PROPERTIES)
+    assert(len(response['sentences']) == 3)
+    for sentence in response['sentences']:
+        for token in sentence['tokens']:
+            assert(text[token['characterOffsetBegin']:token['characterOffsetEnd']] == token['word'])
+    first = response['sentences'][0]['tokens']
+    assert([ token['ner'] for token in first ] == ["P", "O", "P", "O"])
+    assert(first[1]['lemma'] == "bind" and first[1]['pos'] == "VBZ")
+    assert(response['sentences'][1]['tokens'][0]['ner'] == "P")
+    assert(replay.tokenize(text) == replay.tokenize(text))
+
+def test_record_and_replay():
+    '''
+    Tests if recorded responses are saved and replayed, and if ReplayNLP
+    without fallback refuses texts that were not recorded
+    '''
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, "corenlp.jsonl")
+        nlp = FakeNLP()
+        recorder = replay.RecordingNLP(nlp, replay.AnnotationStore(path))
+        recorded = recorder.annotate("P38D binds ALB.", core.BATCH_PROPERTIES)
+        recorder.annotate("P38D binds ALB.", core.BATCH_PROPERTIES)
+        assert(nlp.requests == 2)
+        store = replay.AnnotationStore(path)
+        assert(len(store) == 1)
+        player = replay.ReplayNLP(store, fallback=False)
+        assert(player.annotate("P38D binds ALB.", core.BATCH_PROPERTIES) == recorded)
+        try:
+            player.annotate("P38D binds ALB.", {'annotators': 'tokenize'})
+            assert(False)
+        except KeyError:
+            pass
+        assert((player.hits, player.misses) == (1, 1))
+    finally:
+        shutil.rmtree(tmpdir)
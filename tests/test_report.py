@@ -5,7 +5,25 @@ Tests for the summary/report of the analyses
 from ppaxe import core
 from ppaxe import report
 from pycorenlp import StanfordCoreNLP
+import pytest
+import tempfile
+import shutil
 import json
+import os
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+@pytest.fixture(autouse=True)
+def in_tmpdir(tmpdir):
+    '''
+    Runs each test in a temporary directory, so that the reports written by
+    make_report() are not left in the working tree
+    '''
+    with tmpdir.as_cwd():
+        yield
 
 
 def analyze_article(text):
@@ -323,3 +341,104 @@ def test_report_html():
         article.predict_interactions()
     summary = report.ReportSummary(articles)
     summary.make_report("kktest")
+
+
+def test_streamed_summary():
+    '''
+    Tests if the summary made from a stream of results, one at a time, is the
+    same as the one made from a list, and if makesummary() counts them only once
+    '''
+    def results():
+        for idx in range(4):
+            interactions = [ core.Interaction(0.5 + idx / 10.0, "p38d", "MAPK13", "alb", "ALB", "", "") ] * (idx % 2)
+            yield core.ArticleResult(str(idx), None, "Journal %s" % (idx % 2), str(2010 + idx), 3, idx, ["MAPK13", "ALB"], interactions)
+
+    streamed = report.ReportSummary()
+    for result in results():
+        streamed.add(result)
+    summary = report.ReportSummary(list(results()))
+    summary.protsummary.makesummary()
+    summary.graphsummary.makesummary()
+    streamed.graphsummary.makesummary()
+    assert((streamed.totalarticles, streamed.totalsentences) == (4, 12))
+    assert(summary.protsummary.prot_table == streamed.protsummary.prot_table)
+    assert(summary.protsummary.prot_table["MAPK13"]['totalcount'] == 4)
+    assert(summary.graphsummary.interactions == streamed.graphsummary.interactions)
+    assert([ row[6] for row in streamed.graphsummary.interactions ] == ["3", "1"])
+    assert(streamed.journals == {"Journal 0": {'ints': 0, 'prots': 4}, "Journal 1": {'ints': 2, 'prots': 4}})
+    assert(streamed.years == {"2010": 0, "2011": 1, "2012": 0, "2013": 1})
+
+
+def test_graph_json():
+    '''
+    Tests if the graph has a node per symbol and an edge per unordered pair,
+    weighted by evidence and confidence, and if it can be pruned
+    '''
+    pairs = [("MAPK13", "ALB", 0.9), ("ALB", "MAPK13", 0.7), ("ALB", "MAPK13", 0.8), ("TP53", "MDM2", 0.6), ("TP53", "ALB", 0.95), ("ALB", "MDM2", 0.5)]
+    interactions = [ core.Interaction(votes, symbol1.lower(), symbol1, symbol2.lower(), symbol2, "", "") for symbol1, symbol2, votes in pairs ]
+    summary = report.ReportSummary([ core.ArticleResult("1", None, "Journal", "2017", 5, 5, ["MAPK13", "ALB", "TP53", "MDM2"], interactions) ])
+    graph = json.loads(summary.graphsummary.graph_to_json())
+    assert([ node['data']['id'] for node in graph['nodes'] ] == ["ALB", "MAPK13", "MDM2", "TP53"])
+    edge = graph['edges'][0]['data']
+    assert((edge['source'], edge['target'], edge['evidence'], edge['confidence'], edge['mean_confidence']) == ("ALB", "MAPK13", 3, 0.9, 0.8))
+    assert(len(graph['edges']) == 4)
+    nodes, edges = summary.graphsummary.graph(min_confidence=0.65)
+    assert([ edge['id'] for edge in edges ] == ["ALB-MAPK13", "ALB-TP53"])
+    nodes, edges = summary.graphsummary.graph(min_degree=2)
+    assert([ edge['id'] for edge in edges ] == ["ALB-TP53", "MDM2-TP53", "ALB-MDM2"])
+    nodes, edges = summary.graphsummary.graph(top_k=1)
+    assert([ edge['id'] for edge in edges ] == ["ALB-MAPK13", "ALB-TP53", "MDM2-TP53"])
+    nodes, edges = summary.graphsummary.graph(max_edges=1)
+    assert(([ node['id'] for node in nodes ], [ edge['id'] for edge in edges ]) == (["ALB", "MAPK13"], ["ALB-MAPK13"]))
+
+
+def test_json_tables():
+    '''
+    Tests if the tables are written as json rows, inline or in chunk files
+    '''
+    rows = [ [0.5 + i / 100.0, "p%s" % i, "</script>"] for i in range(25) ]
+    outf = StringIO()
+    report.write_table(outf, "report.html", "inttable", ["A", "B", "C"], iter(rows), mode="json")
+    html = outf.getvalue()
+    assert("<tbody>" not in html and "</script>\"" not in html)
+    data = html[html.index('ppaxeRows("inttable", ') + 22:html.rindex(');</script>')]
+    assert(json.loads(data) == rows)
+    tmpdir = tempfile.mkdtemp()
+    saved = report.TABLE_CHUNK_ROWS
+    report.TABLE_CHUNK_ROWS = 10
+    try:
+        outf = StringIO()
+        report.write_table(outf, os.path.join(tmpdir, "report.html"), "inttable", ["A", "B", "C"], iter(rows), mode="chunks")
+        assert(sorted(os.listdir(os.path.join(tmpdir, "report_files"))) == ["inttable-0.js", "inttable-1.js", "inttable-2.js"])
+        assert('<script src="report_files/inttable-2.js"></script>' in outf.getvalue())
+        chunks = list()
+        for chunk in range(3):
+            with open(os.path.join(tmpdir, "report_files", "inttable-%s.js" % chunk)) as fh:
+                chunks.extend(json.loads(fh.read()[len('ppaxeRows("inttable", '):-3]))
+        assert(chunks == rows)
+    finally:
+        report.TABLE_CHUNK_ROWS = saved
+        shutil.rmtree(tmpdir)
+
+
+def test_streamed_writer():
+    '''
+    Tests if the plots are encoded in base64 in chunks, and if the graph elements
+    are written one at a time, only the strongest ones
+    '''
+    from io import BytesIO
+    import base64
+    data = BytesIO(bytes(bytearray(range(256))) * 5)
+    outf = StringIO()
+    report.write_base64(outf, data, chunk_size=3 * 7)
+    assert(outf.getvalue() == base64.b64encode(data.getvalue()).decode('ascii'))
+    interactions = [ core.Interaction(votes, symbol1.lower(), symbol1, symbol2.lower(), symbol2, "", "")
+                     for symbol1, symbol2, votes in [("ALB", "MAPK13", 0.9), ("MAPK13", "ALB", 0.7), ("TP53", "MDM2", 0.6)] ]
+    summary = report.ReportSummary([ core.ArticleResult("1", None, "Journal", "2017", 5, 5, ["MAPK13", "ALB", "TP53", "MDM2"], interactions) ])
+    pairs = summary.graphsummary.select_pairs(max_edges=1)
+    assert(pairs == [("ALB", "MAPK13")])
+    outf = StringIO()
+    report.write_elements_json(outf, summary.graphsummary.iter_nodes(pairs), summary.graphsummary.iter_edges(pairs))
+    graph = json.loads(outf.getvalue())
+    assert([ node['data']['id'] for node in graph['nodes'] ] == ["ALB", "MAPK13"])
+    assert(outf.getvalue() == summary.graphsummary.graph_to_json(max_edges=1))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the compact token storage
+'''
+from ppaxe import tokenstore
+import pickle
+
+TOKENS = [
+    {'index': 1, 'word': 'MAPK', 'originalText': 'MAPK', 'lemma': 'MAPK', 'characterOffsetBegin': 0,
+     'characterOffsetEnd': 4, 'pos': 'NN', 'ner': 'P', 'before': '', 'after': ' '},
+    {'index': 2, 'word': 'binds', 'originalText': 'binds', 'lemma': 'bind', 'characterOffsetBegin': 5,
+     'characterOffsetEnd': 10, 'pos': 'VBZ', 'ner': 'O', 'before': ' ', 'after': ' '},
+    {'index': 3, 'word': '-LRB-', 'originalText': '(', 'lemma': '-lrb-', 'characterOffsetBegin': 11,
+     'characterOffsetEnd': 12, 'pos': '-LRB-', 'ner': 'O', 'before': ' ', 'after': '', 'speaker': 'PER0'}
+]
+
+def test_tokenstore_roundtrip():
+    '''
+    Tests if the TokenStore gives back the same tokens
+    '''
+    store = tokenstore.TokenStore(TOKENS)
+    assert(len(store) == 3)
+    assert(store.to_list() == TOKENS)
+    assert(store == TOKENS)
+
+def test_tokenstore_view():
+    '''
+    Tests the dictionary-like view of the tokens
+    '''
+    store = tokenstore.TokenStore(TOKENS)
+    assert(store[1]['lemma'] == "bind")
+    assert(store[-1]['word'] == "-LRB-")
+    assert([ token['pos'] for token in store[0:2] ] == ["NN", "VBZ"])
+    assert([ token['index'] for token in store ] == [1, 2, 3])
+    assert(store[2]['speaker'] == "PER0" and 'speaker' not in store[0])
+    assert(store[0].get('speaker', "none") == "none")
+
+def test_tokenstore_readonly():
+    '''
+    Tests that tokens can't be modified
+    '''
+    store = tokenstore.TokenStore(TOKENS)
+    try:
+        store[0]['word'] = "ALB"
+        assert(False)
+    except TypeError:
+        assert(True)
+
+def test_tokenstore_empty():
+    '''
+    Tests the empty TokenStore (sentences without annotation)
+    '''
+    assert(not tokenstore.TokenStore(""))
+    assert(not tokenstore.TokenStore())
+
+def test_tokenstore_pickle():
+    '''
+    Tests if TokenStore can be pickled
+    '''
+    store = tokenstore.TokenStore(TOKENS)
+    assert(pickle.loads(pickle.dumps(store)) == store)
+
+def test_tokenstore_vocabulary():
+    '''
+    Tests that only words and lemmas go to the vocabulary, and that a full
+    vocabulary is replaced without changing the tokens already stored
+    '''
+    store = tokenstore.TokenStore(TOKENS)
+    assert("(" not in store.strings.ids and " " not in store.strings.ids)
+    assert(store[2]['originalText'] == "(" and store[1]['before'] == " ")
+    max_strings = tokenstore.MAX_STRINGS
+    tokenstore.MAX_STRINGS = len(store.strings)
+    try:
+        other = tokenstore.TokenStore([{'word': 'ALB', 'lemma': 'ALB'}])
+        assert(other.strings is not store.strings and len(other.strings) == 1)
+        assert(store == TOKENS and other[0]['word'] == "ALB")
+    finally:
+        tokenstore.MAX_STRINGS = max_strings
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for the compact article results and the pool of worker processes
+'''
+from ppaxe import core
+from ppaxe import report
+from ppaxe import workers
+from ppaxe import nlpserver
+from conftest import ConstantPredictor, use_resources, restore_resources
+import tempfile
+import shutil
+
+DICTIONARY = "MAPK13\tMAPK13\tP38D\nMAPK12\tMAPK12\tERK6\nALB\tALB\n"
+
+
+def tagged_article(pmid, words):
+    '''
+    Returns an Article with one sentence annotated as nlpserver would (upper-case
+    symbols are proteins)
+    '''
+    article = core.Article(pmid=pmid, fulltext=" ".join(words))
+    article.extract_sentences()
+    sentence = article.sentences[0]
+    sentence.tokens = [ {'index': i + 1, 'word': word, 'lemma': word.lower(), 'pos': 'NN', 'ner': 'P' if word.isupper() else 'O'}
+                        for i, word in enumerate(words) ]
+    sentence.get_candidates()
+    core.predict_candidates(sentence.candidates)
+    return article
+
+def test_article_summary():
+    '''
+    Tests if the compact results give the same report as the articles
+    '''
+    tmpdir = tempfile.mkdtemp()
+    saved = use_resources(tmpdir, DICTIONARY, ConstantPredictor())
+    try:
+        articles = [
+            tagged_article("1", ["P38D", "binds", "ERK6", "."]),
+            tagged_article("2", ["MAPK12", "and", "ALB", "interact", "with", "P38D", "."])
+        ]
+        results = [ article.summarize() for article in articles ]
+        assert(results[0].proteins == ["MAPK13", "MAPK12"])
+        assert(results[1].candidates == 3)
+        assert([ (inter.prot1, inter.symbol1, inter.prot2, inter.symbol2, inter.votes) for inter in results[0].interactions ] == [("P38D", "MAPK13", "ERK6", "MAPK12", 0.9)])
+        from_articles = report.ReportSummary(articles)
+        from_results  = report.ReportSummary(results)
+        from_articles.protsummary.makesummary()
+        from_results.protsummary.makesummary()
+        assert(from_results.totalsentences == from_articles.totalsentences)
+        assert(from_results.protsummary.prot_table == from_articles.protsummary.prot_table)
+    finally:
+        restore_resources(saved)
+        shutil.rmtree(tmpdir)
+
+def test_article_pool():
+    '''
+    Tests if the pool of workers returns the results in the order of the articles
+    '''
+    tmpdir = tempfile.mkdtemp()
+    saved = use_resources(tmpdir, DICTIONARY, ConstantPredictor())
+    server = nlpserver.start()
+    core.get_gene_dictionary()
+    settings = {
+        'nlp_url': server.url,
+        'source': "fulltext",
+        'max_chars': core.BATCH_MAX_CHARS,
+        'threads': 1,
+        'cache': None,
+        'cache_max_size': 0
+    }
+    texts = [ "MAPK13 binds ALB number %s." % i if i % 2 else "Nothing to see in article %s." % i for i in range(10) ]
+    articles = [ core.Article(pmid=str(i), fulltext=text) for i, text in enumerate(texts) ]
+    pool = workers.ArticlePool(2, settings, inflight=3)
+    try:
+        results = list(pool.imap(iter(articles)))
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
+        restore_resources(saved)
+        shutil.rmtree(tmpdir)
+    assert([ result.pmid for result in results ] == [ str(i) for i in range(10) ])
+    assert([ len(result.interactions) for result in results ] == [ i % 2 for i in range(10) ])
+    assert(results[1].interactions[0].symbol2 == "ALB")
+
+def test_symbols_mode():
+    '''
+    Tests if the symbols mode finds the proteins without making candidates nor
+    loading the classifier, and if the protein summary can be made as results arrive
+    '''
+    tmpdir = tempfile.mkdtemp()
+    saved = use_resources(tmpdir, DICTIONARY, ConstantPredictor())
+    core.InteractionCandidate.predictor = None
+    server = nlpserver.start()
+    core.get_gene_dictionary()
+    settings = {
+        'nlp_url': server.url,
+        'source': "fulltext",
+        'max_chars': core.BATCH_MAX_CHARS,
+        'threads': 1,
+        'cache': None,
+        'cache_max_size': 0,
+        'mode': "symbols"
+    }
+    texts = [ "P38D binds ALB .", "ERK6 and P38D .", "Nothing here ." ]
+    articles = [ core.Article(pmid=str(i), fulltext=text) for i, text in enumerate(texts) ]
+    pool = workers.ArticlePool(2, settings)
+    try:
+        results = list(pool.imap(articles))
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
+        restore_resources(saved)
+        shutil.rmtree(tmpdir)
+    assert([ result.proteins for result in results ] == [["MAPK13", "ALB"], ["MAPK12", "MAPK13"], []])
+    assert(sum(result.candidates for result in results) == 0)
+    streamed = report.ProteinSummary([])
+    for result in results:
+        streamed.add(result)
+    summary = report.ProteinSummary(results)
+    summary.makesummary()
+    assert(streamed.prot_table == summary.prot_table)
+    assert(streamed.prot_table["MAPK13"]['totalcount'] == 2)
+    assert(streamed.totalarticles == 3)